@@ -0,0 +1,166 @@
+"""
+Chọn band cho cascade (AI_CASCADE_*): chạy tập ảnh tham chiếu qua stage low-res và
+model đủ 224, tìm (low, high) hẹp nhất mà quyết định is_ai của cascade khớp model
+đủ ít nhất --target-agreement, rồi báo compute tiết kiệm được so với luôn chạy 224.
+
+Ví dụ:
+    python -m benchmarks.cascade_calibrate --images ./reference --target-agreement 0.99
+    python -m benchmarks.cascade_calibrate --model synthetic-dino --sizes 84,112,140 --output cascade.json
+
+Agreement đo so với model đủ, không cần nhãn. Tập tham chiếu nên lấy từ ảnh upload
+thật (vài trăm ảnh trở lên): band chọn trên ảnh tổng hợp hoặc tập nhỏ không đáng tin.
+--model synthetic-dino (weights ngẫu nhiên) chỉ để thử lệnh và đo tốc độ offline.
+"""
+from typing import List, Optional
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+from benchmarks.inference_bench import load_detector, load_images, synthetic_images, _ints
+
+# Cùng ngưỡng với AIService.threshold
+AI_THRESHOLD = 0.7
+
+
+# -------------------------------
+# ĐO
+# -------------------------------
+
+def score_images(detector, images: List[bytes], size: int):
+    """(xác suất "ai" từng ảnh, giây preprocess + forward trung bình mỗi ảnh) ở độ phân giải size"""
+    decoded = [detector.decode(b) for b in images]
+    detector.forward(detector.preprocess(decoded[:1], size))  # warmup
+    probs, elapsed = [], 0.0
+    for image in decoded:
+        start = time.perf_counter()
+        _, p = detector.forward(detector.preprocess([image], size))
+        elapsed += time.perf_counter() - start
+        probs.append(p[0, 1].item())
+    return probs, elapsed / len(images)
+
+
+def decode_seconds(detector, images: List[bytes]) -> float:
+    start = time.perf_counter()
+    for b in images:
+        detector.decode(b)
+    return (time.perf_counter() - start) / len(images)
+
+
+# -------------------------------
+# CHỌN BAND
+# -------------------------------
+
+def choose_band(low_probs, full_probs, target: float, threshold: float = AI_THRESHOLD) -> dict:
+    """
+    Band (low, high) ít ảnh phải chạy 224 nhất mà agreement >= target. Ảnh có xác
+    suất low-res ngoài band lấy quyết định low-res, trong band lấy quyết định model đủ.
+    """
+    import numpy as np
+
+    low_p = np.asarray(low_probs)
+    low_ai = low_p >= threshold
+    full_ai = np.asarray(full_probs) >= threshold
+    low_label = low_p >= 0.5
+    full_label = np.asarray(full_probs) >= 0.5
+
+    # Mốc ứng viên: các quantile của xác suất low-res, thêm 2 đầu (band phủ hết = luôn chạy 224)
+    candidates = np.unique(np.concatenate([np.quantile(low_p, np.linspace(0, 1, 201)), [threshold]]))
+    lows = np.concatenate([[-1.0], candidates[candidates <= threshold]])
+    highs = np.concatenate([candidates[candidates >= threshold], [2.0]])
+
+    best = None
+    for low in lows:
+        below = low_p <= low
+        for high in highs:
+            accepted = below | (low_p >= high)
+            agreement = 1.0 - np.mean(accepted & (low_ai != full_ai))
+            escalated = 1.0 - np.mean(accepted)
+            if agreement < target:
+                continue
+            key = (escalated, -agreement)
+            if best is None or key < best[0]:
+                best = (key, float(low), float(high), float(agreement), float(escalated),
+                        float(1.0 - np.mean(accepted & (low_label != full_label))))
+    _, low, high, agreement, escalated, label_agreement = best
+    # low = -1 / high = 2: phía đó không có ảnh nào dừng ở stage 1
+    return {"low": low, "high": high, "agreement": agreement,
+            "label_agreement": label_agreement, "escalated": escalated}
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibrate the AI detector cascade band")
+    parser.add_argument("--model", choices=("dinov2", "synthetic-dino"), default="dinov2")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--images", help="thư mục ảnh tham chiếu; mặc định sinh ảnh JPEG tổng hợp")
+    parser.add_argument("--num-images", type=int, default=64, help="số ảnh tổng hợp")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", type=_ints, default=[84, 112, 140], help="độ phân giải stage 1 (bội số 14)")
+    parser.add_argument("--target-agreement", type=float, default=0.99)
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads")
+    parser.add_argument("--output", help="ghi JSON kết quả")
+    args = parser.parse_args(argv)
+
+    bad = [s for s in args.sizes if s % 14 or s >= 224]
+    if bad:
+        parser.error(f"sizes must be multiples of 14 below 224: {bad}")
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory(prefix="cascade-images-") as tmp:
+        if not args.images:
+            synthetic_images(tmp, args.num_images, args.seed)
+        images = load_images(args.images or tmp)
+
+    detector = load_detector(args.model, args.device)
+    decode = decode_seconds(detector, images)
+    full_probs, full_seconds = score_images(detector, images, 224)
+    full_cost = decode + full_seconds
+
+    results = []
+    for size in args.sizes:
+        low_probs, low_seconds = score_images(detector, images, size)
+        band = choose_band(low_probs, full_probs, args.target_agreement)
+        cost = decode + low_seconds + band["escalated"] * full_seconds
+        results.append({"size": size, **band, "low_res_ms": low_seconds * 1000,
+                        "cascade_ms": cost * 1000, "saved": 1.0 - cost / full_cost})
+
+    print(f"{len(images)} images, full 224: {full_cost * 1000:.1f} ms/image "
+          f"(decode {decode * 1000:.1f}, forward {full_seconds * 1000:.1f})")
+    header = f"{'size':>5} {'low':>6} {'high':>6} {'agree':>7} {'label':>7} {'to 224':>7} {'stage1 ms':>10} {'ms/img':>8} {'saved':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['size']:>5} {r['low']:>6.3f} {r['high']:>6.3f} {r['agreement']:>7.2%} {r['label_agreement']:>7.2%} "
+              f"{r['escalated']:>7.1%} {r['low_res_ms']:>10.1f} {r['cascade_ms']:>8.1f} {r['saved']:>7.1%}")
+
+    best = max(results, key=lambda r: r["saved"])
+    if best["saved"] <= 0:
+        print(f"\nNo size saves compute at {args.target_agreement:.2%} agreement; keep AI_CASCADE_ENABLED=false")
+    else:
+        print(f"\nAI_CASCADE_ENABLED=true\nAI_CASCADE_SIZE={best['size']}\n"
+              f"AI_CASCADE_LOW={best['low']:.4f}\nAI_CASCADE_HIGH={best['high']:.4f}")
+
+    if args.output:
+        report = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "config": {"model": args.model, "images": args.images or "synthetic", "num_images": len(images),
+                       "target_agreement": args.target_agreement, "threshold": AI_THRESHOLD},
+            "full_ms": full_cost * 1000,
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
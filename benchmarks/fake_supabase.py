@@ -0,0 +1,796 @@
+"""
+Fake in-memory cho phần PostgREST / Storage / Auth mà các router dùng.
+
+Đủ để chạy app thật không cần mạng:
+- table(): select (cột, embed kiểu "*, profiles(*)" / "user:user_id(*)",
+  count="exact"), eq/neq/gt/gte/lt/lte/in_/is_/like/ilike, not_, or_
+  (cú pháp PostgREST, lồng and()/or()), order, range, limit, single,
+  insert/update/upsert/delete trả về representation
+- rpc(): hàm đăng ký bằng register_rpc()
+- storage.from_(bucket): upload/download/remove/get_public_url
+- auth: sign_up, sign_in_with_password, get_user
+
+Latency giả lập (LatencyModel) được sleep trong execute() giống client thật
+(sync, chặn thread đang gọi).
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import random
+import re
+import threading
+import time
+import uuid
+
+
+# -------------------------------
+# SCHEMA TỐI THIỂU
+# -------------------------------
+
+# Giá trị mặc định của cột (thay cho default trong DB)
+TABLE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "profiles": {"role": "user", "display_name": None, "avatar_url": None, "version": 1,
+                 "role_changed_at": None},
+    "posts": {"content": None, "is_private": False, "status": "pending", "ai_perc": None, "like_count": 0,
+              "version": 1},
+    "post_media": {"order": 0, "ai_perc": None, "is_ai": None, "phash": None, "duplicate_of": None,
+                   "duplicate_distance": None},
+    "post_likes": {},
+    "notifications": {"actor_id": None, "post_id": None, "body": None, "is_read": False,
+                      "actor_count": 1, "actor_ids": None},
+    "notification_counters": {"unread_count": 0},
+}
+
+# Khóa chính (bảng không có cột id)
+PRIMARY_KEYS: Dict[str, Tuple[str, ...]] = {
+    "notification_counters": ("user_id",),
+    "admin_stats_buckets": ("metric", "bucket"),
+    "admin_stats_totals": ("metric", "shard"),
+}
+
+# (bảng, cột FK) -> bảng được tham chiếu; dùng cho embed
+FOREIGN_KEYS: Dict[Tuple[str, str], str] = {
+    ("posts", "owner_id"): "profiles",
+    ("post_media", "post_id"): "posts",
+    ("post_media", "duplicate_of"): "post_media",
+    ("post_likes", "post_id"): "posts",
+    ("post_likes", "user_id"): "profiles",
+    ("notifications", "recipient_id"): "profiles",
+    ("notifications", "actor_id"): "profiles",
+    ("notifications", "post_id"): "posts",
+    ("notification_counters", "user_id"): "profiles",
+}
+
+# Mặc định của PostgREST khi không truyền range/limit
+MAX_ROWS = 1000
+
+
+class FakeAPIError(Exception):
+    """Tương đương postgrest APIError (vd. vi phạm khóa chính) / AuthApiError"""
+
+    def __init__(self, message: str = "", status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class LatencyModel:
+    """
+    Latency giả lập theo loại call (ms): base + jitter ngẫu nhiên đều,
+    cộng per_row_us cho mỗi dòng trả về. overrides theo kind:
+    select, insert, update, upsert, delete, rpc, storage, auth.
+    """
+    base_ms: float = 0.0
+    jitter_ms: float = 0.0
+    per_row_us: float = 0.0
+    overrides: Dict[str, float] = field(default_factory=dict)
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+
+    def sample(self, kind: str, rows: int = 0) -> float:
+        base = self.overrides.get(kind, self.base_ms)
+        jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        return (base + jitter) / 1000 + rows * self.per_row_us / 1_000_000
+
+    def wait(self, kind: str, rows: int = 0):
+        delay = self.sample(kind, rows)
+        if delay > 0:
+            time.sleep(delay)
+
+
+@dataclass
+class FakeResponse:
+    data: Any
+    count: Optional[int] = None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# -------------------------------
+# SO KHỚP GIÁ TRỊ
+# -------------------------------
+
+def _coerce(current: Any, raw: Any) -> Any:
+    """Ép giá trị filter (thường là string từ or_/URL) về kiểu của cột"""
+    if not isinstance(raw, str) or current is None:
+        return raw
+    if isinstance(current, bool):
+        return raw.lower() == "true"
+    if isinstance(current, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return float(raw)
+    if isinstance(current, float):
+        return float(raw)
+    return raw
+
+
+def _like(pattern: str, flags=0):
+    return re.compile("^" + re.escape(pattern).replace("%", ".*").replace("_", ".") + "$", flags | re.S)
+
+
+def _compare(op: str, current: Any, value: Any) -> bool:
+    if op == "is":
+        if value in (None, "null"):
+            return current is None
+        return current is _coerce(True, str(value))
+    if op == "in":
+        return current in [_coerce(current, v) for v in value]
+    if op == "like":
+        return current is not None and bool(_like(str(value)).match(str(current)))
+    if op == "ilike":
+        return current is not None and bool(_like(str(value), re.I).match(str(current)))
+    if op == "cs":
+        return current is not None and all(v in current for v in value)
+
+    value = _coerce(current, value)
+    if op == "eq":
+        return current == value
+    if op == "neq":
+        return current != value
+    if current is None or value is None:
+        return False
+    if op == "gt":
+        return current > value
+    if op == "gte":
+        return current >= value
+    if op == "lt":
+        return current < value
+    if op == "lte":
+        return current <= value
+    raise FakeAPIError(f"Unsupported operator: {op}")
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Tách theo dấu phẩy không nằm trong ngoặc"""
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        parts.append("".join(current).strip())
+    return [p for p in parts if p]
+
+
+def _parse_logic(expression: str) -> Callable[[dict], bool]:
+    """
+    Parse filter logic của PostgREST, vd.
+    "and(status.eq.approved,is_private.eq.false),owner_id.eq.<uuid>"
+    → predicate OR của các điều kiện top-level
+    """
+    conditions = [_parse_condition(part) for part in _split_top_level(expression)]
+    return lambda row: any(c(row) for c in conditions)
+
+
+def _parse_condition(text: str) -> Callable[[dict], bool]:
+    negate = False
+    if text.startswith("not."):
+        negate, text = True, text[4:]
+
+    for group in ("and", "or"):
+        if text.startswith(group + "(") and text.endswith(")"):
+            children = [_parse_condition(p) for p in _split_top_level(text[len(group) + 1:-1])]
+            combine = all if group == "and" else any
+            predicate = lambda row, children=children, combine=combine: combine(c(row) for c in children)
+            return (lambda row: not predicate(row)) if negate else predicate
+
+    column, op, value = text.split(".", 2)
+    if op == "not":
+        negate = not negate
+        op, value = value.split(".", 1)
+    if op == "in":
+        value = [v.strip().strip('"') for v in value.strip("()").split(",")]
+    elif op == "is":
+        value = None if value == "null" else value
+
+    def predicate(row):
+        return _compare(op, row.get(column), value)
+    return (lambda row: not predicate(row)) if negate else predicate
+
+
+# -------------------------------
+# SELECT / EMBED
+# -------------------------------
+
+@dataclass
+class _Embed:
+    key: str  # tên field trong kết quả
+    table: str
+    fk_column: Optional[str]  # cột FK trên bảng hiện tại (to-one)
+    reverse_column: Optional[str]  # cột FK trên bảng embed (to-many)
+    columns: List[Any]
+
+
+def _parse_columns(table: str, columns: str) -> List[Any]:
+    """Trả về list gồm tên cột, "*" hoặc _Embed"""
+    parsed = []
+    for item in _split_top_level(columns):
+        if "(" not in item:
+            parsed.append(item.strip())
+            continue
+        head, inner = item.split("(", 1)
+        inner = inner[:-1]
+        alias = None
+        if ":" in head:
+            alias, head = head.split(":", 1)
+        name, _, hint = head.strip().partition("!")
+        parsed.append(_resolve_embed(table, alias.strip() if alias else None, name, hint, inner))
+    return parsed
+
+
+def _resolve_embed(table: str, alias: Optional[str], name: str, hint: str, inner: str) -> _Embed:
+    # "user_id(*)" → embed qua cột FK
+    if (table, name) in FOREIGN_KEYS:
+        target = FOREIGN_KEYS[(table, name)]
+        return _Embed(alias or name, target, name, None, _parse_columns(target, inner))
+
+    # "profiles!owner_id(...)" hoặc "profiles!posts_owner_id_fkey(...)"
+    if hint:
+        column = hint
+        if hint.endswith("_fkey"):
+            column = hint[:-len("_fkey")]
+            if column.startswith(table + "_"):
+                column = column[len(table) + 1:]
+        if (table, column) in FOREIGN_KEYS:
+            return _Embed(alias or name, name, column, None, _parse_columns(name, inner))
+        if (name, column) in FOREIGN_KEYS:
+            return _Embed(alias or name, name, None, column, _parse_columns(name, inner))
+
+    for (source, column), target in FOREIGN_KEYS.items():
+        if source == table and target == name:
+            return _Embed(alias or name, name, column, None, _parse_columns(name, inner))
+    for (source, column), target in FOREIGN_KEYS.items():
+        if source == name and target == table:
+            return _Embed(alias or name, name, None, column, _parse_columns(name, inner))
+
+    raise FakeAPIError(f"Could not find a relationship between '{table}' and '{name}'")
+
+
+# -------------------------------
+# QUERY BUILDER
+# -------------------------------
+
+class _NotBuilder:
+    """Tương ứng .not_ của postgrest: filter kế tiếp bị phủ định"""
+
+    def __init__(self, query: "FakeQuery"):
+        self._query = query
+
+    def __getattr__(self, name):
+        method = getattr(self._query, name)
+
+        def call(*args, **kwargs):
+            self._query._negate_next = True
+            return method(*args, **kwargs)
+        return call
+
+    def execute(self):
+        return self._query.execute()
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self._db = db
+        self._table = table
+        self._operation = "select"
+        self._columns = "*"
+        self._count: Optional[str] = None
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._filters: List[Callable[[dict], bool]] = []
+        # eq / in_ trên cột kiểu text → tra hash index thay vì quét cả bảng
+        self._lookups: List[Tuple[str, list]] = []
+        self._orders: List[Tuple[str, bool, Optional[bool]]] = []
+        self._offset = 0
+        self._limit: Optional[int] = None
+        self._single = False
+        self._maybe_single = False
+        self._negate_next = False
+
+    # ---------- operation ----------
+
+    def select(self, *columns: str, count: Optional[str] = None, head: bool = False):
+        if self._operation == "select":
+            self._columns = ",".join(columns) if columns else "*"
+        self._count = count
+        return self
+
+    def insert(self, json, count=None, returning=None, upsert=False, default_to_null=True):
+        self._operation = "insert"
+        self._payload = json
+        return self
+
+    def upsert(self, json, count=None, returning=None, ignore_duplicates=False, on_conflict="", default_to_null=True):
+        self._operation = "upsert"
+        self._payload = json
+        self._on_conflict = on_conflict or None
+        return self
+
+    def update(self, json, count=None, returning=None):
+        self._operation = "update"
+        self._payload = json
+        return self
+
+    def delete(self, count=None, returning=None):
+        self._operation = "delete"
+        return self
+
+    # ---------- filter ----------
+
+    def _add(self, predicate: Callable[[dict], bool]):
+        if self._negate_next:
+            self._negate_next = False
+            self._filters.append(lambda row: not predicate(row))
+        else:
+            self._filters.append(predicate)
+        return self
+
+    def _op(self, op: str, column: str, value: Any):
+        values = [value] if op == "eq" else value if op == "in" else None
+        if values is not None and not self._negate_next and all(isinstance(v, str) for v in values):
+            self._lookups.append((column, values))
+        return self._add(lambda row: _compare(op, row.get(column), value))
+
+    def eq(self, column, value):
+        return self._op("eq", column, value)
+
+    def neq(self, column, value):
+        return self._op("neq", column, value)
+
+    def gt(self, column, value):
+        return self._op("gt", column, value)
+
+    def gte(self, column, value):
+        return self._op("gte", column, value)
+
+    def lt(self, column, value):
+        return self._op("lt", column, value)
+
+    def lte(self, column, value):
+        return self._op("lte", column, value)
+
+    def in_(self, column, values):
+        return self._op("in", column, list(values))
+
+    def is_(self, column, value):
+        return self._op("is", column, value)
+
+    def like(self, column, pattern):
+        return self._op("like", column, pattern)
+
+    def ilike(self, column, pattern):
+        return self._op("ilike", column, pattern)
+
+    def contains(self, column, values):
+        return self._op("cs", column, values)
+
+    def or_(self, filters: str, reference_table: Optional[str] = None):
+        return self._add(_parse_logic(filters))
+
+    def filter(self, column, operator, criteria):
+        return self._add(_parse_condition(f"{column}.{operator}.{criteria}"))
+
+    def match(self, query: dict):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    @property
+    def not_(self):
+        return _NotBuilder(self)
+
+    # ---------- modifier ----------
+
+    def order(self, column, desc=False, nullsfirst=None, foreign_table=None):
+        self._orders.append((column, desc, nullsfirst))
+        return self
+
+    def range(self, start, end, foreign_table=None):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def limit(self, size, foreign_table=None):
+        self._limit = size
+        return self
+
+    def offset(self, size):
+        self._offset = size
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        self._maybe_single = True
+        return self
+
+    # ---------- execute ----------
+
+    def _matches(self, row: dict) -> bool:
+        return all(f(row) for f in self._filters)
+
+    def _candidates(self) -> List[dict]:
+        if not self._lookups:
+            return self._db._rows(self._table)
+        column, values = self._lookups[0]
+        index = self._db._index(self._table, column)
+        if len(values) == 1:
+            return index.get(values[0], [])
+        return [row for value in dict.fromkeys(values) for row in index.get(value, ())]
+
+    def _sort(self, rows: List[dict]) -> List[dict]:
+        for column, desc, nullsfirst in reversed(self._orders):
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse=desc)
+            # Mặc định của Postgres: NULLS LAST khi ASC, NULLS FIRST khi DESC
+            first = desc if nullsfirst is None else nullsfirst
+            rows = missing + present if first else present + missing
+        return rows
+
+    def execute(self) -> FakeResponse:
+        with self._db._lock:
+            if self._operation == "select":
+                response = self._run_select()
+            else:
+                response = self._run_write()
+
+        rows = len(response.data) if isinstance(response.data, list) else 1
+        self._db.latency.wait(self._operation, rows)
+
+        if self._single or self._maybe_single:
+            data = response.data
+            if len(data) > 1 or (self._single and not data):
+                raise FakeAPIError(f"JSON object requested, {len(data)} rows returned")
+            response.data = data[0] if data else None
+        return response
+
+    def _run_select(self) -> FakeResponse:
+        rows = [r for r in self._candidates() if self._matches(r)]
+        count = len(rows) if self._count else None
+        rows = self._sort(rows)
+        limit = self._limit if self._limit is not None else MAX_ROWS
+        rows = rows[self._offset:self._offset + limit]
+        columns = _parse_columns(self._table, self._columns)
+        return FakeResponse([self._db._project(self._table, r, columns) for r in rows], count)
+
+    def _run_write(self) -> FakeResponse:
+        db = self._db
+        if self._operation in ("insert", "upsert"):
+            payload = self._payload if isinstance(self._payload, list) else [self._payload]
+            written = [db._write_row(self._table, dict(row), self._operation == "upsert", self._on_conflict) for row in payload]
+            return FakeResponse([dict(r) for r in written], len(written) if self._count else None)
+
+        matched = [r for r in self._candidates() if self._matches(r)]
+        db._indexes.pop(self._table, None)
+        if self._operation == "update":
+            for row in matched:
+                old = dict(row)
+                row.update(self._payload)
+                db._fire(self._table, "UPDATE", old, row)
+        else:
+            ids = {id(r) for r in matched}
+            db._tables[self._table] = [r for r in db._rows(self._table) if id(r) not in ids]
+            for row in matched:
+                db._fire(self._table, "DELETE", row, None)
+        return FakeResponse([dict(r) for r in matched], len(matched) if self._count else None)
+
+
+class _FakeRpc:
+    def __init__(self, db: "FakeSupabase", fn: str, params: dict):
+        self._db = db
+        self._fn = fn
+        self._params = params
+
+    def execute(self) -> FakeResponse:
+        handler = self._db._rpcs.get(self._fn)
+        if handler is None:
+            raise FakeAPIError(f"Could not find the function public.{self._fn}")
+        with self._db._lock:
+            data = handler(self._db, **self._params)
+        self._db.latency.wait("rpc")
+        return FakeResponse(data)
+
+
+# -------------------------------
+# STORAGE / AUTH
+# -------------------------------
+
+class FakeBucket:
+    def __init__(self, db: "FakeSupabase", name: str):
+        self._db = db
+        self._name = name
+
+    def _objects(self) -> Dict[str, bytes]:
+        return self._db.objects.setdefault(self._name, {})
+
+    def upload(self, path: str, file: bytes, file_options: Optional[dict] = None):
+        with self._db._lock:
+            objects = self._objects()
+            if path in objects and str((file_options or {}).get("upsert", "false")).lower() != "true":
+                raise FakeAPIError("The resource already exists")
+            objects[path] = bytes(file)
+        self._db.latency.wait("storage", 1)
+        return {"path": path, "Key": f"{self._name}/{path}"}
+
+    def download(self, path: str, options=None) -> bytes:
+        with self._db._lock:
+            data = self._objects().get(path)
+        self._db.latency.wait("storage", 1)
+        if data is None:
+            raise FakeAPIError("Object not found")
+        return data
+
+    def remove(self, paths: List[str]):
+        with self._db._lock:
+            objects = self._objects()
+            removed = [{"name": p} for p in paths if objects.pop(p, None) is not None]
+        self._db.latency.wait("storage", len(paths))
+        return removed
+
+    def get_public_url(self, path: str, options=None) -> str:
+        # Client thật chỉ build URL, không gọi mạng
+        return f"{self._db.url}/storage/v1/object/public/{self._name}/{path}"
+
+
+class FakeStorage:
+    def __init__(self, db: "FakeSupabase"):
+        self._db = db
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self._db, bucket)
+
+
+@dataclass
+class FakeUser:
+    id: str
+    email: Optional[str] = None
+    role: str = "authenticated"
+    app_metadata: dict = field(default_factory=dict)
+    user_metadata: dict = field(default_factory=dict)
+
+    def model_dump(self, **_) -> dict:
+        return {"id": self.id, "email": self.email, "role": self.role,
+                "app_metadata": self.app_metadata, "user_metadata": self.user_metadata}
+
+
+@dataclass
+class FakeSession:
+    access_token: str
+    user: FakeUser
+
+
+@dataclass
+class FakeAuthResponse:
+    user: Optional[FakeUser]
+    session: Optional[FakeSession] = None
+
+
+class FakeAuthAdmin:
+    def __init__(self, auth: "FakeAuth"):
+        self._auth = auth
+
+    def update_user_by_id(self, uid: str, attributes: dict) -> FakeAuthResponse:
+        self._auth._db.latency.wait("auth")
+        user = next((u for u in self._auth._tokens.values() if u.id == uid), None)
+        if user is None:
+            raise FakeAPIError("User not found", status=404)
+        # GoTrue gộp app_metadata / user_metadata theo key
+        user.app_metadata.update(attributes.get("app_metadata") or {})
+        user.user_metadata.update(attributes.get("user_metadata") or {})
+        return FakeAuthResponse(user)
+
+
+class FakeAuth:
+    def __init__(self, db: "FakeSupabase"):
+        self._db = db
+        self._tokens: Dict[str, FakeUser] = {}
+        self._passwords: Dict[str, Tuple[str, FakeUser]] = {}
+        self.admin = FakeAuthAdmin(self)
+
+    def create_user(self, user_id: Optional[str] = None, email: Optional[str] = None,
+                    password: str = "password", token: Optional[str] = None, **profile) -> str:
+        """Tạo auth user + profile (như trigger handle_new_user), trả về access token"""
+        user = FakeUser(id=user_id or str(uuid.uuid4()), email=email, user_metadata=dict(profile))
+        token = token or f"fake-token-{user.id}"
+        with self._db._lock:
+            self._tokens[token] = user
+            if email:
+                self._passwords[email] = (password, user)
+            self._db._write_row("profiles", {
+                "id": user.id,
+                "username": profile.get("username") or user.id[:8],
+                "display_name": profile.get("display_name"),
+                "role": profile.get("role", "user"),
+            }, False, None)
+        return token
+
+    def sign_up(self, credentials: dict) -> FakeAuthResponse:
+        email = credentials["email"]
+        if email in self._passwords:
+            raise FakeAPIError("User already registered")
+        data = (credentials.get("options") or {}).get("data") or {}
+        token = self.create_user(email=email, password=credentials["password"], **data)
+        self._db.latency.wait("auth")
+        user = self._tokens[token]
+        return FakeAuthResponse(user, FakeSession(token, user))
+
+    def sign_in_with_password(self, credentials: dict) -> FakeAuthResponse:
+        self._db.latency.wait("auth")
+        entry = self._passwords.get(credentials["email"])
+        if entry is None or entry[0] != credentials["password"]:
+            raise FakeAPIError("Invalid login credentials")
+        user = entry[1]
+        token = next(t for t, u in self._tokens.items() if u is user)
+        return FakeAuthResponse(user, FakeSession(token, user))
+
+    def get_user(self, jwt: Optional[str] = None) -> FakeAuthResponse:
+        self._db.latency.wait("auth")
+        user = self._tokens.get(jwt)
+        if user is None:
+            raise FakeAPIError("Invalid JWT")
+        return FakeAuthResponse(user)
+
+    def set_session(self, access_token: str, refresh_token: str = ""):
+        return None
+
+
+# -------------------------------
+# CLIENT
+# -------------------------------
+
+# trigger(db, op, old, new) với op là INSERT / UPDATE / DELETE
+Trigger = Callable[["FakeSupabase", str, Optional[dict], Optional[dict]], None]
+
+
+class FakeSupabase:
+    """Thay cho supabase.Client; bọc bằng InstrumentedClient như client thật"""
+
+    def __init__(self, latency: Optional[LatencyModel] = None, url: str = "http://supabase.fake"):
+        self.url = url
+        self.latency = latency or LatencyModel()
+        self.objects: Dict[str, Dict[str, bytes]] = {}
+        self._tables: Dict[str, List[dict]] = {}
+        self._rpcs: Dict[str, Callable] = {}
+        self._triggers: Dict[str, List[Trigger]] = {}
+        # table -> column -> value -> rows; bỏ cả bảng mỗi khi ghi
+        self._indexes: Dict[str, Dict[str, Dict[Any, List[dict]]]] = {}
+        # RLock: trigger / rpc ghi bảng khác trong cùng lock
+        self._lock = threading.RLock()
+        self.storage = FakeStorage(self)
+        self.auth = FakeAuth(self)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def from_(self, name: str) -> FakeQuery:
+        return self.table(name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None, *args, **kwargs) -> _FakeRpc:
+        return _FakeRpc(self, fn, params or {})
+
+    # ---------- mở rộng ----------
+
+    def register_rpc(self, name: str, handler: Callable):
+        """handler(db, **params) chạy trong lock của db"""
+        self._rpcs[name] = handler
+
+    def add_trigger(self, table: str, trigger: Trigger):
+        self._triggers.setdefault(table, []).append(trigger)
+
+    def rows(self, table: str) -> List[dict]:
+        """Bản copy các dòng của bảng (để kiểm tra / báo cáo)"""
+        with self._lock:
+            return [dict(r) for r in self._rows(table)]
+
+    def seed(self, table: str, rows: List[dict]) -> List[dict]:
+        """Insert trực tiếp, không tính latency"""
+        with self._lock:
+            return [dict(self._write_row(table, dict(row), False, None)) for row in rows]
+
+    # ---------- nội bộ (gọi khi đang giữ lock) ----------
+
+    def _rows(self, table: str) -> List[dict]:
+        return self._tables.setdefault(table, [])
+
+    def _index(self, table: str, column: str) -> Dict[Any, List[dict]]:
+        columns = self._indexes.setdefault(table, {})
+        index = columns.get(column)
+        if index is None:
+            index = columns[column] = {}
+            for row in self._rows(table):
+                value = row.get(column)
+                if isinstance(value, str):
+                    index.setdefault(value, []).append(row)
+        return index
+
+    def _fire(self, table: str, op: str, old: Optional[dict], new: Optional[dict]):
+        for trigger in self._triggers.get(table, ()):
+            trigger(self, op, old, new)
+
+    def _write_row(self, table: str, row: dict, upsert: bool, on_conflict: Optional[str]) -> dict:
+        keys = tuple(c.strip() for c in on_conflict.split(",")) if on_conflict else PRIMARY_KEYS.get(table, ("id",))
+        rows = self._rows(table)
+
+        if any(k in row for k in keys):
+            if isinstance(row.get(keys[0]), str):
+                candidates = self._index(table, keys[0]).get(row[keys[0]], [])
+            else:
+                candidates = rows
+            existing = next((r for r in candidates if all(r.get(k) == row.get(k) for k in keys)), None)
+            if existing is not None:
+                if not upsert:
+                    raise FakeAPIError(f"duplicate key value violates unique constraint on {table}")
+                old = dict(existing)
+                self._indexes.pop(table, None)
+                existing.update(row)
+                self._fire(table, "UPDATE", old, existing)
+                return existing
+
+        created = dict(TABLE_DEFAULTS.get(table, {}))
+        if PRIMARY_KEYS.get(table) is None:
+            created["id"] = str(uuid.uuid4())
+        created["created_at"] = _now()
+        created.update(row)
+        rows.append(created)
+        self._indexes.pop(table, None)
+        self._fire(table, "INSERT", None, created)
+        return created
+
+    def _project(self, table: str, row: dict, columns: List[Any]) -> dict:
+        result = {}
+        for column in columns:
+            if column == "*":
+                result.update(row)
+            elif isinstance(column, _Embed):
+                result[column.key] = self._embed(row, column)
+            else:
+                name, _, cast = column.partition("::")
+                alias = None
+                if ":" in name:
+                    alias, name = name.split(":", 1)
+                result[(alias or name).strip()] = row.get(name.strip())
+        return result
+
+    def _embed(self, row: dict, embed: _Embed):
+        if embed.fk_column:
+            matches = self._index(embed.table, "id").get(row.get(embed.fk_column), [])
+            return self._project(embed.table, matches[0], embed.columns) if matches else None
+        return [
+            self._project(embed.table, r, embed.columns)
+            for r in self._index(embed.table, embed.reverse_column).get(row.get("id"), [])
+        ]
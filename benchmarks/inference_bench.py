@@ -0,0 +1,438 @@
+"""
+Benchmark AIDetector trên CPU: sweep batch size, torch.set_num_threads,
+inter-op threads và backend; đo decode / preprocess / forward riêng.
+
+Ví dụ:
+    python -m benchmarks.inference_bench --output baseline.json
+    python -m benchmarks.inference_bench --batch-sizes 1,8 --threads 1,4 --backends eager,int8 --compare baseline.json
+    python -m benchmarks.inference_bench --compare baseline.json --current results.json
+
+--model dinov2 dùng detector thật (cần backbone + head đã cache hoặc có mạng);
+--model synthetic dùng ViT-B/16 của torchvision với weights ngẫu nhiên
+(cùng cỡ compute, chạy offline). Số liệu của 2 model không so sánh với nhau.
+--model synthetic-dino: ViT-B/14 cùng cấu trúc DINOv2 (benchmarks/synthetic_dino.py),
+weights ngẫu nhiên, nhận input khác 224.
+
+Mỗi cấu hình (backend, threads, interop) chạy trong một subprocess riêng:
+set_num_interop_threads chỉ gọi được một lần mỗi process, và peak RSS
+đo được không bị lẫn giữa các backend.
+"""
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.fake")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake-service-role-key")
+os.environ.setdefault("JWT_SECRET", "fake-jwt-secret")
+
+RESULT_PREFIX = "BENCH_RESULT "
+MODELS = ("dinov2", "synthetic", "synthetic-dino")
+BACKENDS = ("eager", "bf16", "int8", "compile", "torchscript")
+# Khóa để ghép kết quả hiện tại với baseline
+RESULT_KEY = ("model", "backend", "threads", "interop_threads", "batch_size")
+
+
+# -------------------------------
+# ẢNH ĐẦU VÀO
+# -------------------------------
+
+def synthetic_images(directory: str, count: int, seed: int) -> List[str]:
+    """JPEG nhiều kích thước (ảnh điện thoại / screenshot / thumbnail)"""
+    import numpy as np
+    from PIL import Image
+
+    rng = random.Random(seed)
+    sizes = [(640, 480), (1024, 768), (1280, 720), (1920, 1080), (1080, 1350), (512, 512)]
+    paths = []
+    for i in range(count):
+        width, height = rng.choice(sizes)
+        # Gradient + nhiễu: JPEG decode gần với ảnh thật hơn nhiễu thuần
+        base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        noise = np.random.default_rng(rng.getrandbits(32)).normal(0, 25, (height, width, 3))
+        pixels = np.clip(base + noise + rng.randint(0, 80), 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"synthetic_{i:03d}.jpg")
+        Image.fromarray(pixels).save(path, format="JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def load_images(directory: str) -> List[bytes]:
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith((".jpg", ".jpeg", ".png", ".webp")))
+    if not names:
+        raise SystemExit(f"No images found in {directory}")
+    images = []
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            images.append(f.read())
+    return images
+
+
+# -------------------------------
+# MODEL / BACKEND
+# -------------------------------
+
+def load_detector(kind: str, device: str):
+    from ml_models.ai_detector import AIDetector, build_head
+
+    if kind == "dinov2":
+        from config import get_settings
+        return AIDetector(get_settings().model_path, device)
+
+    import torch.nn as nn
+
+    if kind == "synthetic-dino":
+        from benchmarks.synthetic_dino import dinov2_vitb14
+        backbone = dinov2_vitb14()
+    else:
+        from torchvision.models import vit_b_16
+        backbone = vit_b_16(weights=None)
+        backbone.heads = nn.Identity()  # trả về CLS token 768-d như DINOv2
+    model = nn.Sequential(OrderedDict([("backbone", backbone), ("head", build_head())]))
+    return AIDetector(None, device, model=model)
+
+
+def available_backends() -> List[str]:
+    import torch
+
+    backends = ["eager"]
+    if torch.backends.mkldnn.is_available():
+        backends.append("bf16")
+    if hasattr(torch, "ao") and hasattr(torch.ao.quantization, "quantize_dynamic"):
+        backends.append("int8")
+    if hasattr(torch, "compile"):
+        backends.append("compile")
+    if hasattr(torch, "jit"):
+        backends.append("torchscript")
+    return backends
+
+
+def make_forward(backend: str, detector, sample: "torch.Tensor") -> Callable:
+    """Hàm tensor → probs cho backend; detector gốc không bị sửa"""
+    import torch
+    from ml_models.ai_detector import AIDetector
+
+    if backend == "eager":
+        return lambda x: detector.forward(x)[1]
+
+    if backend == "bf16":
+        def forward_bf16(x):
+            with torch.autocast("cpu", dtype=torch.bfloat16):
+                return detector.forward(x)[1].float()
+        return forward_bf16
+
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(
+            copy.deepcopy(detector.model), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        quantized = AIDetector(None, str(detector.device), model=model)
+        return lambda x: quantized.forward(x)[1]
+
+    if backend == "compile":
+        model = copy.deepcopy(detector.model)
+        model.backbone = torch.compile(model.backbone)
+        compiled = AIDetector(None, str(detector.device), model=model)
+        return lambda x: compiled.forward(x)[1]
+
+    if backend == "torchscript":
+        model = copy.deepcopy(detector.model)
+        with torch.no_grad():
+            model.backbone = torch.jit.freeze(torch.jit.trace(model.backbone.eval(), sample))
+        traced = AIDetector(None, str(detector.device), model=model)
+        return lambda x: traced.forward(x)[1]
+
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+# -------------------------------
+# ĐO
+# -------------------------------
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss: KB trên Linux, byte trên macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure_batch_size(detector, forward: Callable, images: List[bytes], batch_size: int,
+                       repeats: int, warmup: int) -> dict:
+    batches = [images[i:i + batch_size] for i in range(0, len(images) - batch_size + 1, batch_size)]
+    if not batches:
+        batches = [(images * batch_size)[:batch_size]]
+
+    def run_batch(batch: List[bytes]) -> Tuple[float, float, float]:
+        start = time.perf_counter()
+        decoded = [detector.decode(b) for b in batch]
+        t_decode = time.perf_counter()
+        tensor = detector.preprocess(decoded)
+        t_preprocess = time.perf_counter()
+        forward(tensor)
+        t_forward = time.perf_counter()
+        return t_decode - start, t_preprocess - t_decode, t_forward - t_preprocess
+
+    for i in range(warmup):
+        run_batch(batches[i % len(batches)])
+
+    decode = preprocess = forward_time = 0.0
+    latencies = []
+    count = 0
+    for _ in range(repeats):
+        for batch in batches:
+            d, p, f = run_batch(batch)
+            decode += d
+            preprocess += p
+            forward_time += f
+            latencies.append(d + p + f)
+            count += len(batch)
+
+    total = decode + preprocess + forward_time
+    latencies.sort()
+    return {
+        "batch_size": batch_size,
+        "images": count,
+        "images_per_sec": count / total if total else 0.0,
+        # Latency một request: cả batch phải xong mới có kết quả
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "mean": total / len(latencies) * 1000,
+        },
+        "per_image_ms": {
+            "decode": decode / count * 1000,
+            "preprocess": preprocess / count * 1000,
+            "forward": forward_time / count * 1000,
+            "total": total / count * 1000,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_config(model: str, device: str, backend: str, threads: int, interop: int,
+               images: List[bytes], batch_sizes: List[int], repeats: int, warmup: int) -> List[dict]:
+    import torch
+
+    # Phải set trước mọi op song song trong process
+    torch.set_num_interop_threads(interop)
+    torch.set_num_threads(threads)
+
+    load_start = time.perf_counter()
+    detector = load_detector(model, device)
+    sample = detector.preprocess([detector.decode(images[0])])
+    forward = make_forward(backend, detector, sample)
+    load_seconds = time.perf_counter() - load_start
+
+    results = []
+    for batch_size in batch_sizes:
+        result = {"model": model, "backend": backend, "threads": threads, "interop_threads": interop,
+                  "load_seconds": load_seconds}
+        result.update(measure_batch_size(detector, forward, images, batch_size, repeats, warmup))
+        results.append(result)
+    return results
+
+
+def run_worker(args) -> int:
+    images = load_images(args.images)
+    try:
+        results = run_config(args.model, args.device, args.backend, args.threads_one, args.interop_one,
+                             images, args.batch_sizes, args.repeats, args.warmup)
+        payload = {"results": results}
+    except Exception as e:
+        payload = {"error": f"{type(e).__name__}: {e}"}
+    print(RESULT_PREFIX + json.dumps(payload), flush=True)
+    return 0
+
+
+def spawn_config(args, backend: str, threads: int, interop: int) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.inference_bench", "--worker",
+        "--model", args.model, "--device", args.device, "--images", args.images,
+        "--backend", backend, "--threads-one", str(threads), "--interop-one", str(interop),
+        "--batch-sizes", ",".join(map(str, args.batch_sizes)),
+        "--repeats", str(args.repeats), "--warmup", str(args.warmup),
+    ]
+    proc = subprocess.run(command, capture_output=True, text=True, timeout=args.timeout)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    return {"error": f"worker exited with {proc.returncode}: {proc.stderr.strip()[-500:]}"}
+
+
+# -------------------------------
+# SO SÁNH VỚI BASELINE
+# -------------------------------
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """Danh sách regression: throughput giảm / latency, RSS tăng quá tolerance %"""
+    def index(report):
+        return {tuple(r[k] for k in RESULT_KEY): r for r in report.get("results", [])}
+
+    base, now = index(baseline), index(current)
+    limit = tolerance / 100
+    regressions = []
+    for key, result in sorted(now.items(), key=lambda item: str(item[0])):
+        old = base.get(key)
+        if old is None:
+            continue
+        label = ", ".join(f"{k}={v}" for k, v in zip(RESULT_KEY, key))
+        checks = [
+            ("images_per_sec", old["images_per_sec"], result["images_per_sec"], False),
+            ("latency p50 ms", old["latency_ms"]["p50"], result["latency_ms"]["p50"], True),
+            ("latency p99 ms", old["latency_ms"]["p99"], result["latency_ms"]["p99"], True),
+            ("peak_rss_mb", old["peak_rss_mb"], result["peak_rss_mb"], True),
+        ]
+        for name, before, after, higher_is_worse in checks:
+            if not before:
+                continue
+            change = (after - before) / before
+            if (change > limit) if higher_is_worse else (change < -limit):
+                regressions.append(f"{label}: {name} {before:.2f} → {after:.2f} ({change * 100:+.1f}%)")
+    return regressions
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+
+def _ints(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def environment() -> dict:
+    import torch
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "mkldnn": torch.backends.mkldnn.is_available(),
+    }
+
+
+def print_results(results: List[dict]):
+    header = (f"{'backend':<12} {'thr':>3} {'iop':>3} {'bs':>3} {'img/s':>8} {'p50 ms':>9} {'p99 ms':>9} "
+              f"{'decode':>7} {'prep':>7} {'fwd':>7} {'rss MB':>8}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        stage = r["per_image_ms"]
+        print(f"{r['backend']:<12} {r['threads']:>3} {r['interop_threads']:>3} {r['batch_size']:>3} "
+              f"{r['images_per_sec']:>8.2f} {r['latency_ms']['p50']:>9.1f} {r['latency_ms']['p99']:>9.1f} "
+              f"{stage['decode']:>7.1f} {stage['preprocess']:>7.1f} {stage['forward']:>7.1f} {r['peak_rss_mb']:>8.0f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Benchmark AIDetector inference")
+    parser.add_argument("--model", choices=MODELS, default="dinov2")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--images", help="thư mục ảnh; mặc định sinh ảnh JPEG tổng hợp")
+    parser.add_argument("--num-images", type=int, default=32, help="số ảnh tổng hợp")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-sizes", type=_ints, default=[1, 4, 8, 16])
+    parser.add_argument("--threads", type=_ints, default=sorted({1, cpus}))
+    parser.add_argument("--interop", type=_ints, default=[1])
+    parser.add_argument("--backends", default="available", help="danh sách, hoặc 'available'")
+    parser.add_argument("--repeats", type=int, default=2, help="số lượt qua toàn bộ ảnh")
+    parser.add_argument("--warmup", type=int, default=2, help="số batch chạy trước khi đo")
+    parser.add_argument("--timeout", type=float, default=3600, help="giây cho mỗi cấu hình")
+    parser.add_argument("--output", help="ghi JSON kết quả")
+    parser.add_argument("--compare", help="baseline JSON để phát hiện regression")
+    parser.add_argument("--current", help="so sánh file này với --compare, không chạy benchmark")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="% thay đổi cho phép")
+    # Dùng nội bộ cho subprocess
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--threads-one", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--interop-one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return run_worker(args)
+
+    if args.current:
+        if not args.compare:
+            parser.error("--current requires --compare")
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        return report_regressions(compare(baseline, current, args.tolerance), args.tolerance)
+
+    backends = available_backends() if args.backends == "available" else args.backends.split(",")
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {sorted(unknown)}")
+
+    image_source = args.images or "synthetic"
+    with tempfile.TemporaryDirectory(prefix="bench-images-") as tmp:
+        if not args.images:
+            synthetic_images(tmp, args.num_images, args.seed)
+            args.images = tmp
+
+        results, errors = [], []
+        for backend in backends:
+            for threads in args.threads:
+                for interop in args.interop:
+                    print(f"[bench] {args.model} backend={backend} threads={threads} interop={interop} ...", file=sys.stderr)
+                    payload = spawn_config(args, backend, threads, interop)
+                    if "error" in payload:
+                        errors.append({"backend": backend, "threads": threads, "interop_threads": interop,
+                                       "error": payload["error"]})
+                        print(f"[bench]   skipped: {payload['error']}", file=sys.stderr)
+                        continue
+                    results.extend(payload["results"])
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "config": {
+            "model": args.model, "images": image_source,
+            "num_images": args.num_images, "batch_sizes": args.batch_sizes, "repeats": args.repeats, "warmup": args.warmup,
+        },
+        "results": results,
+        "errors": errors,
+    }
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return report_regressions(compare(baseline, report, args.tolerance), args.tolerance)
+    return 0
+
+
+def report_regressions(regressions: List[str], tolerance: float) -> int:
+    if not regressions:
+        print(f"\nNo regressions beyond {tolerance:.0f}%")
+        return 0
+    print(f"\n{len(regressions)} regression(s) beyond {tolerance:.0f}%:")
+    for line in regressions:
+        print(f"  - {line}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
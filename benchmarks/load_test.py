@@ -0,0 +1,743 @@
+"""
+Load test offline: chạy app FastAPI thật trên FakeSupabase (in-memory),
+không cần mạng, không cần Supabase project.
+
+Ví dụ:
+    python -m benchmarks.load_test --users 50 --duration 30
+    python -m benchmarks.load_test --mix feed=70,notifications=30 --latency-ms 8 --jitter-ms 4
+    python -m benchmarks.load_test --json results.json
+
+Mỗi virtual user lặp: chọn một kịch bản theo trọng số --mix, chạy, nghỉ
+--think-ms. Kết quả: throughput và p50/p95/p99 theo route template.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Settings bắt buộc; giá trị giả vì mọi call đều đi vào FakeSupabase
+os.environ.setdefault("SUPABASE_URL", "http://supabase.fake")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake-service-role-key")
+os.environ.setdefault("JWT_SECRET", "fake-jwt-secret")
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from benchmarks.fake_supabase import FakeSupabase, LatencyModel
+from services.admission import get_inference_queue
+
+
+# -------------------------------
+# SCHEMA: trigger + RPC như migrations
+# -------------------------------
+
+def _bump_counter(db: FakeSupabase, user_id: str, delta: int):
+    rows = db._rows("notification_counters")
+    row = next((r for r in rows if r["user_id"] == user_id), None)
+    if row is None:
+        db._write_row("notification_counters", {"user_id": user_id, "unread_count": max(delta, 0)}, False, None)
+    else:
+        row["unread_count"] = max(row["unread_count"] + delta, 0)
+
+
+def _notifications_unread_counter(db: FakeSupabase, op: str, old: Optional[dict], new: Optional[dict]):
+    """Giống trigger notifications_unread_counter (migration 300)"""
+    if op == "INSERT" and not new["is_read"]:
+        _bump_counter(db, new["recipient_id"], 1)
+    elif op == "UPDATE":
+        if not old["is_read"] and (new["is_read"] or new["recipient_id"] != old["recipient_id"]):
+            _bump_counter(db, old["recipient_id"], -1)
+        if not new["is_read"] and (old["is_read"] or new["recipient_id"] != old["recipient_id"]):
+            _bump_counter(db, new["recipient_id"], 1)
+    elif op == "DELETE" and not old["is_read"]:
+        _bump_counter(db, old["recipient_id"], -1)
+
+
+def _increment_stat_buckets(db: FakeSupabase, p_rows: List[dict]):
+    for row in p_rows:
+        db._write_row("admin_stats_buckets", {"metric": row["metric"], "bucket": row["bucket"], "value": 0}, True, None)
+        bucket = next(r for r in db._rows("admin_stats_buckets")
+                      if r["metric"] == row["metric"] and r["bucket"] == row["bucket"])
+        bucket["value"] += row["value"]
+
+
+def _bump_notification_counter(db: FakeSupabase, p_user_id: str, p_delta: int):
+    _bump_counter(db, p_user_id, p_delta)
+
+
+def _reconcile_notification_counters(db: FakeSupabase, p_user_ids: List[str]) -> List[dict]:
+    """Giống RPC reconcile_notification_counters (migration 1300)"""
+    profiles = {p["id"] for p in db._rows("profiles")}
+    counters = {r["user_id"]: r for r in db._rows("notification_counters")}
+    result = []
+    for user_id in p_user_ids:
+        row = counters.get(user_id)
+        if row is None:
+            if user_id not in profiles:
+                continue
+            row = db._write_row("notification_counters", {"user_id": user_id, "unread_count": 0}, False, None)
+        exact = sum(1 for n in db._rows("notifications") if n["recipient_id"] == user_id and not n["is_read"])
+        drifted = row["unread_count"] != exact
+        row["unread_count"] = exact
+        result.append({"user_id": user_id, "unread_count": exact, "drifted": drifted})
+    return result
+
+
+def _coalesce_like_notifications(db: FakeSupabase, p_rows: List[dict], p_max_recent: int) -> List[dict]:
+    """Giống RPC coalesce_like_notifications (migration 1200)"""
+    from services.notification_coalescer import like_body
+
+    written = []
+    for row in p_rows:
+        recipient_id, post_id = row["recipient_id"], row["post_id"]
+        likers = {r["user_id"] for r in db._rows("post_likes") if r["post_id"] == post_id}
+        actor_ids = [a for a in row["actor_ids"] if a in likers]
+        if not actor_ids:
+            continue
+        actor_count = max(len(likers - {recipient_id}), 1)
+        profile = next((p for p in db._rows("profiles") if p["id"] == actor_ids[0]), {})
+        values = {
+            "actor_id": actor_ids[0],
+            "body": like_body(profile.get("display_name") or profile.get("username") or "Someone", actor_count),
+            "actor_count": actor_count,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        existing = next((n for n in db._rows("notifications")
+                         if n["recipient_id"] == recipient_id and n["post_id"] == post_id
+                         and n["type"] == "like" and not n["is_read"]), None)
+        if existing is None:
+            values["actor_ids"] = actor_ids[:p_max_recent]
+            created = db._write_row("notifications", {"recipient_id": recipient_id, "post_id": post_id,
+                                                      "type": "like", **values}, False, None)
+            written.append({"notification": dict(created), "inserted": True})
+        else:
+            merged = actor_ids + (existing.get("actor_ids") or [])
+            values["actor_ids"] = [a for a in dict.fromkeys(merged) if a in likers][:p_max_recent]
+            old = dict(existing)
+            existing.update(values)
+            db._indexes.pop("notifications", None)
+            db._fire("notifications", "UPDATE", old, existing)
+            written.append({"notification": dict(existing), "inserted": False})
+    return written
+
+
+def _bump_admin_stat(db: FakeSupabase, metric: str, delta: int):
+    """Giống bump_admin_stat (migration 1100), 1 shard"""
+    row = next((r for r in db._rows("admin_stats_totals") if r["metric"] == metric), None)
+    if row is None:
+        db._write_row("admin_stats_totals", {"metric": metric, "shard": 0, "value": delta}, False, None)
+    else:
+        row["value"] += delta
+
+
+def _admin_stats_profiles(db: FakeSupabase, op: str, old: Optional[dict], new: Optional[dict]):
+    if op in ("INSERT", "DELETE"):
+        _bump_admin_stat(db, "total_users", 1 if op == "INSERT" else -1)
+
+
+def _admin_stats_posts(db: FakeSupabase, op: str, old: Optional[dict], new: Optional[dict]):
+    if op == "INSERT":
+        _bump_admin_stat(db, "total_posts", 1)
+        if not new["is_private"]:
+            _bump_admin_stat(db, "public_posts", 1)
+    elif op == "UPDATE" and old["is_private"] != new["is_private"]:
+        _bump_admin_stat(db, "public_posts", 1 if old["is_private"] else -1)
+    elif op == "DELETE":
+        _bump_admin_stat(db, "total_posts", -1)
+        if not old["is_private"]:
+            _bump_admin_stat(db, "public_posts", -1)
+        # post_likes.post_id references posts on delete cascade
+        likes = [r for r in db._rows("post_likes") if r["post_id"] == old["id"]]
+        if likes:
+            db._tables["post_likes"] = [r for r in db._rows("post_likes") if r["post_id"] != old["id"]]
+            db._indexes.pop("post_likes", None)
+            for like in likes:
+                db._fire("post_likes", "DELETE", like, None)
+
+
+def _admin_stats_post_likes(db: FakeSupabase, op: str, old: Optional[dict], new: Optional[dict]):
+    if op in ("INSERT", "DELETE"):
+        _bump_admin_stat(db, "total_likes", 1 if op == "INSERT" else -1)
+
+
+def _admin_stats_ai_verdict(db: FakeSupabase, op: str, old: Optional[dict], new: Optional[dict]):
+    """Giống trigger admin_stats_ai_verdict (migration 1400)"""
+    from services.stats_service import _hour_bucket
+
+    if op != "UPDATE" or old.get("status") == new.get("status") or new.get("status") not in ("approved", "rejected"):
+        return
+    if any(m["post_id"] == new["id"] and m["media_type"] in ("image", "video") for m in db._rows("post_media")):
+        _increment_stat_buckets(db, [{"metric": f"ai_{new['status']}", "bucket": _hour_bucket().isoformat(), "value": 1}])
+
+
+def _admin_stats_snapshot(db: FakeSupabase, p_min_interval_seconds: int, p_retention_hours: int) -> bool:
+    now = datetime.now(timezone.utc)
+    snapshots = db._rows("admin_stats_snapshots")
+    if any((now - datetime.fromisoformat(r["taken_at"])).total_seconds() < p_min_interval_seconds for r in snapshots):
+        return False
+    totals: Dict[str, int] = {}
+    for row in db._rows("admin_stats_totals"):
+        totals[row["metric"]] = totals.get(row["metric"], 0) + row["value"]
+    db._write_row("admin_stats_snapshots", {"totals": totals, "taken_at": now.isoformat()}, False, None)
+    cutoff = now.timestamp() - p_retention_hours * 3600
+    for table, column in (("admin_stats_snapshots", "taken_at"), ("admin_stats_buckets", "bucket")):
+        db._tables[table] = [r for r in db._rows(table) if datetime.fromisoformat(r[column]).timestamp() >= cutoff]
+        db._indexes.pop(table, None)
+    return True
+
+
+def _bump_row_version(db: FakeSupabase, op: str, old: Optional[dict], new: Optional[dict]):
+    """Giống trigger bump_row_version (migration 600)"""
+    if op == "UPDATE":
+        new["version"] = old.get("version", 1) + 1
+        new["updated_at"] = datetime.now(timezone.utc).isoformat()
+
+
+def _post_media_touch_post(db: FakeSupabase, op: str, old: Optional[dict], new: Optional[dict]):
+    """Giống trigger post_media_touch_post (migration 600): đổi media làm tăng version post cha"""
+    post_ids = {row["post_id"] for row in (old, new) if row}
+    for post in db._rows("posts"):
+        if post["id"] in post_ids:
+            _bump_row_version(db, "UPDATE", dict(post), post)
+    db._indexes.pop("posts", None)
+
+
+def _profiles_stamp_role_change(db: FakeSupabase, op: str, old: Optional[dict], new: Optional[dict]):
+    """Giống trigger profiles_stamp_role_change (migration 900)"""
+    if op == "UPDATE" and old.get("role") != new.get("role"):
+        new["role_changed_at"] = datetime.now(timezone.utc).isoformat()
+
+
+def install_schema(db: FakeSupabase):
+    db.add_trigger("notifications", _notifications_unread_counter)
+    db.add_trigger("posts", _bump_row_version)
+    db.add_trigger("profiles", _bump_row_version)
+    db.add_trigger("profiles", _profiles_stamp_role_change)
+    db.add_trigger("post_media", _post_media_touch_post)
+    db.add_trigger("profiles", _admin_stats_profiles)
+    db.add_trigger("posts", _admin_stats_posts)
+    db.add_trigger("post_likes", _admin_stats_post_likes)
+    db.add_trigger("posts", _admin_stats_ai_verdict)
+    db.register_rpc("increment_stat_buckets", _increment_stat_buckets)
+    db.register_rpc("admin_stats_snapshot", _admin_stats_snapshot)
+    db.register_rpc("coalesce_like_notifications", _coalesce_like_notifications)
+    db.register_rpc("bump_notification_counter", _bump_notification_counter)
+    db.register_rpc("reconcile_notification_counters", _reconcile_notification_counters)
+
+
+# -------------------------------
+# DỮ LIỆU MẪU
+# -------------------------------
+
+def random_image(rng: random.Random, size: int = 96) -> bytes:
+    """PNG nhiễu ngẫu nhiên: mỗi ảnh khác nhau nên không bị dedup gộp"""
+    pixels = np.random.default_rng(rng.getrandbits(32)).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@dataclass
+class Dataset:
+    tokens: List[str]
+    user_ids: List[str]
+    post_ids: List[str]
+    hot_post_ids: List[str]
+
+
+def seed(db: FakeSupabase, users: int, posts_per_user: int, media_per_post: int,
+         likes_per_post: int, notifications_per_user: int, bucket: str, rng: random.Random) -> Dataset:
+    tokens, user_ids = [], []
+    for i in range(users):
+        token = db.auth.create_user(email=f"user{i}@bench.local", username=f"user{i}", display_name=f"User {i}")
+        tokens.append(token)
+        user_ids.append(token[len("fake-token-"):])
+
+    image = random_image(rng)
+    posts, media, likes = [], [], []
+    for owner_id in user_ids:
+        for _ in range(posts_per_user):
+            posts.append({
+                "owner_id": owner_id,
+                "content": "seed post",
+                "is_private": rng.random() < 0.1,
+                "status": "approved",
+                "ai_perc": 0.0,
+            })
+    posts = db.seed("posts", posts)
+
+    for post in posts:
+        for order in range(media_per_post):
+            path = f"{post['id']}/{order}.png"
+            db.objects.setdefault(bucket, {})[path] = image
+            media.append({"post_id": post["id"], "storage_path": path, "media_type": "image",
+                          "order": order, "ai_perc": 1.0, "is_ai": False})
+        likers = rng.sample(user_ids, min(likes_per_post, len(user_ids)))
+        likes.extend({"post_id": post["id"], "user_id": u} for u in likers)
+        post["like_count"] = len(likers)
+    db.seed("post_media", media)
+    db.seed("post_likes", likes)
+    with db._lock:
+        counts = {p["id"]: p["like_count"] for p in posts}
+        for row in db._rows("posts"):
+            row["like_count"] = counts.get(row["id"], row["like_count"])
+
+    notifications = []
+    for recipient in user_ids:
+        for _ in range(notifications_per_user):
+            notifications.append({
+                "recipient_id": recipient,
+                "actor_id": rng.choice(user_ids),
+                "type": "like",
+                "body": "Someone liked your post",
+                "is_read": rng.random() < 0.5,
+            })
+    db.seed("notifications", notifications)
+
+    public_ids = [p["id"] for p in posts if not p["is_private"]]
+    return Dataset(tokens, user_ids, [p["id"] for p in posts], public_ids[:max(1, len(public_ids) // 50)])
+
+
+# -------------------------------
+# AI SERVICE GIẢ
+# -------------------------------
+
+class FakeAIService:
+    """
+    Cùng interface AIService, thay model bằng sleep --inference-ms
+    (blocking như forward pass thật, chạy trên inference queue như AIService)
+    """
+
+    def __init__(self, inference_ms: float, ai_rate: float = 0.1, seed: int = 0):
+        self.inference_ms = inference_ms
+        self.ai_rate = ai_rate
+        self.threshold = 0.7
+        self._random = random.Random(seed)
+
+    async def check_single_image(self, image_bytes: bytes, block: bool = True) -> dict:
+        await get_inference_queue().run(time.sleep, self.inference_ms / 1000, block=block)
+        is_ai = self._random.random() < self.ai_rate
+        confidence = self._random.uniform(0.7, 1.0) if is_ai else self._random.uniform(0.0, 0.5)
+        return {
+            "confidence": max(confidence * 100, 0.01),
+            "is_ai": is_ai,
+            "label": "ai" if is_ai else "real",
+            "embedding": np.random.default_rng(self._random.getrandbits(32)).standard_normal(768).astype(np.float32),
+        }
+
+    async def check_media(self, data: bytes, media_type: str = "image", block: bool = True) -> dict:
+        return await self.check_single_image(data, block=block)
+
+    def rescore_embeddings(self, embeddings) -> List[dict]:
+        return [{"confidence": 1.0, "is_ai": False, "label": "real"} for _ in range(len(embeddings))]
+
+
+def build_app(db: FakeSupabase, ai_service):
+    """Import app thật, trỏ mọi dependency Supabase / AI vào bản fake"""
+    import main
+    import services.ai_service
+    import services.supabase_client
+    from services.supabase_client import InstrumentedClient, get_supabase_admin_client, get_supabase_client
+    from services.supabase_recorder import maybe_record
+    from services.ai_service import get_ai_service
+
+    # Giống get_supabase_client: recorder (nếu bật) nằm trong instrumentation
+    client = InstrumentedClient(maybe_record(db))
+    # lifespan và các background loop gọi trực tiếp các hàm này
+    services.supabase_client.get_supabase_admin_client = lambda: client
+    services.ai_service.get_ai_service = lambda: ai_service
+
+    # main cấu hình logging INFO; log từng request làm nhiễu số đo
+    logging.getLogger().setLevel(logging.WARNING)
+
+    app = main.app
+    app.dependency_overrides[get_supabase_client] = lambda: client
+    app.dependency_overrides[get_supabase_admin_client] = lambda: client
+    app.dependency_overrides[get_ai_service] = lambda: ai_service
+    return app
+
+
+# -------------------------------
+# ASGI TRANSPORT
+# -------------------------------
+
+class DetachedASGITransport(httpx.AsyncBaseTransport):
+    """
+    Như httpx.ASGITransport nhưng trả response ngay khi body gửi xong;
+    BackgroundTasks (vd. AI detection) tiếp tục chạy như dưới uvicorn
+    thay vì bị tính vào latency của request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.pending: set = set()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "headers": [(k.lower(), v) for k, v in request.headers.raw],
+            "scheme": request.url.scheme,
+            "path": request.url.path,
+            "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query,
+            "server": (request.url.host, request.url.port or 80),
+            "client": ("127.0.0.1", 50000),
+            "root_path": "",
+            "state": {},
+        }
+        request_sent = False
+        status_code, headers, chunks = 500, [], []
+        done = asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if request_sent:
+                await asyncio.Future()  # không có disconnect
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            nonlocal status_code, headers
+            if message["type"] == "http.response.start":
+                status_code, headers = message["status"], message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    done.set()
+
+        task = asyncio.create_task(self.app(scope, receive, send))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+        waiter = asyncio.create_task(done.wait())
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        if not done.is_set():
+            waiter.cancel()
+            task.result()  # raise lỗi của app nếu có
+        return httpx.Response(status_code, headers=headers, content=b"".join(chunks), request=request)
+
+    async def drain(self):
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+
+
+# -------------------------------
+# GHI NHẬN KẾT QUẢ
+# -------------------------------
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+@dataclass
+class RouteStats:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[int, int] = field(default_factory=dict)
+
+    def add(self, seconds: float, status_code: int):
+        self.latencies.append(seconds)
+        self.statuses[status_code] = self.statuses.get(status_code, 0) + 1
+
+
+class Recorder:
+    def __init__(self):
+        self.routes: Dict[str, RouteStats] = {}
+        self.scenarios: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record(self, route: str, seconds: float, status_code: int):
+        self.routes.setdefault(route, RouteStats()).add(seconds, status_code)
+
+    def report(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        routes = {}
+        total = 0
+        for route, stats in sorted(self.routes.items()):
+            values = sorted(stats.latencies)
+            # 429 / 503 là admission control từ chối có chủ đích, tính riêng
+            shed = sum(n for code, n in stats.statuses.items() if code in (429, 503))
+            errors = sum(n for code, n in stats.statuses.items() if code >= 500 and code != 503)
+            total += len(values)
+            routes[route] = {
+                "requests": len(values),
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "errors_5xx": errors,
+                "shed": shed,
+                "statuses": {str(k): v for k, v in sorted(stats.statuses.items())},
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000 if values else 0.0,
+            }
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "rps": total / elapsed if elapsed else 0.0,
+            "scenarios": dict(self.scenarios),
+            "scenario_failures": dict(self.failures),
+            "routes": routes,
+        }
+
+
+class Session:
+    """HTTP client của một virtual user; route là template, vd. /posts/{post_id}"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, token: str, user_id: str,
+                 conditional: bool = True):
+        self.client = client
+        self.recorder = recorder
+        self.token = token
+        self.user_id = user_id
+        # Giống cache của browser: GET gửi lại If-None-Match, 304 dùng body đã có
+        self.conditional = conditional
+        self._etags: Dict[str, Tuple[str, httpx.Response]] = {}
+
+    async def request(self, method: str, route: str, params: Optional[dict] = None, **kwargs) -> httpx.Response:
+        params = params or {}
+        path = route.format(**params)
+        query = {k: v for k, v in params.items() if "{" + k + "}" not in route}
+        headers = kwargs.pop("headers", {})
+        headers.setdefault("Authorization", f"Bearer {self.token}")
+        cache_key = f"{path}?{sorted(query.items())}"
+        cached = self._etags.get(cache_key) if self.conditional and method == "GET" else None
+        if cached:
+            headers["If-None-Match"] = cached[0]
+        start = time.perf_counter()
+        response = await self.client.request(method, path, params=query or None, headers=headers, **kwargs)
+        self.recorder.record(f"{method} {route}", time.perf_counter() - start, response.status_code)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        if self.conditional and method == "GET" and response.status_code == 200 and "etag" in response.headers:
+            self._etags[cache_key] = (response.headers["etag"], response)
+        return response
+
+
+# -------------------------------
+# KỊCH BẢN
+# -------------------------------
+
+@dataclass
+class Context:
+    dataset: Dataset
+    rng: random.Random
+    bucket: str
+    poll_interval: float
+    poll_timeout: float
+
+
+async def feed_scroll(s: Session, ctx: Context):
+    """Lướt feed vài trang, mở một post, kiểm tra đã like chưa"""
+    posts = []
+    for page in range(1, ctx.rng.randint(1, 3) + 1):
+        response = await s.request("GET", "/posts", params={"page": page, "limit": 10})
+        if response.status_code != 200:
+            return
+        posts.extend(response.json())
+    if posts:
+        post_id = ctx.rng.choice(posts)["id"]
+        await s.request("GET", "/posts/{post_id}", {"post_id": post_id})
+        await s.request("GET", "/posts/{post_id}/liked", {"post_id": post_id})
+
+
+async def like_storm(s: Session, ctx: Context):
+    """Nhiều user cùng like / unlike một nhóm nhỏ post hot"""
+    post_id = ctx.rng.choice(ctx.dataset.hot_post_ids)
+    await s.request("POST", "/posts/{post_id}/like", {"post_id": post_id})
+    if ctx.rng.random() < 0.3:
+        await s.request("DELETE", "/posts/{post_id}/like", {"post_id": post_id})
+
+
+async def upload_and_detect(s: Session, ctx: Context):
+    """upload-temp → tạo post → link media → poll tới khi AI detection xong"""
+    image = random_image(ctx.rng)
+    uploaded = await s.request("POST", "/media/upload-temp", files={"file": ("bench.png", image, "image/png")})
+    if uploaded.status_code != 200:
+        return
+    created = await s.request("POST", "/posts", json={"content": "load test", "is_private": False})
+    if created.status_code != 201:
+        return
+    post_id = created.json()["id"]
+    linked = await s.request("POST", "/posts/{post_id}/media/link", {"post_id": post_id},
+                             json={"storage_path": uploaded.json()["storage_path"], "media_type": "image", "order": 0})
+    if linked.status_code != 200:
+        # 429 / 503 từ admission control: bỏ lượt này, không poll
+        return
+
+    deadline = time.perf_counter() + ctx.poll_timeout
+    while time.perf_counter() < deadline:
+        status_response = await s.request("GET", "/posts/{post_id}/ai_status", {"post_id": post_id})
+        if status_response.status_code != 200 or status_response.json().get("status") != "pending":
+            return
+        await asyncio.sleep(ctx.poll_interval)
+    raise TimeoutError(f"AI detection for {post_id} still pending after {ctx.poll_timeout}s")
+
+
+async def notification_poll(s: Session, ctx: Context):
+    """Badge unread, mở danh sách, đôi khi đánh dấu đã đọc hết"""
+    await s.request("GET", "/notifications/unread-count")
+    await s.request("GET", "/notifications", params={"limit": 20})
+    if ctx.rng.random() < 0.1:
+        await s.request("POST", "/notifications/mark-all-read")
+
+
+SCENARIOS: Dict[str, Callable[[Session, Context], Awaitable[None]]] = {
+    "feed": feed_scroll,
+    "like_storm": like_storm,
+    "upload": upload_and_detect,
+    "notifications": notification_poll,
+}
+
+DEFAULT_MIX = "feed=60,like_storm=15,upload=5,notifications=20"
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', choose from {sorted(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# -------------------------------
+# DRIVER
+# -------------------------------
+
+async def virtual_user(index: int, session: Session, ctx: Context, mix: Dict[str, float],
+                       deadline: float, think: float, recorder: Recorder):
+    names, weights = list(mix), list(mix.values())
+    rng = random.Random(ctx.rng.random() + index)
+    user_ctx = Context(ctx.dataset, rng, ctx.bucket, ctx.poll_interval, ctx.poll_timeout)
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        try:
+            await SCENARIOS[name](session, user_ctx)
+            recorder.scenarios[name] = recorder.scenarios.get(name, 0) + 1
+        except Exception as e:
+            recorder.failures[name] = recorder.failures.get(name, 0) + 1
+            print(f"[load_test] scenario {name} failed: {e!r}", file=sys.stderr)
+        if think:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    latency = LatencyModel(
+        base_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        per_row_us=args.per_row_us,
+        overrides={"auth": args.auth_latency_ms} if args.auth_latency_ms is not None else {},
+        seed=args.seed,
+    )
+    db = FakeSupabase(latency)
+    install_schema(db)
+
+    from config import get_settings
+    settings = get_settings()
+    settings.embedding_store_dir = tempfile.mkdtemp(prefix="bench-embeddings-")
+    settings.like_notification_window_seconds = args.like_window
+    settings.query_budget_mode = "warn" if args.query_budgets else "off"
+    if args.record:
+        settings.supabase_recording_path = args.record
+
+    dataset = seed(db, args.seed_users, args.posts_per_user, args.media_per_post,
+                   args.likes_per_post, args.notifications_per_user, settings.storage_bucket, rng)
+    app = build_app(db, FakeAIService(args.inference_ms, seed=args.seed))
+    mix = parse_mix(args.mix)
+    ctx = Context(dataset, rng, settings.storage_bucket, args.poll_interval, args.poll_timeout)
+
+    transport = DetachedASGITransport(app)
+    recorder = Recorder()
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench.local", timeout=None) as client:
+            sessions = []
+            for i in range(args.users):
+                user = i % len(dataset.tokens)
+                sessions.append(Session(client, recorder, dataset.tokens[user], dataset.user_ids[user],
+                                        conditional=not args.no_conditional))
+
+            recorder.started = time.perf_counter()
+            deadline = recorder.started + args.duration
+            await asyncio.gather(*(
+                virtual_user(i, s, ctx, mix, deadline, args.think_ms / 1000, recorder)
+                for i, s in enumerate(sessions)
+            ))
+            recorder.finished = time.perf_counter()
+            await transport.drain()
+
+    report = recorder.report()
+    report["config"] = {k: v for k, v in vars(args).items() if k != "json"}
+    return report
+
+
+def print_report(report: dict):
+    print(f"\n{report['requests']} requests in {report['elapsed_s']:.1f}s → {report['rps']:.1f} req/s")
+    print(f"scenarios: {report['scenarios']}  failures: {report['scenario_failures']}\n")
+    header = f"{'route':<42} {'reqs':>7} {'rps':>8} {'5xx':>5} {'shed':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for route, r in report["routes"].items():
+        print(f"{route:<42} {r['requests']:>7} {r['rps']:>8.1f} {r['errors_5xx']:>5} {r['shed']:>5} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms']:>9.1f}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load test trên FakeSupabase")
+    parser.add_argument("--users", type=int, default=20, help="số virtual user chạy song song")
+    parser.add_argument("--duration", type=float, default=20.0, help="giây")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="kịch bản=trọng số, vd. feed=60,upload=5")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="nghỉ trung bình giữa 2 kịch bản")
+    parser.add_argument("--seed", type=int, default=42)
+    # Latency giả lập
+    parser.add_argument("--latency-ms", type=float, default=3.0, help="latency mỗi Supabase call")
+    parser.add_argument("--jitter-ms", type=float, default=2.0)
+    parser.add_argument("--per-row-us", type=float, default=5.0)
+    parser.add_argument("--auth-latency-ms", type=float, default=None)
+    parser.add_argument("--inference-ms", type=float, default=150.0, help="thời gian giả lập mỗi ảnh")
+    # Dữ liệu mẫu
+    parser.add_argument("--seed-users", type=int, default=200)
+    parser.add_argument("--posts-per-user", type=int, default=5)
+    parser.add_argument("--media-per-post", type=int, default=1)
+    parser.add_argument("--likes-per-post", type=int, default=5)
+    parser.add_argument("--notifications-per-user", type=int, default=10)
+    # App
+    parser.add_argument("--like-window", type=float, default=30.0, help="like_notification_window_seconds")
+    parser.add_argument("--query-budgets", action="store_true", help="bật query tracer (warn)")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--poll-timeout", type=float, default=30.0)
+    parser.add_argument("--no-conditional", action="store_true", help="không gửi If-None-Match (baseline)")
+    parser.add_argument("--record", help="ghi traffic Supabase (.jsonl.gz) để dùng với benchmarks.replay")
+    parser.add_argument("--json", help="ghi report JSON vào file này")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Replay một phiên traffic đã ghi (services/supabase_recorder.py) vào app
+hiện tại, Supabase được phục vụ từ file ghi → số đo end-to-end latency và
+số query so sánh được giữa các build.
+
+Ví dụ:
+    python -m benchmarks.replay session.jsonl.gz
+    python -m benchmarks.replay session.jsonl.gz --latency-scale 0.5 --json replay.json
+    python -m benchmarks.replay session.jsonl.gz --pace original --time-scale 2
+
+Call Supabase khớp chính xác với bản ghi (cùng bảng, cùng chuỗi builder) trả
+về response đã ghi, theo thứ tự, với latency gốc nhân --latency-scale. Call
+mà build mới phát sinh nhưng bản ghi không có (vd. gộp N query thành 1 query
+in_) được chạy trên FakeSupabase nạp sẵn mọi row xuất hiện trong bản ghi,
+latency ước lượng bằng trung bình của cùng bảng + operation.
+"""
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.fake")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake-service-role-key")
+os.environ.setdefault("JWT_SECRET", "fake-jwt-secret")
+
+import httpx
+
+from benchmarks.fake_supabase import FOREIGN_KEYS, PRIMARY_KEYS, FakeResponse, FakeSupabase, FakeUser
+from benchmarks.load_test import DetachedASGITransport, FakeAIService, build_app, install_schema, percentile, random_image
+from services.supabase_recorder import decode_bytes, encode, read_recording
+
+_OPERATIONS = ("select", "insert", "update", "upsert", "delete")
+_TABLES = {table for table, _ in FOREIGN_KEYS} | set(FOREIGN_KEYS.values())
+
+
+# -------------------------------
+# KHỚP CALL
+# -------------------------------
+
+def _operation(chain: List[list]) -> str:
+    for name, _, _ in chain:
+        if name in _OPERATIONS:
+            return name
+    return "select"
+
+
+def call_key(kind: str, target: str, chain: List[list]) -> str:
+    """
+    Khóa để ghép call lúc replay với call đã ghi. Payload của ghi (timestamp,
+    uuid mới sinh) và params RPC thay đổi giữa các lần chạy nên bị bỏ qua.
+    """
+    if kind == "table":
+        operation = _operation(chain)
+        if operation != "select":
+            chain = [[n, [] if n == operation else a, {} if n == operation else k] for n, a, k in chain]
+    elif kind == "rpc":
+        # chain[0] = ["rpc", [fn, params]]
+        chain = [["rpc", chain[0][1][:1], {}]]
+    elif kind == "storage":
+        name, args, _ = chain[0]
+        chain = [[name, [] if name == "upload" else args[:1], {}]]
+    return json.dumps([kind, target, chain], sort_keys=True, separators=(",", ":"), default=str)
+
+
+class _Record(dict):
+    """Response auth đã ghi (dict) truy cập được như object của supabase-py"""
+
+    def __getattr__(self, name):
+        value = self.get(name)
+        return _Record(value) if isinstance(value, dict) else value
+
+    def model_dump(self, **kwargs) -> dict:
+        return dict(self)
+
+
+class ReplayClient(FakeSupabase):
+    def __init__(self, events: List[dict], latency_scale: float = 1.0):
+        super().__init__()
+        install_schema(self)
+        self.latency_scale = latency_scale
+        self.replayed = 0
+        self.fallback = 0
+        self._recorded: Dict[str, Deque[dict]] = defaultdict(deque)
+        self._last: Dict[str, dict] = {}
+        self._latency: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        self._tokens: Dict[str, FakeUser] = {}
+
+        for event in events:
+            if event["k"] == "call":
+                self._recorded[call_key(event["kind"], event["target"], event["chain"])].append(event)
+                self._latency[(event["target"], _operation(event["chain"]))].append(event["ms"])
+                if event["kind"] == "table" and isinstance(event["data"], list) and not event["error"]:
+                    self._seed_rows(event["target"], event["data"])
+            elif event["k"] == "token":
+                self._tokens[event["token"]] = FakeUser(id=event["user"]["id"], app_metadata=event["user"]["app_metadata"])
+
+    # ---------- nạp row cho fallback ----------
+
+    def _seed_rows(self, table: str, rows: List[Any]):
+        with self._lock:
+            for row in rows:
+                if not isinstance(row, dict):
+                    continue
+                flat = {}
+                for key, value in row.items():
+                    if isinstance(value, dict) and key in _TABLES:
+                        self._seed_rows(key, [value])
+                    elif isinstance(value, list) and value and isinstance(value[0], dict):
+                        if key in _TABLES:
+                            self._seed_rows(key, value)
+                    elif not isinstance(value, dict):
+                        flat[key] = value
+                keys = PRIMARY_KEYS.get(table, ("id",))
+                if all(k in flat for k in keys):
+                    self._write_row(table, flat, True, ",".join(keys))
+
+    # ---------- phục vụ call ----------
+
+    def take(self, kind: str, target: str, chain: List[list]) -> Optional[dict]:
+        key = call_key(kind, target, encode(chain))
+        with self._lock:
+            queue = self._recorded.get(key)
+            if queue:
+                event = self._last[key] = queue.popleft()
+            else:
+                # Gọi nhiều hơn lúc ghi → lặp lại response cuối
+                event = self._last.get(key)
+        if event is not None:
+            self.replayed += 1
+            self._sleep(event["ms"])
+        return event
+
+    def estimate(self, target: str, operation: str):
+        self.fallback += 1
+        samples = self._latency.get((target, operation))
+        if samples:
+            self._sleep(sum(samples) / len(samples))
+
+    def _sleep(self, ms: float):
+        if self.latency_scale > 0 and ms > 0:
+            time.sleep(ms * self.latency_scale / 1000)
+
+    def table(self, name: str):
+        return _ReplayQuery(self, "table", name, super().table(name))
+
+    def rpc(self, fn: str, params: Optional[dict] = None, *args, **kwargs):
+        return _ReplayQuery(self, "rpc", fn, super().rpc(fn, params), [["rpc", [fn, params or {}], {}]])
+
+    @property
+    def storage(self):
+        return _ReplayStorage(self)
+
+    @storage.setter
+    def storage(self, value):
+        self._fake_storage = value
+
+    @property
+    def auth(self):
+        return _ReplayAuth(self)
+
+    @auth.setter
+    def auth(self, value):
+        self._fake_auth = value
+
+
+class _ReplayQuery:
+    def __init__(self, db: ReplayClient, kind: str, target: str, builder, chain=None):
+        self._db = db
+        self._kind = kind
+        self._target = target
+        self._builder = builder
+        self._chain = chain if chain is not None else []
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return _ReplayQuery(self._db, self._kind, self._target, attr, self._chain + [[name, [], {}]])
+
+        def call(*args, **kwargs):
+            return _ReplayQuery(self._db, self._kind, self._target, attr(*args, **kwargs),
+                                self._chain + [[name, list(args), kwargs]])
+        return call
+
+    def execute(self):
+        event = self._db.take(self._kind, self._target, self._chain)
+        if event is None:
+            self._db.estimate(self._target, _operation(self._chain))
+            return self._builder.execute()
+        if event["error"]:
+            raise Exception(event["error"])
+        data = copy.deepcopy(event["data"])
+        if any(name in ("single", "maybe_single") for name, _, _ in self._chain) and isinstance(data, list):
+            data = data[0] if data else None
+        return FakeResponse(data, event["count"])
+
+
+class _ReplayTarget:
+    def __init__(self, db: ReplayClient, kind: str, name: str, fallback):
+        self._db = db
+        self._kind = kind
+        self._name = name
+        self._fallback = fallback
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            event = self._db.take(self._kind, self._name, [[method, list(args), kwargs]])
+            if event is None:
+                self._db.estimate(self._name, method)
+                return self._convert(method, getattr(self._fallback, method)(*args, **kwargs))
+            if event["error"]:
+                raise Exception(event["error"])
+            return self._convert(method, decode_bytes(copy.deepcopy(event["data"])))
+        return call
+
+    def _convert(self, method: str, result):
+        return _Record(result) if self._kind == "auth" and isinstance(result, dict) else result
+
+
+class _ReplayStorage:
+    def __init__(self, db: ReplayClient):
+        self._db = db
+
+    def from_(self, bucket: str):
+        return _ReplayTarget(self._db, "storage", bucket, self._db._fake_storage.from_(bucket))
+
+
+class _ReplayAuth(_ReplayTarget):
+    def __init__(self, db: ReplayClient):
+        super().__init__(db, "auth", "auth", db._fake_auth)
+
+    def __getattr__(self, method):
+        if method != "get_user":
+            return super().__getattr__(method)
+
+        def get_user(jwt: Optional[str] = None):
+            event = self._db.take("auth", "auth", [["get_user", [jwt], {}]])
+            if event is not None:
+                if event["error"]:
+                    raise Exception(event["error"])
+                return _Record(copy.deepcopy(event["data"]))
+            # Token JWT verify local lúc ghi → không có call get_user đã ghi
+            user = self._db._tokens.get(jwt)
+            if user is not None:
+                return _Record({"user": user.model_dump()})
+            self._db.estimate("auth", "get_user")
+            return self._fallback.get_user(jwt)
+        return get_user
+
+
+# -------------------------------
+# DRIVER
+# -------------------------------
+
+def route_template(app, method: str, path: str) -> str:
+    from starlette.routing import Match
+    scope = {"type": "http", "method": method, "path": path, "root_path": "", "path_params": {}}
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{method} {route.path}"
+    return f"{method} {path}"
+
+
+def request_body(request: dict, rng: random.Random) -> Tuple[Optional[bytes], dict]:
+    headers = {k: v for k, v in request["headers"].items() if k != "content-type"}
+    body = request.get("body")
+    content_type = request["headers"].get("content-type", "")
+    if body is None:
+        return None, headers
+    if "json" in body:
+        headers["content-type"] = "application/json"
+        return json.dumps(body["json"]).encode(), headers
+    if body.get("$bytes") is None and content_type.startswith("multipart/form-data"):
+        # Upload ghi không kèm nội dung → ảnh tổng hợp thay thế
+        return None, dict(headers, **{"x-replay-synthetic-upload": "1"})
+    headers["content-type"] = content_type
+    return decode_bytes(body), headers
+
+
+def parse_trace_count(response: httpx.Response) -> Optional[int]:
+    trace = response.headers.get("x-query-trace", "")
+    for part in trace.split(";"):
+        name, _, value = part.strip().partition("=")
+        if name == "count":
+            return int(value)
+    return None
+
+
+async def replay(args) -> dict:
+    events = list(read_recording(args.recording))
+    requests = sorted((e for e in events if e["k"] == "request"), key=lambda e: e["at"])
+    if args.limit:
+        requests = requests[:args.limit]
+    recorded_queries: Dict[Any, int] = defaultdict(int)
+    for event in events:
+        if event["k"] == "call" and not (event["kind"] == "storage" and event["chain"][0][0] == "get_public_url"):
+            recorded_queries[event["rid"]] += 1
+
+    db = ReplayClient(events, args.latency_scale)
+
+    from config import get_settings
+    settings = get_settings()
+    settings.query_budget_mode = "warn"
+    settings.query_trace_header = True
+    settings.supabase_recording_path = ""
+    settings.like_notification_window_seconds = args.like_window
+
+    app = build_app(db, FakeAIService(args.inference_ms, seed=args.seed))
+    logging.getLogger().setLevel(logging.ERROR)
+    rng = random.Random(args.seed)
+
+    rows: List[dict] = []
+    transport = DetachedASGITransport(app)
+
+    async def send(client: httpx.AsyncClient, request: dict):
+        body, headers = request_body(request, rng)
+        files = None
+        if headers.pop("x-replay-synthetic-upload", None):
+            files = {"file": ("replay.png", random_image(rng), "image/png")}
+        start = time.perf_counter()
+        response = await client.request(request["method"], request["path"], params=request["query"] or None,
+                                        headers=headers, content=body, files=files)
+        rows.append({
+            "route": route_template(app, request["method"], request["path"]),
+            "recorded_ms": request["ms"],
+            "replay_ms": (time.perf_counter() - start) * 1000,
+            "recorded_status": request["status"],
+            "status": response.status_code,
+            "recorded_queries": recorded_queries.get(request["rid"], 0),
+            "queries": parse_trace_count(response),
+        })
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay.local", timeout=None) as client:
+            started = time.perf_counter()
+            if args.pace == "original":
+                async def delayed(request):
+                    await asyncio.sleep(max(0.0, started + request["at"] / args.time_scale - time.perf_counter()))
+                    await send(client, request)
+                await asyncio.gather(*(delayed(r) for r in requests))
+            else:
+                for request in requests:
+                    await send(client, request)
+            elapsed = time.perf_counter() - started
+            await transport.drain()
+
+    return summarize(rows, elapsed, db, args)
+
+
+def summarize(rows: List[dict], elapsed: float, db: ReplayClient, args) -> dict:
+    by_route: Dict[str, List[dict]] = defaultdict(list)
+    for row in rows:
+        by_route[row["route"]].append(row)
+
+    def stats(values: List[float]) -> dict:
+        values = sorted(values)
+        return {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99)}
+
+    routes = {}
+    for route, items in sorted(by_route.items()):
+        replay_queries = [r["queries"] for r in items if r["queries"] is not None]
+        routes[route] = {
+            "requests": len(items),
+            "recorded_ms": stats([r["recorded_ms"] for r in items]),
+            "replay_ms": stats([r["replay_ms"] for r in items]),
+            "recorded_queries_mean": sum(r["recorded_queries"] for r in items) / len(items),
+            "replay_queries_mean": sum(replay_queries) / len(replay_queries) if replay_queries else None,
+            "status_mismatches": sum(1 for r in items if r["status"] != r["recorded_status"]),
+        }
+    return {
+        "recording": args.recording,
+        "requests": len(rows),
+        "elapsed_s": elapsed,
+        "calls_replayed": db.replayed,
+        "calls_fallback": db.fallback,
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "routes": routes,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{report['requests']} requests replayed in {report['elapsed_s']:.1f}s; "
+          f"Supabase calls: {report['calls_replayed']} from recording, {report['calls_fallback']} fallback\n")
+    header = (f"{'route':<42} {'reqs':>5} {'rec p50':>8} {'p50':>8} {'rec p95':>8} {'p95':>8} "
+              f"{'rec q':>6} {'q':>6} {'!status':>7}")
+    print(header)
+    print("-" * len(header))
+    for route, r in report["routes"].items():
+        queries = f"{r['replay_queries_mean']:.1f}" if r["replay_queries_mean"] is not None else "-"
+        print(f"{route:<42} {r['requests']:>5} {r['recorded_ms']['p50']:>8.1f} {r['replay_ms']['p50']:>8.1f} "
+              f"{r['recorded_ms']['p95']:>8.1f} {r['replay_ms']['p95']:>8.1f} "
+              f"{r['recorded_queries_mean']:>6.1f} {queries:>6} {r['status_mismatches']:>7}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay traffic Supabase đã ghi vào app hiện tại")
+    parser.add_argument("recording", help="file .jsonl.gz từ supabase_recording_path")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="nhân latency đã ghi; 0 = không sleep")
+    parser.add_argument("--pace", choices=("sequential", "original"), default="sequential",
+                        help="sequential: từng request một; original: theo thời điểm gốc")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="tăng tốc pace original (2 = nhanh gấp đôi)")
+    parser.add_argument("--limit", type=int, default=0, help="chỉ replay N request đầu")
+    parser.add_argument("--inference-ms", type=float, default=150.0)
+    parser.add_argument("--like-window", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="ghi report JSON vào file này")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(replay(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Microbenchmark serialize response cho các list endpoint: đường mặc định của FastAPI
+(validate response_model / jsonable_encoder + json.dumps) so với utils.serialization
+(TypeAdapter trên TypedDict bóng của response model, orjson cho dict).
+
+Ví dụ:
+    python -m benchmarks.serialization_bench
+    python -m benchmarks.serialization_bench --page-size 100 --media 4 --repeats 200 --json ser.json
+"""
+from typing import Any, Callable, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.fake")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake-service-role-key")
+os.environ.setdefault("JWT_SECRET", "fake-jwt-secret")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from models.notification import NotificationResponse
+from models.post import PostResponse
+from utils import serialization
+from utils.serialization import FastJSONResponse, ListSerializer
+
+
+# -------------------------------
+# DỮ LIỆU GIỐNG ROW SUPABASE
+# -------------------------------
+
+def _ts(rng: random.Random) -> str:
+    at = datetime(2026, 10, 1, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(10 ** 6))
+    return at.isoformat()
+
+
+def _profile(rng: random.Random) -> dict:
+    uid = str(uuid.UUID(int=rng.getrandbits(128)))
+    return {"id": uid, "username": f"user{rng.randrange(10 ** 6)}", "display_name": "Bench User",
+            "avatar_url": f"https://cdn.example/avatars/{uid}.png", "bio": "x" * 60,
+            "role": "user", "created_at": _ts(rng), "updated_at": _ts(rng)}
+
+
+def _media(rng: random.Random, post_id: str, order: int) -> dict:
+    media_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    path = f"posts/{post_id}/{media_id}.jpg"
+    return {"id": media_id, "post_id": post_id, "storage_path": path, "media_type": "image",
+            "order": order, "ai_perc": round(rng.random() * 100, 2), "is_ai": rng.random() < 0.3,
+            "phash": rng.getrandbits(63), "created_at": _ts(rng),
+            "url": f"https://project.supabase.co/storage/v1/object/public/media/{path}"}
+
+
+def make_posts(rng: random.Random, count: int, media: int) -> List[dict]:
+    posts = []
+    for _ in range(count):
+        owner = _profile(rng)
+        post_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        posts.append({
+            "id": post_id, "owner_id": owner["id"], "content": "lorem ipsum " * 12,
+            "is_private": False, "like_count": rng.randrange(500), "status": "approved",
+            "ai_perc": round(rng.random() * 100, 2), "created_at": _ts(rng), "updated_at": _ts(rng),
+            "owner_name": owner["display_name"], "owner_avatar": owner["avatar_url"], "owner": owner,
+            "media": [_media(rng, post_id, i) for i in range(media)], "is_liked": rng.random() < 0.2,
+        })
+    return posts
+
+
+def make_notifications(rng: random.Random, count: int) -> List[dict]:
+    notifications = []
+    for _ in range(count):
+        actors = [_profile(rng) for _ in range(rng.randint(1, 3))]
+        notifications.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))), "recipient_id": actors[0]["id"],
+            "actor_id": actors[0]["id"], "post_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "type": "like", "body": "liked your post", "is_read": False, "created_at": _ts(rng),
+            "group_key": "like:x", "actor_count": len(actors), "actor_ids": [a["id"] for a in actors],
+            "actor": actors[0], "actors": actors,
+        })
+    return notifications
+
+
+# -------------------------------
+# HAI ĐƯỜNG SERIALIZE
+# -------------------------------
+
+def default_path(response_model) -> Callable[[Any], bytes]:
+    """Giống FastAPI khi endpoint trả list dict: validate + serialize field rồi JSONResponse"""
+    field = create_model_field("Response", response_model, mode="serialization") if response_model else None
+    loop = asyncio.new_event_loop()
+
+    def run(content):
+        payload = loop.run_until_complete(serialize_response(field=field, response_content=content))
+        return JSONResponse(payload).body
+    return run
+
+
+def fast_path(model) -> Callable[[Any], bytes]:
+    if model is None:
+        return lambda content: FastJSONResponse(content).body
+    serializer = ListSerializer(model)
+    return serializer.dump
+
+
+def time_per_call(fn: Callable[[Any], bytes], payload: Any, repeats: int, warmup: int) -> List[float]:
+    for _ in range(warmup):
+        fn(payload)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(payload)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def same_output(a: bytes, b: bytes) -> bool:
+    """So sánh sau khi parse; created_at của đường mặc định được chuẩn hoá qua datetime"""
+    def normalize(obj):
+        if isinstance(obj, dict):
+            return {k: normalize(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [normalize(v) for v in obj]
+        if isinstance(obj, str) and len(obj) >= 20 and obj[4:5] == "-" and obj[10:11] == "T":
+            return datetime.fromisoformat(obj.replace("Z", "+00:00")).isoformat()
+        return obj
+    return normalize(json.loads(a)) == normalize(json.loads(b))
+
+
+def run(args) -> List[Dict[str, Any]]:
+    rng = random.Random(args.seed)
+    posts = make_posts(rng, args.page_size, args.media)
+    cases = [
+        ("GET /posts", List[PostResponse], PostResponse, posts),
+        ("GET /notifications", List[NotificationResponse], NotificationResponse,
+         make_notifications(rng, args.page_size)),
+        ("GET /admin/posts", None, None, posts),
+        ("GET /posts/{post_id}/likes", None, None,
+         {"post_id": posts[0]["id"], "likes_count": args.page_size,
+          "likes": [{"post_id": posts[0]["id"], "user_id": p["owner_id"], "created_at": p["created_at"],
+                     "profiles": p["owner"]} for p in posts]}),
+    ]
+    results = []
+    for name, response_model, model, payload in cases:
+        default_fn, fast_fn = default_path(response_model), fast_path(model)
+        default_us = time_per_call(default_fn, payload, args.repeats, args.warmup)
+        fast_us = time_per_call(fast_fn, payload, args.repeats, args.warmup)
+        default_p50, fast_p50 = statistics.median(default_us), statistics.median(fast_us)
+        results.append({
+            "route": name,
+            "items": len(payload) if isinstance(payload, list) else len(payload["likes"]),
+            "default_us": round(default_p50, 1),
+            "fast_us": round(fast_p50, 1),
+            "saved_us": round(default_p50 - fast_p50, 1),
+            "speedup": round(default_p50 / fast_p50, 2) if fast_p50 else None,
+            "bytes": len(fast_fn(payload)),
+            "same_output": same_output(default_fn(payload), fast_fn(payload)),
+        })
+    return results
+
+
+def print_report(results: List[Dict[str, Any]]):
+    backend = "orjson" if serialization.orjson is not None else "pydantic_core"
+    print(f"\nserialize 1 trang, p50 (µs); dict payload dùng {backend}\n")
+    header = f"{'route':<28}{'items':>6}{'default':>10}{'fast':>10}{'saved':>10}{'x':>7}{'bytes':>9}  same"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['route']:<28}{r['items']:>6}{r['default_us']:>10.1f}{r['fast_us']:>10.1f}"
+              f"{r['saved_us']:>10.1f}{r['speedup']:>7.2f}{r['bytes']:>9}  {r['same_output']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization microbenchmark cho list endpoint")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--media", type=int, default=4, help="Số media mỗi post")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default="", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Đo token merging (AI_TOKEN_MERGE_RATIO): throughput của backbone với từng ratio so với
+model gốc chưa patch, và độ khớp dự đoán trên tập ảnh tham chiếu (is_ai, label, |Δp|,
+cosine embedding CLS).
+
+Ví dụ:
+    python -m benchmarks.token_merge_eval --images ./reference --ratios 0.25,0.5,0.75
+    python -m benchmarks.token_merge_eval --model synthetic-dino --batch-size 8 --output tome.json
+
+--model synthetic-dino (weights ngẫu nhiên) đo được tốc độ nhưng độ khớp không có ý
+nghĩa; chọn ratio bằng model thật trên ảnh upload thật.
+"""
+from typing import List, Optional
+import argparse
+import copy
+import json
+import sys
+import tempfile
+import time
+
+from benchmarks.inference_bench import load_detector, load_images, synthetic_images
+
+# Cùng ngưỡng với AIService.threshold
+AI_THRESHOLD = 0.7
+
+
+def _floats(text: str) -> List[float]:
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def run(detector, batches) -> tuple:
+    """(features, probs, images/sec) trên toàn bộ batch"""
+    import torch
+
+    detector.forward(batches[0])  # warmup
+    features, probs = [], []
+    start = time.perf_counter()
+    for batch in batches:
+        f, p = detector.forward(batch)
+        features.append(f)
+        probs.append(p[:, 1])
+    elapsed = time.perf_counter() - start
+    count = sum(len(b) for b in batches)
+    return torch.cat(features), torch.cat(probs), count / elapsed
+
+
+def compare(reference: tuple, current: tuple) -> dict:
+    import torch
+
+    ref_features, ref_probs, ref_speed = reference
+    features, probs, speed = current
+    return {
+        "images_per_sec": speed,
+        "speedup": speed / ref_speed,
+        "is_ai_agreement": ((probs >= AI_THRESHOLD) == (ref_probs >= AI_THRESHOLD)).float().mean().item(),
+        "label_agreement": ((probs >= 0.5) == (ref_probs >= 0.5)).float().mean().item(),
+        "mean_abs_prob_diff": (probs - ref_probs).abs().mean().item(),
+        "embedding_cosine": torch.nn.functional.cosine_similarity(features, ref_features).mean().item(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate token merging for the AI detector backbone")
+    parser.add_argument("--model", choices=("dinov2", "synthetic-dino"), default="dinov2")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--images", help="thư mục ảnh tham chiếu; mặc định sinh ảnh JPEG tổng hợp")
+    parser.add_argument("--num-images", type=int, default=64, help="số ảnh tổng hợp")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ratios", type=_floats, default=[0.25, 0.5, 0.75])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads")
+    parser.add_argument("--output", help="ghi JSON kết quả")
+    args = parser.parse_args(argv)
+
+    bad = [r for r in args.ratios if not 0 < r < 1]
+    if bad:
+        parser.error(f"ratios must be in (0, 1): {bad}")
+
+    import torch
+    from ml_models.ai_detector import AIDetector
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory(prefix="tome-images-") as tmp:
+        if not args.images:
+            synthetic_images(tmp, args.num_images, args.seed)
+        images = load_images(args.images or tmp)
+
+    reference = load_detector(args.model, args.device)
+    decoded = [reference.decode(b) for b in images]
+    batches = [reference.preprocess(decoded[i:i + args.batch_size]) for i in range(0, len(decoded), args.batch_size)]
+
+    # Bản copy patch 1 lần, đổi ratio qua backbone.tome_ratio; model gốc giữ nguyên để so
+    merged = AIDetector(None, args.device, model=copy.deepcopy(reference.model), token_merge_ratio=args.ratios[0])
+    baseline = run(reference, batches)
+
+    results = []
+    for ratio in args.ratios:
+        merged.model.backbone.tome_ratio = ratio
+        results.append({"ratio": ratio, **compare(baseline, run(merged, batches))})
+
+    print(f"{len(images)} images, batch {args.batch_size}, original: {baseline[2]:.2f} img/s")
+    header = f"{'ratio':>6} {'img/s':>8} {'speedup':>8} {'is_ai':>7} {'label':>7} {'|dp|':>7} {'cosine':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['ratio']:>6.2f} {r['images_per_sec']:>8.2f} {r['speedup']:>7.2f}x {r['is_ai_agreement']:>7.2%} "
+              f"{r['label_agreement']:>7.2%} {r['mean_abs_prob_diff']:>7.4f} {r['embedding_cosine']:>7.4f}")
+
+    if args.output:
+        report = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "config": {"model": args.model, "images": args.images or "synthetic", "num_images": len(images),
+                       "batch_size": args.batch_size, "threshold": AI_THRESHOLD},
+            "original_images_per_sec": baseline[2],
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
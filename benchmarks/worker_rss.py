@@ -0,0 +1,180 @@
+"""
+RSS mỗi worker khi N process cùng nạp detector, so 2 cách nạp weights:
+- private: như hiện tại, mỗi process copy weights vào memory riêng
+- shared: SHARED_WEIGHTS_PATH, nạp bằng mmap, các process dùng chung page cache
+
+Đọc /proc/<pid>/smaps_rollup của từng worker (chỉ Linux). RSS đếm page dùng chung
+vào mọi process nên gần như không đổi; PSS (page dùng chung chia đều cho các process
+map nó) và Private là số phản ánh memory thật mỗi worker chiếm trên máy.
+
+Ví dụ:
+    python -m ml_models.export_weights --output detector_shared.pt
+    python -m benchmarks.worker_rss --weights detector_shared.pt --workers 4
+    python -m benchmarks.worker_rss --model synthetic-dino --workers 4   # offline, tự export file tạm
+"""
+from typing import Dict, List, Optional
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.fake")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake-service-role-key")
+os.environ.setdefault("JWT_SECRET", "fake-jwt-secret")
+
+MODES = ("private", "shared")
+READY = "WORKER_READY"
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+# -------------------------------
+# WORKER
+# -------------------------------
+
+def load_worker_detector(model: str, mode: str, weights: str):
+    import torch
+    from ml_models.ai_detector import AIDetector, load_shared_model
+
+    if mode == "shared":
+        if model == "synthetic-dino":
+            from benchmarks.synthetic_dino import dinov2_vitb14
+            return AIDetector(None, "cpu", model=load_shared_model(weights, dinov2_vitb14))
+        return AIDetector(None, "cpu", model=load_shared_model(weights))
+
+    if model == "synthetic-dino":
+        from benchmarks.inference_bench import load_detector
+        detector = load_detector(model, "cpu")
+        detector.model.load_state_dict(torch.load(weights, map_location="cpu", weights_only=True))
+        return detector
+    from config import get_settings
+    return AIDetector(get_settings().model_path, "cpu")
+
+
+def run_worker(args) -> int:
+    import torch
+    from PIL import Image
+
+    torch.set_num_threads(1)
+    detector = load_worker_detector(args.model, args.mode, args.weights)
+    # 1 forward như worker thật đã nhận request: page weights đã được đọc vào
+    detector.forward(detector.preprocess([Image.new("RGB", (224, 224))]))
+    print(READY, flush=True)
+    sys.stdin.read()  # chờ parent đóng stdin
+    return 0
+
+
+# -------------------------------
+# ĐO
+# -------------------------------
+
+def smaps_rollup(pid: int) -> Dict[str, float]:
+    """Các trường FIELDS, MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in FIELDS:
+                values[name] = int(rest.split()[0]) / 1024
+    return values
+
+
+def measure(args, mode: str) -> List[Dict[str, float]]:
+    command = [sys.executable, "-m", "benchmarks.worker_rss", "--worker", "--mode", mode,
+               "--model", args.model, "--weights", args.weights]
+    procs = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(args.workers)]
+    try:
+        deadline = time.monotonic() + args.timeout
+        for proc in procs:
+            while True:
+                line = proc.stdout.readline()
+                if line.strip() == READY:
+                    break
+                if not line or time.monotonic() > deadline:
+                    raise SystemExit(f"{mode} worker {proc.pid} failed to start (exit {proc.poll()})")
+        return [smaps_rollup(proc.pid) for proc in procs]
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+        for proc in procs:
+            proc.wait(timeout=30)
+
+
+def summarize(mode: str, workers: List[Dict[str, float]]) -> dict:
+    def mean(field):
+        return sum(w[field] for w in workers) / len(workers)
+
+    return {
+        "mode": mode,
+        "workers": len(workers),
+        "rss_mb": mean("Rss"),
+        "pss_mb": mean("Pss"),
+        "shared_mb": mean("Shared_Clean") + mean("Shared_Dirty"),
+        "private_mb": mean("Private_Clean") + mean("Private_Dirty"),
+        "total_pss_mb": sum(w["Pss"] for w in workers),
+    }
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-worker memory with private vs mmap-shared detector weights")
+    parser.add_argument("--model", choices=("dinov2", "synthetic-dino"), default="dinov2")
+    parser.add_argument("--weights", help="file từ ml_models.export_weights (synthetic-dino: tự export nếu bỏ trống)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--timeout", type=float, default=600, help="giây chờ worker nạp xong")
+    parser.add_argument("--output", help="ghi JSON kết quả")
+    # Dùng nội bộ cho subprocess
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return run_worker(args)
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        parser.error("needs Linux /proc/<pid>/smaps_rollup")
+    modes = args.modes.split(",")
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {sorted(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="worker-rss-") as tmp:
+        if not args.weights:
+            if args.model != "synthetic-dino":
+                parser.error("--weights is required; create it with python -m ml_models.export_weights")
+            from benchmarks.inference_bench import load_detector
+            from ml_models.export_weights import export
+            args.weights = os.path.join(tmp, "detector_shared.pt")
+            export(load_detector(args.model, "cpu").model, args.weights)
+        weights_mb = os.path.getsize(args.weights) / 1024 / 1024
+
+        results = []
+        for mode in modes:
+            print(f"[rss] {mode}: starting {args.workers} workers ...", file=sys.stderr)
+            results.append(summarize(mode, measure(args, mode)))
+
+    print(f"{args.workers} workers, model {args.model}, weights {weights_mb:.0f} MB")
+    header = f"{'mode':<8} {'RSS/worker':>11} {'PSS/worker':>11} {'shared':>8} {'private':>8} {'total PSS':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<8} {r['rss_mb']:>9.0f}MB {r['pss_mb']:>9.0f}MB {r['shared_mb']:>6.0f}MB "
+              f"{r['private_mb']:>6.0f}MB {r['total_pss_mb']:>8.0f}MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "model": args.model,
+                       "weights_mb": weights_mb, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
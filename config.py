@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict, List
 
 class Settings(BaseSettings):
     # Supabase
@@ -9,6 +10,7 @@ class Settings(BaseSettings):
     # JWT
     jwt_secret: str
     jwt_algorithm: str = "HS256"
+    role_cache_ttl_seconds: float = 30.0
     
     # Storage
     storage_bucket: str = "media"
@@ -16,6 +18,124 @@ class Settings(BaseSettings):
     # AI Model
     model_path: str = "ml_models/best_model.pth"
     device: str = "cpu"
+    # Weights export sẵn (python -m ml_models.export_weights), nạp bằng mmap: các worker
+    # uvicorn trên cùng máy dùng chung page; rỗng = tải backbone + head như cũ
+    shared_weights_path: str = ""
+    # Token merging (ToMe) trong backbone: tỉ lệ patch token gộp dần qua 12 block; 0 = tắt
+    # (đo tốc độ / độ khớp bằng python -m benchmarks.token_merge_eval)
+    ai_token_merge_ratio: float = 0.0
+    
+    # Cascade: backbone ở độ phân giải thấp trước, chỉ ảnh nằm trong band mới chạy đủ 224
+    # (chọn band bằng python -m benchmarks.cascade_calibrate)
+    ai_cascade_enabled: bool = False
+    ai_cascade_size: int = 112  # bội số của patch 14
+    ai_cascade_low: float = 0.2  # xác suất "ai" <= low: dừng ở stage 1
+    ai_cascade_high: float = 0.9  # xác suất "ai" >= high: dừng ở stage 1
+    
+    # Video / ảnh động: chấm AI theo frame lấy mẫu (ml_models/frame_sampler.py, video cần PyAV)
+    video_max_frames: int = 8  # frame tối đa mỗi media
+    video_max_decode_seconds: float = 2.0  # ngân sách decode mỗi media
+    video_max_side: int = 512  # frame lớn hơn bị thu nhỏ lúc decode
+    video_frame_batch_size: int = 4  # frame mỗi forward pass
+    video_score_quantile: float = 0.75  # điểm media = quantile xác suất "ai" của các frame
+    
+    # Embedding store / similarity search
+    embedding_store_dir: str = "ml_models/embeddings"
+    embedding_index_backend: str = "auto"  # auto, brute, faiss
+    embedding_ann_threshold: int = 20000
+    
+    # Near-duplicate detection
+    dedup_enabled: bool = True
+    dedup_hash_method: str = "dhash"  # dhash hoặc phash
+    dedup_max_distance: int = 6  # Hamming distance tối đa (trên 64 bit)
+    
+    # Notifications
+    like_notification_window_seconds: float = 30.0  # 0 = ghi ngay, không gộp
+    like_notification_recent_actors: int = 3
+    notification_hub_backend: str = "memory"  # memory hoặc redis (nhiều worker)
+    redis_url: str = "redis://localhost:6379/0"
+    unread_counter_ttl_seconds: float = 30.0
+    unread_counter_reconcile_seconds: float = 300.0
+    
+    # Admin stats
+    stats_flush_seconds: float = 60.0
+    stats_snapshot_seconds: float = 3600.0
+    
+    # Query tracing / budgets
+    query_budget_mode: str = "warn"  # off, warn (production), raise (tests)
+    query_trace_header: bool = False  # trả X-Query-Trace trong response
+    query_repeat_threshold: int = 3  # số lần lặp cùng shape để coi là N+1
+    query_budget_default: int = 0  # 0 = không giới hạn route không có trong query_budgets
+    # "METHOD /route/template" -> số Supabase call tối đa (tính cả auth)
+    query_budgets: Dict[str, int] = {
+        "GET /admin/posts": 4,
+        "GET /admin/stats": 3,
+        "GET /notifications": 3,
+        "GET /notifications/unread-count": 3,
+        "POST /posts:batchGet": 5,
+        "POST /posts:batchLiked": 3,
+        "POST /profiles:batchGet": 1,
+    }
+    
+    # Ghi traffic Supabase để replay (benchmarks/replay.py); rỗng = tắt
+    supabase_recording_path: str = ""
+    supabase_recording_scrub: bool = True  # pseudonym hoá PII trước khi ghi
+    supabase_recording_salt: str = ""  # rỗng = ngẫu nhiên mỗi process
+    supabase_recording_max_blob_bytes: int = 0  # file storage lớn hơn chỉ ghi size
+    
+    # Conditional GET: ETag từ version dòng (migration 600)
+    etag_version_ttl_seconds: float = 2.0  # cache version local; 0 = luôn query version
+    etag_version_cache_size: int = 10000
+    # "METHOD /route/template" -> Cache-Control
+    cache_control: Dict[str, str] = {
+        "GET /posts/{post_id}": "private, no-cache",
+        "GET /posts/{post_id}/media": "private, no-cache",
+        "GET /posts/{post_id}/ai_status": "private, no-cache",
+        "GET /profiles/{user_id}": "public, max-age=30",
+        "GET /profiles/{username}/by-username": "public, max-age=30",
+    }
+    
+    # Home timeline materialize sẵn cho feed (services/timeline.py)
+    timeline_enabled: bool = False  # tắt: feed query DB; bật cùng redis khi chạy nhiều worker
+    timeline_backend: str = "redis"  # redis (nhiều worker dùng chung) hoặc memory (1 process)
+    timeline_max_length: int = 800  # post id mỗi danh sách; scroll sâu hơn đọc DB
+    timeline_ttl_seconds: float = 30.0  # dựng lại từ DB sau TTL (thấy ghi từ worker khác)
+    timeline_max_users: int = 10000  # memory backend: số danh sách giữ tối đa
+    
+    # Cache tập post đã like theo user (services/liked_cache.py) cho is_liked
+    liked_cache_enabled: bool = True
+    liked_cache_ttl_seconds: float = 15.0  # nạp lại sau TTL (thấy like từ worker khác)
+    liked_cache_max_bytes: int = 32 * 1024 * 1024  # ~8 byte mỗi like
+    liked_cache_max_likes_per_user: int = 5000  # user like nhiều hơn: query như cũ
+    
+    # Single-flight cho read nóng: read giống hệt đang chạy dùng chung 1 query
+    single_flight_ttl_seconds: float = 0.0  # > 0: micro-cache kết quả thêm vài chục ms
+    
+    # Admission control / load shedding (services/admission.py); dict rỗng = tắt
+    # "METHOD /route" -> số request xử lý đồng thời tối đa mỗi worker
+    admission_concurrency: Dict[str, int] = {
+        "POST /posts/{post_id}/check_ai": 2,
+        "POST /posts/{post_id}/media": 8,
+        "POST /posts/{post_id}/media/link": 8,
+        "POST /media/upload-temp": 8,
+    }
+    admission_queue_size: int = 16  # request chờ slot tối đa mỗi route
+    admission_queue_timeout_seconds: float = 2.0
+    # "METHOD /route" -> [token mỗi giây, burst] theo user
+    admission_rate_limits: Dict[str, List[float]] = {
+        "POST /posts/{post_id}/check_ai": [0.2, 3],
+        "POST /posts/{post_id}/media": [1.0, 10],
+        "POST /media/upload-temp": [1.0, 10],
+        "POST /posts": [0.5, 10],
+    }
+    # Route đẩy việc vào model: 503 ngay khi inference queue đầy
+    admission_inference_routes: List[str] = [
+        "POST /posts/{post_id}/check_ai",
+        "POST /posts/{post_id}/media",
+        "POST /posts/{post_id}/media/link",
+    ]
+    inference_workers: int = 1  # thread chạy model
+    inference_max_pending: int = 32  # ảnh chờ + đang chạy tối đa
     
     # Frontend URL
     frontend_url: str = "http://localhost:3000"
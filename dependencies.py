@@ -1,7 +1,40 @@
-from fastapi import Depends, HTTPException, status, Header
+from fastapi import Depends, HTTPException, status, Header, Query
 from typing import Optional
 from services.supabase_client import get_supabase_client
+from services.role_cache import get_role_cache
+from config import get_settings
 from supabase import Client
+import jwt
+
+settings = get_settings()
+
+class TokenUser:
+    """User tối thiểu dựng từ JWT claims đã verify, không cần gọi Supabase Auth"""
+    def __init__(self, claims: dict):
+        self.id = claims["sub"]
+        self.email = claims.get("email")
+        self.role = claims.get("role")
+        self.app_metadata = claims.get("app_metadata") or {}
+        self.user_metadata = claims.get("user_metadata") or {}
+
+def decode_access_token(token: str) -> Optional[dict]:
+    """Verify JWT bằng jwt_secret của project; None nếu không verify được"""
+    try:
+        return jwt.decode(
+            token,
+            settings.jwt_secret,
+            algorithms=[settings.jwt_algorithm],
+            audience="authenticated"
+        )
+    except jwt.PyJWTError:
+        return None
+
+def role_claim(claims: dict) -> Optional[str]:
+    """
+    Role app (user/admin) nếu được nhúng vào token (custom access token hook hoặc
+    app_metadata, được update_user_role giữ khớp với profiles.role)
+    """
+    return claims.get("user_role") or (claims.get("app_metadata") or {}).get("role")
 
 async def get_current_user(
     authorization: Optional[str] = Header(None),
@@ -42,14 +75,56 @@ async def get_current_user_optional(
     except:
         return None
 
+async def get_current_user_stream(
+    authorization: Optional[str] = Header(None),
+    access_token: Optional[str] = Query(None),
+    supabase: Client = Depends(get_supabase_client)
+):
+    """
+    Như get_current_user nhưng nhận thêm token qua query string,
+    vì EventSource trên browser không gửi được header Authorization
+    """
+    if not authorization and access_token:
+        authorization = f"Bearer {access_token}"
+    return await get_current_user(authorization, supabase)
+
 async def require_admin(
-    current_user = Depends(get_current_user),
+    authorization: Optional[str] = Header(None),
     supabase: Client = Depends(get_supabase_client)
 ):
-    """Kiểm tra user có role admin"""
-    profile = supabase.table("profiles").select("role").eq("id", current_user.id).execute()
+    """
+    Kiểm tra user có role admin.
+    Thứ tự: role claim trong JWT → role cache → query profiles.role
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing or invalid authorization header"
+        )
+    
+    claims = decode_access_token(authorization.split(" ")[1])
+    if claims and claims.get("sub"):
+        current_user = TokenUser(claims)
+    else:
+        # Token không verify local được (vd. key bất đối xứng) → hỏi Supabase Auth
+        current_user = await get_current_user(authorization, supabase)
+        claims = {}
+    
+    role_cache = get_role_cache()
+    role = role_claim(claims)
+    if role and not role_cache.claim_is_current(supabase, claims.get("iat")):
+        role = None
+    
+    if role is None:
+        role = role_cache.get(current_user.id)
+    
+    if role is None:
+        profile = supabase.table("profiles").select("role").eq("id", current_user.id).execute()
+        role = profile.data[0]["role"] if profile.data else None
+        if role:
+            role_cache.set(current_user.id, role)
     
-    if not profile.data or profile.data[0]["role"] != "admin":
+    if role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin privileges required"
@@ -1,8 +1,9 @@
 from config import get_settings
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 # Import routers
@@ -17,6 +18,14 @@ from routers import (
     admin
 )
 
+from services.metrics import registry, MetricsMiddleware, observe_supabase_call
+from services.query_tracer import QueryTraceMiddleware, trace_query
+from services.supabase_recorder import RecordingMiddleware, get_supabase_recorder
+from services.supabase_client import add_query_observer
+from services.version_cache import invalidate_on_write
+from services.single_flight import invalidate_on_write as invalidate_single_flight
+from services.admission import AdmissionMiddleware
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,13 +37,57 @@ async def lifespan(app: FastAPI):
     
     # Initialize AI model at startup
     from services.ai_service import get_ai_service
+    from services.supabase_client import get_supabase_admin_client
     logger.info("📦 Loading AI detection model...")
     get_ai_service()
     logger.info("✅ AI model loaded successfully")
     
+    # Nạp perceptual hash của media cũ cho near-duplicate detection
+    if get_settings().dedup_enabled:
+        from services.dedup_service import warm_dedup_index
+        app.state.dedup_warmup = asyncio.create_task(
+            asyncio.to_thread(warm_dedup_index, get_supabase_admin_client())
+        )
+    
+    # Pub/sub cho realtime notifications (SSE)
+    from services.notification_hub import get_notification_hub
+    await get_notification_hub().start()
+    
+    # Flush notification like đã gộp theo chu kỳ
+    from services.notification_coalescer import get_like_coalescer
+    coalescer = get_like_coalescer()
+    if coalescer.window_seconds > 0:
+        app.state.like_flusher = asyncio.create_task(coalescer.run(get_supabase_admin_client()))
+    
+    # Đối chiếu unread counter với count exact định kỳ
+    from services.unread_counter import get_unread_counter
+    app.state.unread_reconciler = asyncio.create_task(
+        get_unread_counter().run(get_supabase_admin_client(), get_settings().unread_counter_reconcile_seconds)
+    )
+    
+    # Admin stats: flush series + snapshot totals chạy nền
+    from services.stats_service import get_stats_store
+    app.state.stats_sync = asyncio.create_task(
+        get_stats_store().run(
+            get_supabase_admin_client(),
+            get_settings().stats_flush_seconds,
+            get_settings().stats_snapshot_seconds
+        )
+    )
+    
     yield
     
     logger.info("👋 Shutting down application...")
+    app.state.unread_reconciler.cancel()
+    app.state.stats_sync.cancel()
+    if coalescer.window_seconds > 0:
+        app.state.like_flusher.cancel()
+        await asyncio.to_thread(coalescer.flush, get_supabase_admin_client())
+    await get_notification_hub().stop()
+    
+    recorder = get_supabase_recorder()
+    if recorder:
+        recorder.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -44,6 +97,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Admission control: thêm trước CORS để response 429/503 vẫn có CORS header
+app.add_middleware(AdmissionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -51,8 +107,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
 
+# Metrics: latency theo route template + Supabase call timings
+app.add_middleware(MetricsMiddleware)
+add_query_observer(observe_supabase_call)
+
+# Query tracing: phát hiện N+1, budget số query theo route
+app.add_middleware(QueryTraceMiddleware)
+add_query_observer(trace_query)
+
+# ETag: ghi posts / post_media / profiles làm cũ version đã cache
+add_query_observer(invalidate_on_write)
+
+# Single-flight: ghi vào bảng bỏ micro-cache của bảng đó
+add_query_observer(invalidate_single_flight)
+
+# Ghi traffic Supabase theo request khi bật supabase_recording_path
+if get_settings().supabase_recording_path:
+    app.add_middleware(RecordingMiddleware)
+
 # Exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -85,6 +160,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
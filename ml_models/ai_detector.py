@@ -6,7 +6,12 @@ from PIL import Image
 import io
 import os
 from huggingface_hub import hf_hub_download
-from typing import Tuple
+from itertools import islice
+from typing import Callable, Iterable, List, Optional, Tuple
+from services.metrics import inference_stage_duration, inference_batch_size, cascade_decisions
+from ml_models.token_merging import apply_token_merging
+import numpy as np
+import time
 
 # -------------------------------
 # BACKBONE SINGLETON + LOCAL CACHE
@@ -67,12 +72,61 @@ def get_dino_backbone(device="cpu"):
 # AI DETECTOR
 # -------------------------------
 
+def build_head() -> nn.Module:
+    """Classifier trên embedding CLS 768-d (real / ai)"""
+    return nn.Sequential(
+        nn.Linear(768, 512),
+        nn.ReLU(),
+        nn.Dropout(0.3),
+        nn.Linear(512, 2)
+    )
+
+def _hub_dinov2() -> nn.Module:
+    # Chỉ lấy kiến trúc (code hub đã cache), weights đến từ file export
+    return torch.hub.load('facebookresearch/dinov2', 'dinov2_vitb14', pretrained=False)
+
+
+def load_shared_model(path: str, backbone_factory: Callable[[], nn.Module] = _hub_dinov2) -> nn.Module:
+    """
+    Model đầy đủ (backbone + head) từ file của python -m ml_models.export_weights,
+    nạp bằng mmap: tensor trỏ thẳng vào page cache của file (không copy), nên mọi
+    worker trên cùng máy dùng chung một bản weights trong RAM. Kiến trúc dựng trên
+    device "meta" (không cấp phát) rồi gắn tensor mmap vào bằng assign=True.
+    """
+    state_dict = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    with torch.device("meta"):
+        model = nn.Sequential(OrderedDict([
+            ('backbone', backbone_factory()),
+            ('head', build_head())
+        ]))
+    model.load_state_dict(state_dict, assign=True)
+
+    missing = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if missing:
+        raise ValueError(f"{path} is missing tensors: {missing[:5]}")
+    # Không ghi vào weights: page được ghi sẽ bị copy riêng cho worker đó
+    for p in model.parameters():
+        p.requires_grad = False
+    return model.eval()
+
+
 class AIDetector:
-    def __init__(self, model_path: str, device: str = "cpu"):
+    def __init__(self, model_path: str, device: str = "cpu", model: nn.Module = None,
+                 token_merge_ratio: float = 0.0):
         self.device = torch.device(device)
-        self.model = self._load_model(model_path)
-        self.preprocessor = transforms.Compose([
-            transforms.Resize((224, 224)),
+        # model truyền sẵn (vd. benchmark không có mạng) phải có .backbone và .head
+        self.model = model.to(self.device).eval() if model is not None else self._load_model(model_path)
+        if token_merge_ratio > 0:
+            # Gộp token dần qua các block (ml_models/token_merging.py): nhanh hơn, lệch nhẹ so với model gốc
+            apply_token_merging(self.model.backbone, token_merge_ratio)
+        self.preprocessor = self._build_preprocessor(224)
+        # size -> transform; cascade dùng thêm độ phân giải thấp
+        self._preprocessors = {224: self.preprocessor}
+
+    @staticmethod
+    def _build_preprocessor(size: int):
+        return transforms.Compose([
+            transforms.Resize((size, size)),
             transforms.ToTensor(),
             transforms.Normalize(
                 mean=[0.485, 0.456, 0.406],
@@ -87,12 +141,7 @@ class AIDetector:
         # Create full model
         model = nn.Sequential(OrderedDict([
             ('backbone', backbone_model),
-            ('head', nn.Sequential(
-                nn.Linear(768, 512),
-                nn.ReLU(),
-                nn.Dropout(0.3),
-                nn.Linear(512, 2)
-            ))
+            ('head', build_head())
         ]))
 
         # Load head weights
@@ -107,39 +156,180 @@ class AIDetector:
         model.to(self.device)
         return model
     
+    # ---------- các stage, dùng chung cho predict và predict_batch ----------
+
+    def decode(self, image_bytes: bytes) -> Image.Image:
+        return Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+    def preprocess(self, images: List[Image.Image], size: int = 224) -> torch.Tensor:
+        """size phải là bội số của patch 14; DINOv2 tự nội suy pos embedding"""
+        preprocessor = self._preprocessors.get(size)
+        if preprocessor is None:
+            preprocessor = self._preprocessors.setdefault(size, self._build_preprocessor(size))
+        return torch.stack([preprocessor(image) for image in images]).to(self.device)
+
+    def forward(self, input_tensor: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Trả về (features CLS [N, 768], probs [N, 2])"""
+        with torch.no_grad():
+            features = self.model.backbone(input_tensor)
+            outputs = self.model.head(features)
+            probs = torch.nn.functional.softmax(outputs, dim=1)
+        return features, probs
+
     def predict(self, image_bytes: bytes) -> Tuple[str, float]:
+        label, confidence, _ = self.predict_with_embedding(image_bytes)
+        return label, confidence
+
+    def predict_with_embedding(self, image_bytes: bytes) -> Tuple[str, float, np.ndarray]:
+        """
+        Giống predict() nhưng trả thêm embedding CLS 768-d của backbone
+        (đầu vào của head) để lưu lại, không phải chạy backbone lần nữa.
+        """
         try:
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            input_tensor = self.preprocessor(image).unsqueeze(0).to(self.device)
+            start = time.perf_counter()
+            image = self.decode(image_bytes)
+            decoded = time.perf_counter()
+            input_tensor = self.preprocess([image])
+            preprocessed = time.perf_counter()
 
-            with torch.no_grad():
-                outputs = self.model(input_tensor)
-                probs = torch.nn.functional.softmax(outputs, dim=1)
-                confidence, predicted = torch.max(probs, 1)
+            features, probs = self.forward(input_tensor)
+            confidence, predicted = torch.max(probs, 1)
+
+            inference_stage_duration.observe(decoded - start, "decode")
+            inference_stage_duration.observe(preprocessed - decoded, "preprocess")
+            inference_stage_duration.observe(time.perf_counter() - preprocessed, "forward")
+            inference_batch_size.observe(input_tensor.shape[0])
 
             label = "real" if predicted.item() == 0 else "ai"
-            return label, confidence.item()
+            embedding = features[0].detach().cpu().numpy()
+            return label, confidence.item(), embedding
 
         except Exception as e:
             raise Exception(f"Error during prediction: {str(e)}")
+
+    def predict_cascade(self, image_bytes: bytes, size: int, low: float,
+                        high: float) -> Tuple[str, float, Optional[np.ndarray]]:
+        """
+        Cascade 2 stage: backbone ở độ phân giải size trước ((size/14)^2 token thay vì
+        256). Xác suất "ai" <= low hoặc >= high thì dùng luôn kết quả đó; nằm trong band
+        thì chạy lại đủ 224 như predict_with_embedding. Dừng ở stage 1 thì embedding là
+        None: embedding low-res khác phân phối với embedding 224 đã lưu.
+        """
+        try:
+            start = time.perf_counter()
+            image = self.decode(image_bytes)
+            decoded = time.perf_counter()
+            input_tensor = self.preprocess([image], size)
+            preprocessed = time.perf_counter()
+
+            _, probs = self.forward(input_tensor)
+            forwarded = time.perf_counter()
+
+            inference_stage_duration.observe(decoded - start, "decode")
+            inference_stage_duration.observe(preprocessed - decoded, "preprocess")
+            inference_stage_duration.observe(forwarded - preprocessed, "forward_low_res")
+            inference_batch_size.observe(1)
+
+            ai_prob = probs[0, 1].item()
+            if ai_prob <= low or ai_prob >= high:
+                cascade_decisions.inc("low_res")
+                label = "ai" if ai_prob >= 0.5 else "real"
+                return label, ai_prob if label == "ai" else 1 - ai_prob, None
+
+            cascade_decisions.inc("full")
+            input_tensor = self.preprocess([image])
+            preprocessed = time.perf_counter()
+            features, probs = self.forward(input_tensor)
+            confidence, predicted = torch.max(probs, 1)
+
+            inference_stage_duration.observe(preprocessed - forwarded, "preprocess")
+            inference_stage_duration.observe(time.perf_counter() - preprocessed, "forward")
+            inference_batch_size.observe(1)
+
+            label = "real" if predicted.item() == 0 else "ai"
+            return label, confidence.item(), features[0].detach().cpu().numpy()
+
+        except Exception as e:
+            raise Exception(f"Error during prediction: {str(e)}")
+
+    def classify_embeddings(self, embeddings: np.ndarray) -> List[Tuple[str, float]]:
+        """Chạy lại head trên các embedding đã lưu (shape [N, 768])"""
+        features = torch.from_numpy(np.asarray(embeddings, dtype=np.float32)).to(self.device)
+
+        with torch.no_grad():
+            outputs = self.model.head(features)
+            probs = torch.nn.functional.softmax(outputs, dim=1)
+            confidences, predicted = torch.max(probs, 1)
+
+        return [
+            ("real" if p == 0 else "ai", c)
+            for p, c in zip(predicted.tolist(), confidences.tolist())
+        ]
     
     def predict_batch(self, images_bytes: list) -> list:
+        """Một forward pass cho cả batch"""
+        if not images_bytes:
+            return []
+
+        start = time.perf_counter()
+        images = [self.decode(b) for b in images_bytes]
+        decoded = time.perf_counter()
+        input_tensor = self.preprocess(images)
+        preprocessed = time.perf_counter()
+
+        _, probs = self.forward(input_tensor)
+        confidences, predicted = torch.max(probs, 1)
+
+        inference_stage_duration.observe(decoded - start, "decode")
+        inference_stage_duration.observe(preprocessed - decoded, "preprocess")
+        inference_stage_duration.observe(time.perf_counter() - preprocessed, "forward")
+        inference_batch_size.observe(len(images))
+
         return [
-            {"label": self.predict(b)[0], 
-             "confidence": self.predict(b)[1]}
-            for b in images_bytes
+            {"label": "real" if p == 0 else "ai", "confidence": c}
+            for p, c in zip(predicted.tolist(), confidences.tolist())
         ]
 
 
+    def predict_frames(self, frames: Iterable[Image.Image], batch_size: int = 4) -> List[float]:
+        """
+        Xác suất "ai" của từng frame (video / ảnh động). Frame được kéo từ generator
+        theo batch_size rồi forward từng batch, không giữ mọi frame trong memory.
+        """
+        frames = iter(frames)
+        scores: List[float] = []
+        while True:
+            start = time.perf_counter()
+            batch = list(islice(frames, batch_size))  # decode diễn ra khi kéo frame
+            if not batch:
+                return scores
+            decoded = time.perf_counter()
+            input_tensor = self.preprocess(batch)
+            preprocessed = time.perf_counter()
+
+            _, probs = self.forward(input_tensor)
+            scores.extend(probs[:, 1].tolist())
+
+            inference_stage_duration.observe(decoded - start, "decode")
+            inference_stage_duration.observe(preprocessed - decoded, "preprocess")
+            inference_stage_duration.observe(time.perf_counter() - preprocessed, "forward")
+            inference_batch_size.observe(len(batch))
+
+
 # -------------------------------
 # SINGLETON CHO AIDETECTOR
 # -------------------------------
 
 _detector_instance = None
 
-def get_ai_detector(model_path: str, device: str = "cpu"):
+def get_ai_detector(model_path: str, device: str = "cpu", token_merge_ratio: float = 0.0,
+                    shared_weights_path: str = ""):
     global _detector_instance
     if _detector_instance is None:
         print("[AI Detector] Initializing detector singleton...")
-        _detector_instance = AIDetector(model_path, device)
+        model = None
+        if shared_weights_path:
+            print(f"[AI Detector] Mapping shared weights: {shared_weights_path}")
+            model = load_shared_model(shared_weights_path)
+        _detector_instance = AIDetector(model_path, device, model=model, token_merge_ratio=token_merge_ratio)
     return _detector_instance
@@ -0,0 +1,45 @@
+"""
+Export weights của detector (backbone DINOv2 + head) thành 1 file để nạp bằng mmap
+(SHARED_WEIGHTS_PATH): mọi worker uvicorn trên cùng máy dùng chung page cache của
+file thay vì mỗi worker giữ một bản ~350 MB.
+
+    python -m ml_models.export_weights --output ml_models/backbone/detector_shared.pt
+    SHARED_WEIGHTS_PATH=ml_models/backbone/detector_shared.pt uvicorn main:app --workers 4
+
+Chạy lại sau mỗi lần đổi backbone / head. Tensor được ghi contiguous fp32, không kèm
+optimizer state.
+"""
+from typing import List, Optional
+import argparse
+import os
+import sys
+
+
+def export(model, output: str) -> int:
+    """Ghi state_dict; trả về số byte của file"""
+    import torch
+
+    state_dict = {name: tensor.detach().contiguous().cpu() for name, tensor in model.state_dict().items()}
+    tmp = output + ".tmp"
+    torch.save(state_dict, tmp)
+    os.replace(tmp, output)  # worker đang map file cũ vẫn đọc được bản cũ
+    return os.path.getsize(output)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export AI detector weights for mmap loading")
+    parser.add_argument("--output", default="ml_models/backbone/detector_shared.pt")
+    args = parser.parse_args(argv)
+
+    from ml_models.ai_detector import AIDetector, load_shared_model
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    detector = AIDetector(None, "cpu")
+    size = export(detector.model, args.output)
+    load_shared_model(args.output)  # kiểm tra file nạp lại được
+    print(f"Wrote {args.output} ({size / 1024 / 1024:.0f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Lấy mẫu frame từ video và ảnh động (GIF / WebP) để chấm AI theo từng frame.
+
+Mỗi media có ngân sách decode (FrameBudget): tối đa max_frames frame, dừng khi decode
+quá max_seconds, frame có cạnh dài hơn max_side bị thu nhỏ ngay lúc decode. Frame
+được lấy đều theo thời gian (video) hoặc theo chỉ số frame (ảnh động) và trả ra dạng
+generator để detector chấm theo batch, không giữ cả video trong memory.
+
+Video: seek tới keyframe trước mỗi mốc thời gian rồi decode tới mốc, nên lượng decode
+theo số mốc và độ dài GOP, không theo độ dài video. Cần PyAV (optional dependency);
+thiếu thì bỏ qua video.
+"""
+from dataclasses import dataclass
+from typing import Iterator, List
+from PIL import Image
+import io
+import logging
+import time
+
+
+@dataclass
+class FrameBudget:
+    max_frames: int = 8
+    max_seconds: float = 2.0
+    max_side: int = 512
+
+
+class _DecodeClock:
+    """Chỉ tính thời gian trong generator (decode), không tính lúc detector chạy giữa các frame"""
+
+    def __init__(self, seconds: float):
+        self.remaining = seconds
+        self._started = time.perf_counter()
+
+    def exceeded(self) -> bool:
+        return time.perf_counter() - self._started >= self.remaining
+
+    def pause(self):
+        self.remaining -= time.perf_counter() - self._started
+
+    def resume(self):
+        self._started = time.perf_counter()
+
+
+def _spread(count: int, samples: int) -> List[int]:
+    """samples chỉ số cách đều trong [0, count), lấy giữa mỗi đoạn"""
+    samples = min(samples, count)
+    return sorted({int((i + 0.5) * count / samples) for i in range(samples)})
+
+
+def _scaled_size(width: int, height: int, max_side: int):
+    scale = min(1.0, max_side / max(width, height, 1))
+    # rgb24 yêu cầu kích thước chẵn với nhiều codec
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def is_animated(data: bytes) -> bool:
+    """GIF / WebP nhiều frame"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return getattr(image, "is_animated", False) and getattr(image, "n_frames", 1) > 1
+    except Exception:
+        return False
+
+
+def sample_image_frames(data: bytes, budget: FrameBudget) -> Iterator[Image.Image]:
+    """Frame lấy đều từ ảnh động (GIF / WebP / APNG)"""
+    clock = _DecodeClock(budget.max_seconds)
+    with Image.open(io.BytesIO(data)) as image:
+        n_frames = getattr(image, "n_frames", 1)
+        for index in _spread(n_frames, budget.max_frames):
+            if clock.exceeded():
+                logging.info(f"[FrameSampler] Decode budget hit at frame {index}/{n_frames}")
+                return
+            image.seek(index)
+            frame = image.convert("RGB")
+            frame.thumbnail((budget.max_side, budget.max_side))
+            clock.pause()
+            yield frame
+            clock.resume()
+
+
+def sample_video_frames(data: bytes, budget: FrameBudget) -> Iterator[Image.Image]:
+    """Frame lấy đều theo thời gian từ video"""
+    try:
+        import av  # optional dependency
+    except ImportError:
+        logging.warning("[FrameSampler] PyAV not installed, skipping video analysis")
+        return
+
+    clock = _DecodeClock(budget.max_seconds)
+    with av.open(io.BytesIO(data)) as container:
+        if not container.streams.video:
+            return
+        stream = container.streams.video[0]
+        stream.thread_count = 1  # đã chạy trên inference queue, không giành thêm CPU
+        width, height = _scaled_size(stream.codec_context.width, stream.codec_context.height, budget.max_side)
+
+        if stream.duration is not None and stream.time_base is not None:
+            duration = float(stream.duration * stream.time_base)
+        elif container.duration is not None:
+            duration = container.duration / av.time_base
+        else:
+            duration = 0.0
+
+        if duration <= 0:
+            # Không biết độ dài (vd. stream không có index): chỉ lấy các frame đầu
+            for i, frame in enumerate(container.decode(stream)):
+                if i >= budget.max_frames or clock.exceeded():
+                    return
+                image = frame.to_image(width=width, height=height)
+                clock.pause()
+                yield image
+                clock.resume()
+            return
+
+        # Mốc thời gian lấy đều, tính theo phần nghìn giây
+        millis = max(int(duration * 1000), 1)
+        last_pts = None
+        for offset_ms in _spread(millis, budget.max_frames):
+            if clock.exceeded():
+                logging.info(f"[FrameSampler] Decode budget hit at {offset_ms / 1000:.1f}s/{duration:.1f}s")
+                return
+            target = offset_ms / 1000
+            container.seek(int(target / stream.time_base), stream=stream, backward=True, any_frame=False)
+            # Seek về keyframe trước mốc rồi decode tới mốc (GOP dài: tốn thêm nhưng vẫn
+            # trong ngân sách thời gian); hết ngân sách thì lấy frame gần nhất đã có
+            frame = None
+            for frame in container.decode(stream):
+                if frame.time is None or frame.time >= target or clock.exceeded():
+                    break
+            if frame is None or frame.pts == last_pts:
+                continue
+            last_pts = frame.pts
+            image = frame.to_image(width=width, height=height)
+            clock.pause()
+            yield image
+            clock.resume()
+
+
+def sample_frames(data: bytes, media_type: str, budget: FrameBudget) -> Iterator[Image.Image]:
+    if media_type == "video":
+        return sample_video_frames(data, budget)
+    return sample_image_frames(data, budget)
@@ -0,0 +1,139 @@
+"""
+Token merging (ToMe, Bolya et al. 2023) cho backbone DINOv2: sau attention của mỗi
+block, gộp r cặp patch token giống nhau nhất (bipartite soft matching trên key) thành
+trung bình có trọng số, nên các block sau xử lý ít token hơn. Không cần train lại;
+attention cộng log(size) để token đã gộp vẫn có trọng số như số token nó đại diện.
+
+Patch tại chỗ bằng đổi __class__ của backbone, block và attention (không sửa code
+DINOv2 từ torch.hub). ratio là tỉ lệ patch token bị gộp khi qua hết các block:
+r = ratio * số patch / số block mỗi block, tính theo kích thước input mỗi lần forward
+(dùng được cho cả cascade low-res). CLS (và register token) không bao giờ bị gộp.
+"""
+from typing import Callable, Dict, Tuple
+import threading
+import torch
+import torch.nn as nn
+
+
+class _ToMeState(threading.local):
+    """Trạng thái của forward đang chạy; riêng theo thread (inference_workers > 1)"""
+    r: int = 0
+    size: torch.Tensor = None
+
+
+def bipartite_soft_matching(metric: torch.Tensor, r: int, protected: int) -> Callable:
+    """
+    Hàm merge gộp r token: chia token (trừ protected token đầu) xen kẽ thành A / B,
+    mỗi token A nối với token B giống nhất, r cạnh mạnh nhất được gộp vào B.
+    """
+    t = metric.shape[1] - protected
+    r = min(r, t // 2)
+    if r <= 0:
+        return lambda x, mode="sum": x
+
+    with torch.no_grad():
+        metric = metric[:, protected:]
+        metric = metric / metric.norm(dim=-1, keepdim=True)
+        a, b = metric[:, ::2], metric[:, 1::2]
+        scores = a @ b.transpose(-1, -2)
+        node_max, node_idx = scores.max(dim=-1)
+        edge_idx = node_max.argsort(dim=-1, descending=True)[..., None]
+        unm_idx = edge_idx[:, r:]  # token A giữ lại
+        src_idx = edge_idx[:, :r]  # token A bị gộp
+        dst_idx = node_idx[..., None].gather(dim=1, index=src_idx)
+
+    def merge(x: torch.Tensor, mode: str = "sum") -> torch.Tensor:
+        keep, rest = x[:, :protected], x[:, protected:]
+        src, dst = rest[:, ::2], rest[:, 1::2]
+        n, t1, c = src.shape
+        unm = src.gather(dim=1, index=unm_idx.expand(n, t1 - r, c))
+        src = src.gather(dim=1, index=src_idx.expand(n, r, c))
+        dst = dst.scatter_reduce(1, dst_idx.expand(n, r, c), src, reduce=mode)
+        return torch.cat([keep, unm, dst], dim=1)
+
+    return merge
+
+
+def merge_wavg(merge: Callable, x: torch.Tensor, size: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Gộp theo trung bình có trọng số số token gốc"""
+    if size is None:
+        size = torch.ones_like(x[..., 0, None])
+    x = merge(x * size, mode="sum")
+    size = merge(size, mode="sum")
+    return x / size, size
+
+
+# -------------------------------
+# PATCH DINOv2
+# -------------------------------
+
+class _ToMeAttention:
+    def forward(self, x: torch.Tensor, size: torch.Tensor = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Như Attention của DINOv2, thêm proportional attention; trả thêm key trung bình các head"""
+        B, N, C = x.shape
+        qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
+        q, k, v = qkv[0] * self.scale, qkv[1], qkv[2]
+        attn = q @ k.transpose(-2, -1)
+        if size is not None:
+            attn = attn + size.log()[:, None, None, :, 0]
+        attn = self.attn_drop(attn.softmax(dim=-1))
+        x = (attn @ v).transpose(1, 2).reshape(B, N, C)
+        x = self.proj_drop(self.proj(x))
+        return x, k.mean(1)
+
+
+class _ToMeBlock:
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        state = self._tome_state
+        x_attn, metric = self.attn(self.norm1(x), state.size)
+        x = x + self.ls1(x_attn)
+        if state.r > 0:
+            merge = bipartite_soft_matching(metric, state.r, self._tome_protected)
+            x, state.size = merge_wavg(merge, x, state.size)
+        return x + self.ls2(self.mlp(self.norm2(x)))
+
+
+class _ToMeVisionTransformer:
+    def forward(self, x: torch.Tensor, *args, **kwargs):
+        patch = self.patch_size if isinstance(self.patch_size, int) else self.patch_size[0]
+        tokens = (x.shape[-2] // patch) * (x.shape[-1] // patch)
+        self._tome_state.r = int(self.tome_ratio * tokens / self._tome_depth)
+        self._tome_state.size = None
+        return super().forward(x, *args, **kwargs)
+
+
+_patched_classes: Dict[Tuple[type, type], type] = {}
+
+
+def _swap_class(module: nn.Module, mixin: type):
+    cls = module.__class__
+    if issubclass(cls, mixin):
+        return
+    patched = _patched_classes.get((mixin, cls))
+    if patched is None:
+        patched = _patched_classes.setdefault((mixin, cls), type(f"ToMe{cls.__name__}", (mixin, cls), {}))
+    module.__class__ = patched
+
+
+def apply_token_merging(backbone: nn.Module, ratio: float) -> nn.Module:
+    """Patch backbone DINOv2 tại chỗ; ratio trong [0, 1), đổi lại được qua backbone.tome_ratio"""
+    if not 0 <= ratio < 1:
+        raise ValueError(f"token merge ratio must be in [0, 1), got {ratio}")
+    if not hasattr(backbone, "blocks") or not hasattr(backbone, "patch_size"):
+        raise ValueError("token merging needs a DINOv2-style backbone (.blocks, .patch_size)")
+
+    # block_chunks > 0: blocks là các BlockChunk (ModuleList) chứa block thật
+    blocks = [block for chunk in backbone.blocks
+              for block in (chunk if isinstance(chunk, nn.ModuleList) else [chunk]) if hasattr(block, "attn")]
+    state = _ToMeState()
+    protected = 1 + getattr(backbone, "num_register_tokens", 0)
+    _swap_class(backbone, _ToMeVisionTransformer)
+    backbone.tome_ratio = ratio
+    backbone._tome_state = state
+    backbone._tome_depth = len(blocks)
+    for block in blocks:
+        _swap_class(block, _ToMeBlock)
+        _swap_class(block.attn, _ToMeAttention)
+        block._tome_state = state
+        block._tome_protected = protected
+    return backbone
@@ -0,0 +1,9 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class BatchGetRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=100)
+
+class BatchError(BaseModel):
+    status: int  # HTTP status mà endpoint đơn lẻ sẽ trả
+    detail: str
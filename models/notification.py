@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List
 
 class NotificationResponse(BaseModel):
     id: str
@@ -10,4 +11,7 @@ class NotificationResponse(BaseModel):
     body: str | None
     is_read: bool
     created_at: datetime
-    actor: dict | None = None
\ No newline at end of file
+    actor: dict | None = None
+    actor_count: int = 1  # Số người like (notification đã gộp)
+    actor_ids: List[str] | None = None  # Các actor gần nhất, mới nhất trước
+    actors: List[dict] | None = None
\ No newline at end of file
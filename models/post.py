@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+from models.batch import BatchError
 
 class PostCreate(BaseModel):
     content: str | None = None
@@ -31,4 +32,14 @@ class PostResponse(BaseModel):
     status: str | None = None  # pending, approved, rejected, error
     ai_perc: float | None = None  # Phần trăm ảnh AI trong post
     media: List[MediaResponse] = []
-    is_liked: bool = False
\ No newline at end of file
+    is_liked: bool = False
+
+class PostBatchItem(BaseModel):
+    id: str
+    post: PostResponse | None = None
+    error: BatchError | None = None
+
+class LikedBatchItem(BaseModel):
+    id: str
+    liked: bool | None = None
+    error: BatchError | None = None
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from models.batch import BatchError
 
 class ProfileResponse(BaseModel):
     id: str
@@ -11,4 +12,9 @@ class ProfileResponse(BaseModel):
 
 class ProfileUpdate(BaseModel):
     display_name: str | None = None
-    avatar_url: str | None = None
\ No newline at end of file
+    avatar_url: str | None = None
+
+class ProfileBatchItem(BaseModel):
+    id: str
+    profile: ProfileResponse | None = None
+    error: BatchError | None = None
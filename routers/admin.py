@@ -2,8 +2,19 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from supabase import Client
 from typing import List
 from services.supabase_client import get_supabase_admin_client
+from services.notification_service import send_notification
+from services.stats_service import get_stats_store, SERIES
+from services.post_queries import fetch_profiles, fetch_media
+from services.role_cache import get_role_cache
+from services.admission import get_admission_controller
+from services.single_flight import get_single_flight
+from services.timeline import get_timeline_service
 from dependencies import require_admin
+from utils.serialization import FastJSONResponse
 from pydantic import BaseModel
+from datetime import datetime
+from uuid import UUID
+import logging
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -13,37 +24,62 @@ class ReviewPostRequest(BaseModel):
 class UpdateRoleRequest(BaseModel):
     role: str  # "user" or "admin"
 
+ADMIN_POST_SORTS = {"created_at", "ai_perc", "like_count"}
+
 @router.get("/posts")
 async def get_all_posts(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
-    status: str | None = None,
+    status: str | None = Query(None, description="pending, approved, rejected, error"),
+    ai_min: float | None = Query(None, ge=0, le=100),
+    ai_max: float | None = Query(None, ge=0, le=100),
+    owner_id: UUID | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    sort: str = Query("created_at", description="created_at, ai_perc, like_count"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
     current_admin = Depends(require_admin),
     supabase: Client = Depends(get_supabase_admin_client)
 ):
-    """Admin: Lấy tất cả posts (bao gồm private)"""
-    query = supabase.table("posts").select("*")
+    """
+    Admin: Lấy tất cả posts (bao gồm private), 3 query mỗi trang.
+    Index dùng cho các filter: supabase/migrations/*_admin_post_listing_indexes.sql
+    """
+    if sort not in ADMIN_POST_SORTS:
+        raise HTTPException(status_code=400, detail="Invalid sort field")
     
-    # Filter by status if provided
-    # Note: You might need to add an ai_status column to posts table
-    # if status:
-    #     query = query.eq("ai_status", status)
+    query = supabase.table("posts").select("*")
     
-    # Pagination
+    if status:
+        query = query.eq("status", status)
+    if ai_min is not None:
+        query = query.gte("ai_perc", ai_min)
+    if ai_max is not None:
+        query = query.lte("ai_perc", ai_max)
+    if owner_id:
+        query = query.eq("owner_id", str(owner_id))
+    if created_from:
+        query = query.gte("created_at", created_from.isoformat())
+    if created_to:
+        query = query.lt("created_at", created_to.isoformat())
+    
+    # Pagination, id làm tie-breaker để trang ổn định khi sort trùng giá trị
     offset = (page - 1) * limit
-    result = query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+    desc = order == "desc"
+    result = query.order(sort, desc=desc).order("id", desc=desc).range(offset, offset + limit - 1).execute()
     
     posts = result.data
     
-    # Enrich with owner info
+    # Enrich với owner + media theo batch
+    owners = fetch_profiles(supabase, [post["owner_id"] for post in posts])
+    media = fetch_media(supabase, [post["id"] for post in posts], with_urls=False)
+    
     for post in posts:
-        owner = supabase.table("profiles").select("*").eq("id", post["owner_id"]).execute()
-        post["owner"] = owner.data[0] if owner.data else None
-        
-        media = supabase.table("post_media").select("*").eq("post_id", post["id"]).order("order").execute()
-        post["media"] = media.data
+        post["owner"] = owners.get(post["owner_id"])
+        post["media"] = media.get(post["id"], [])
     
-    return posts
+    # Không có response_model: trả thẳng bytes, bỏ qua jsonable_encoder
+    return FastJSONResponse(posts)
 
 @router.patch("/posts/{post_id}/review")
 async def review_post(
@@ -70,7 +106,7 @@ async def review_post(
         "type": "admin_review",
         "body": f"Your post has been {notification_body}"
     }
-    supabase.table("notifications").insert(notification_data).execute()
+    send_notification(supabase, notification_data)
     
     return {"message": "Post reviewed successfully", "status": data.ai_status}
 
@@ -92,13 +128,40 @@ async def delete_post_admin(
         "type": "post_deleted",
         "body": "Your post has been removed by an administrator"
     }
-    supabase.table("notifications").insert(notification_data).execute()
+    send_notification(supabase, notification_data)
     
     # Delete post
     supabase.table("posts").delete().eq("id", post_id).execute()
+    get_timeline_service().post_deleted(post.data[0])
     
     return {"message": "Post deleted successfully"}
 
+@router.get("/duplicates")
+async def get_duplicate_flags(
+    limit: int = Query(50, ge=1, le=1000),
+    current_admin = Depends(require_admin),
+    supabase: Client = Depends(get_supabase_admin_client)
+):
+    """Admin: Danh sách media bị phát hiện là near-duplicate khi upload"""
+    result = supabase.table("post_media")\
+        .select("id, post_id, duplicate_of, duplicate_distance, created_at, posts(owner_id)")\
+        .not_.is_("duplicate_of", "null")\
+        .order("created_at", desc=True)\
+        .limit(limit)\
+        .execute()
+    
+    return [
+        {
+            "media_id": m["id"],
+            "post_id": m["post_id"],
+            "owner_id": (m.get("posts") or {}).get("owner_id"),
+            "duplicate_of": m["duplicate_of"],
+            "distance": m.get("duplicate_distance"),
+            "flagged_at": m["created_at"]
+        }
+        for m in result.data
+    ]
+
 @router.get("/users")
 async def get_all_users(
     page: int = Query(1, ge=1),
@@ -123,11 +186,24 @@ async def update_user_role(
     if data.role not in ["user", "admin"]:
         raise HTTPException(status_code=400, detail="Invalid role")
     
+    # app_metadata.role là role claim trong token: sửa trước, lỗi thì không đổi profiles,
+    # để token refresh sau này không mang role cũ
+    try:
+        supabase.auth.admin.update_user_by_id(user_id, {"app_metadata": {"role": data.role}})
+    except Exception as e:
+        if getattr(e, "status", None) == 404:
+            raise HTTPException(status_code=404, detail="User not found")
+        logging.error(f"[Admin] Failed to update app_metadata role for {user_id}: {e}")
+        raise HTTPException(status_code=502, detail="Failed to update auth user role")
+    
     result = supabase.table("profiles").update({"role": data.role}).eq("id", user_id).execute()
     
     if not result.data:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Role mới có hiệu lực ngay, kể cả với token đang mang role claim cũ
+    get_role_cache().invalidate(user_id, data.role)
+    
     return result.data[0]
 
 @router.get("/stats")
@@ -135,23 +211,36 @@ async def get_admin_stats(
     current_admin = Depends(require_admin),
     supabase: Client = Depends(get_supabase_admin_client)
 ):
-    """Admin: Thống kê tổng quan"""
-    # Count users
-    users = supabase.table("profiles").select("id", count="exact").execute()
-    
-    # Count posts
-    posts = supabase.table("posts").select("id", count="exact").execute()
-    
-    # Count public posts
-    public_posts = supabase.table("posts").select("id", count="exact").eq("is_private", False).execute()
-    
-    # Count total likes
-    likes = supabase.table("post_likes").select("id", count="exact").execute()
+    """Admin: Thống kê tổng quan (counter trong DB do trigger cập nhật, không count exact)"""
+    return get_stats_store().totals(supabase)
+
+@router.get("/stats/series")
+async def get_admin_stats_series(
+    metric: str = Query(..., description="posts, likes, ai_approved, ai_rejected, ai_rejection_rate"),
+    interval: str = Query("hour", pattern="^(hour|day)$"),
+    hours: int = Query(48, ge=1, le=24 * 90),
+    current_admin = Depends(require_admin)
+):
+    """Admin: Series theo giờ/ngày từ store tính sẵn"""
+    if metric not in SERIES and metric != "ai_rejection_rate":
+        raise HTTPException(status_code=400, detail="Invalid metric")
     
     return {
-        "total_users": users.count or 0,
-        "total_posts": posts.count or 0,
-        "public_posts": public_posts.count or 0,
-        "private_posts": (posts.count or 0) - (public_posts.count or 0),
-        "total_likes": likes.count or 0
-    }
\ No newline at end of file
+        "metric": metric,
+        "interval": interval,
+        "points": get_stats_store().series(metric, hours, interval)
+    }
+
+@router.get("/admission")
+async def get_admission_state(
+    current_admin = Depends(require_admin)
+):
+    """Admin: Trạng thái admission control của worker này (slot, hàng đợi, inference queue)"""
+    return get_admission_controller().snapshot()
+
+@router.get("/single-flight")
+async def get_single_flight_state(
+    current_admin = Depends(require_admin)
+):
+    """Admin: Thống kê gộp read nóng của worker này (leader / joined / cached, hit rate)"""
+    return get_single_flight().snapshot()
@@ -3,6 +3,7 @@ from supabase import Client
 from typing import List
 from services.supabase_client import get_supabase_client
 from services.ai_service import get_ai_service, AIService
+from services.notification_service import send_notification
 from dependencies import get_current_user
 from models.ai import AICheckResponse
 
@@ -26,7 +27,7 @@ async def check_ai(
         raise HTTPException(status_code=403, detail="Not the post owner")
     
     # Get all media
-    media = supabase.table("post_media").select("*").eq("post_id", post_id).eq("media_type", "image").execute()
+    media = supabase.table("post_media").select("*").eq("post_id", post_id).in_("media_type", ["image", "video"]).execute()
     
     if not media.data:
         return AICheckResponse(
@@ -40,8 +41,8 @@ async def check_ai(
         file_content = supabase.storage.from_("media").download(m["storage_path"])
         images_bytes.append(file_content)
     
-    # Check with AI
-    result = await ai_service.check_images(images_bytes)
+    # Check with AI (video chấm theo frame lấy mẫu)
+    result = await ai_service.check_images(images_bytes, [m["media_type"] for m in media.data])
     
     # Create notification if approved
     if result["status"] == "approved_non_ai":
@@ -51,7 +52,7 @@ async def check_ai(
             "type": "post_approved",
             "body": "Your post has been approved as non-AI content"
         }
-        supabase.table("notifications").insert(notification_data).execute()
+        send_notification(supabase, notification_data)
     
     return AICheckResponse(**result)
 
@@ -2,6 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from supabase import Client
 from typing import List
 from services.supabase_client import get_supabase_client
+from services.notification_coalescer import get_like_coalescer
+from services.stats_service import get_stats_store
+from services.liked_cache import get_liked_cache
 from dependencies import get_current_user
 
 router = APIRouter(prefix="/posts/{post_id}", tags=["Likes"])
@@ -32,21 +35,19 @@ async def like_post(
     }
     
     result = supabase.table("post_likes").insert(like_data).execute()
+    get_stats_store().post_liked()
+    get_liked_cache().added(current_user.id, post_id)
     
     # Update like count
     new_count = post.data[0]["like_count"] + 1
     supabase.table("posts").update({"like_count": new_count}).eq("id", post_id).execute()
     
-    # Create notification for post owner (if not self-like)
+    # Create notification for post owner (if not self-like), gộp theo batch
     if post.data[0]["owner_id"] != current_user.id:
-        notification_data = {
-            "recipient_id": post.data[0]["owner_id"],
-            "actor_id": current_user.id,
-            "post_id": post_id,
-            "type": "like",
-            "body": "liked your post"
-        }
-        supabase.table("notifications").insert(notification_data).execute()
+        coalescer = get_like_coalescer()
+        coalescer.add_like(post.data[0]["owner_id"], post_id, current_user.id)
+        if coalescer.window_seconds <= 0:
+            coalescer.flush(supabase)
     
     return result.data[0]
 
@@ -71,6 +72,7 @@ async def unlike_post(
     
     # Delete like
     supabase.table("post_likes").delete().eq("post_id", post_id).eq("user_id", current_user.id).execute()
+    get_liked_cache().removed(current_user.id, post_id)
     
     # Update like count
     new_count = max(0, post.data[0]["like_count"] - 1)
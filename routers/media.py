@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, status
 from supabase import Client
 from typing import List
 from services.supabase_client import get_supabase_client
-from dependencies import get_current_user
+from services.embedding_store import get_similarity_index
+from services.dedup_service import get_dedup_service
+from dependencies import get_current_user, get_current_user_optional
 from config import get_settings
 from pydantic import BaseModel
+import asyncio
 import uuid
 
 router = APIRouter(prefix="/media", tags=["Media"])
@@ -32,14 +35,27 @@ async def upload_temp_media(
         raise HTTPException(status_code=400, detail="Invalid file type")
     
     file_content = await file.read()
-    file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    storage_path = f"temp/{uuid.uuid4()}.{file_ext}"
     
-    supabase.storage.from_(settings.storage_bucket).upload(
-        storage_path,
-        file_content,
-        {"content-type": content_type}
-    )
+    # Near-duplicate check, kết quả được dùng lại khi link vào post
+    dedup_result = None
+    if settings.dedup_enabled and media_type == "image":
+        dedup_result = await asyncio.to_thread(get_dedup_service().inspect, file_content, current_user.id)
+    
+    if dedup_result and dedup_result.exact_storage_path:
+        # File giống hệt từng byte → không upload lại
+        storage_path = dedup_result.exact_storage_path
+    else:
+        file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
+        storage_path = f"temp/{uuid.uuid4()}.{file_ext}"
+        
+        supabase.storage.from_(settings.storage_bucket).upload(
+            storage_path,
+            file_content,
+            {"content-type": content_type}
+        )
+    
+    if dedup_result:
+        get_dedup_service().remember_pending(storage_path, dedup_result)
     
     public_url = supabase.storage.from_(settings.storage_bucket).get_public_url(storage_path)
     
@@ -59,6 +75,43 @@ async def get_media_url(
     public_url = supabase.storage.from_(settings.storage_bucket).get_public_url(path)
     return {"url": public_url}
 
+@router.get("/{media_id}/similar")
+async def get_similar_media(
+    media_id: str,
+    k: int = Query(10, ge=1, le=50),
+    current_user = Depends(get_current_user_optional),
+    supabase: Client = Depends(get_supabase_client)
+):
+    """Tìm media tương tự dựa trên DINOv2 embedding đã lưu"""
+    # Search (và build index lần đầu) là CPU-bound, không chạy trên event loop
+    matches = await asyncio.to_thread(get_similarity_index().similar_to, media_id, k)
+    
+    if matches is None:
+        raise HTTPException(status_code=404, detail="No embedding for this media")
+    
+    if not matches:
+        return []
+    
+    scores = dict(matches)
+    rows = supabase.table("post_media")\
+        .select("id, post_id, storage_path, media_type, ai_perc, is_ai, posts(owner_id, status, is_private)")\
+        .in_("id", list(scores))\
+        .execute()
+    
+    results = []
+    for m in rows.data:
+        post = m.pop("posts", None) or {}
+        is_owner = current_user is not None and post.get("owner_id") == current_user.id
+        # Chỉ trả media của post public đã duyệt (hoặc của chính mình)
+        if not is_owner and (post.get("status") != "approved" or post.get("is_private")):
+            continue
+        m["url"] = supabase.storage.from_(settings.storage_bucket).get_public_url(m["storage_path"])
+        m["score"] = scores[m["id"]]
+        results.append(m)
+    
+    results.sort(key=lambda m: m["score"], reverse=True)
+    return results
+
 # FIX: Moved to posts router - this should be in posts.py
 posts_router = APIRouter(prefix="/posts", tags=["Posts"])
 
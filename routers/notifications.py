@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from supabase import Client
 from typing import List
 from services.supabase_client import get_supabase_client
-from dependencies import get_current_user
+from services.notification_hub import get_notification_hub
+from services.unread_counter import get_unread_counter
+from dependencies import get_current_user, get_current_user_stream
 from models.notification import NotificationResponse
+from utils.serialization import ListSerializer
+import asyncio
+import json
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
+notification_list_serializer = ListSerializer(NotificationResponse)
+
 @router.get("", response_model=List[NotificationResponse])
 async def get_notifications(
     page: int = Query(1, ge=1),
@@ -27,15 +35,24 @@ async def get_notifications(
     
     notifications = result.data
     
-    # Enrich with actor info
+    # Enrich with actor info - 1 query cho cả trang
+    actor_ids = set()
     for notif in notifications:
         if notif.get("actor_id"):
-            actor = supabase.table("profiles").select("*").eq("id", notif["actor_id"]).execute()
-            notif["actor"] = actor.data[0] if actor.data else None
-        else:
-            notif["actor"] = None
+            actor_ids.add(notif["actor_id"])
+        actor_ids.update(notif.get("actor_ids") or [])
+    
+    actors = {}
+    if actor_ids:
+        profiles = supabase.table("profiles").select("*").in_("id", list(actor_ids)).execute()
+        actors = {p["id"]: p for p in profiles.data}
+    
+    for notif in notifications:
+        notif["actor"] = actors.get(notif.get("actor_id"))
+        if notif.get("actor_ids"):
+            notif["actors"] = [actors[a] for a in notif["actor_ids"] if a in actors]
     
-    return notifications
+    return notification_list_serializer.response(notifications)
 
 @router.patch("/{notification_id}/read")
 async def mark_as_read(
@@ -55,6 +72,9 @@ async def mark_as_read(
     
     # Update
     result = supabase.table("notifications").update({"is_read": True}).eq("id", notification_id).execute()
+    get_notification_hub().publish(current_user.id, {"type": "read", "notification_id": notification_id})
+    if not notif.data[0]["is_read"]:
+        get_unread_counter().decr(current_user.id)
     
     return result.data[0]
 
@@ -65,6 +85,8 @@ async def mark_all_read(
 ):
     """Đánh dấu tất cả notifications đã đọc"""
     supabase.table("notifications").update({"is_read": True}).eq("recipient_id", current_user.id).eq("is_read", False).execute()
+    get_notification_hub().publish(current_user.id, {"type": "read_all"})
+    get_unread_counter().reset(current_user.id)
     
     return {"message": "All notifications marked as read"}
 
@@ -73,7 +95,39 @@ async def get_unread_count(
     current_user = Depends(get_current_user),
     supabase: Client = Depends(get_supabase_client)
 ):
-    """Lấy số lượng notifications chưa đọc"""
-    result = supabase.table("notifications").select("id", count="exact").eq("recipient_id", current_user.id).eq("is_read", False).execute()
+    """Lấy số lượng notifications chưa đọc (từ counter, không count exact)"""
+    return {"count": get_unread_counter().get(supabase, current_user.id)}
+
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    current_user = Depends(get_current_user_stream)
+):
+    """
+    Server-Sent Events: đẩy notification mới và thay đổi trạng thái đọc,
+    thay cho việc poll /notifications và /notifications/unread-count
+    """
+    hub = get_notification_hub()
+    queue = hub.subscribe(current_user.id)
+    
+    async def event_stream():
+        try:
+            yield "event: ready\ndata: {}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep-alive để proxy không đóng connection
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            hub.unsubscribe(current_user.id, queue)
     
-    return {"count": result.count or 0}
\ No newline at end of file
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
@@ -1,13 +1,31 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, BackgroundTasks, Request, Response
 from supabase import Client
+from postgrest import ReturnMethod
 from typing import List
-from models.post import PostCreate, PostUpdate, PostResponse
+from models.batch import BatchGetRequest
+from models.post import PostCreate, PostUpdate, PostResponse, PostBatchItem, LikedBatchItem
 from services.supabase_client import get_supabase_client
 from services.ai_service import get_ai_service, AIService
+from services.embedding_store import get_embedding_store
+from services.dedup_service import get_dedup_service, reused_verdict, to_signed
+from services.notification_coalescer import get_like_coalescer
+from services.notification_service import send_notification
+from services.stats_service import get_stats_store
+from services.post_queries import fetch_profiles, fetch_media
+from services.timeline import get_timeline_service, is_public
+from services.liked_cache import get_liked_cache, liked_among
+from services.metrics import background_jobs
+from services.version_cache import (
+    POST_META_COLUMNS, post_meta, profile_meta, remember_post, remember_profile,
+    make_etag, etag_matches, not_modified, set_cache_headers,
+)
 from dependencies import get_current_user, get_current_user_optional
+from utils.batch import invalid_ids, batch_results
+from utils.serialization import FastJSONResponse, ListSerializer
 from pydantic import BaseModel
 from config import get_settings
+import asyncio
 import uuid
 
 settings = get_settings()
@@ -19,6 +37,14 @@ class LinkMediaRequest(BaseModel):
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
+# media_type được chấm AI; video / ảnh động chấm theo frame lấy mẫu
+ANALYZED_MEDIA_TYPES = ["image", "video"]
+
+# Serializer biên dịch sẵn cho list endpoint: row đã tin cậy, không validate lại
+post_list_serializer = ListSerializer(PostResponse)
+post_batch_serializer = ListSerializer(PostBatchItem)
+liked_batch_serializer = ListSerializer(LikedBatchItem)
+
 async def process_ai_detection(
     post_id: str,
     supabase: Client,
@@ -26,15 +52,17 @@ async def process_ai_detection(
 ):
     """Background task để đánh giá AI cho post"""
     try:
-        # Lấy tất cả media của post
-        media_result = supabase.table("post_media").select("*").eq("post_id", post_id).eq("media_type", "image").execute()
+        # Lấy tất cả media của post (video / ảnh động chấm theo frame)
+        media_result = supabase.table("post_media").select("*").eq("post_id", post_id).in_("media_type", ANALYZED_MEDIA_TYPES).execute()
         
         if not media_result.data:
-            # Không có ảnh, approved luôn
-            supabase.table("posts").update({
+            # Không có ảnh / video, approved luôn
+            updated = supabase.table("posts").update({
                 "status": "approved",
                 "ai_perc": 0.0  # ← FIX: Set NULL thay vì 0.0 để tránh constraint error
             }).eq("id", post_id).execute()
+            if updated.data:
+                get_timeline_service().post_changed(updated.data[0])
             
             # Get post owner
             post = supabase.table("posts").select("owner_id").eq("id", post_id).execute()
@@ -45,7 +73,7 @@ async def process_ai_detection(
                     "type": "post_approved",
                     "body": "Your post has been approved"
                 }
-                supabase.table("notifications").insert(notification_data).execute()
+                send_notification(supabase, notification_data)
             return
         
         # Đánh giá từng ảnh
@@ -54,19 +82,40 @@ async def process_ai_detection(
         
         for media in media_result.data:
             try:
+                # Ảnh trùng với media đã chấm → dùng lại kết quả, không chạy model
+                if media.get("duplicate_of") and media.get("is_ai") is not None:
+                    if media["is_ai"]:
+                        ai_count += 1
+                    continue
+                
                 # Download image
                 file_content = supabase.storage.from_(settings.storage_bucket).download(media["storage_path"])
                 
                 # Check AI
-                result = await ai_service.check_single_image(file_content)
+                result = await ai_service.check_media(file_content, media["media_type"])
+                if media["media_type"] == "video" and result["label"] == "unknown":
+                    # Không decode được video (vd. thiếu PyAV): không tính vào tỉ lệ
+                    total_images -= 1
+                    continue
                 
                 # Update media record - chỉ set ai_perc nếu > 0
                 media_update = {"is_ai": result["is_ai"]}
                 if result["confidence"] > 0:
                     media_update["ai_perc"] = result["confidence"]
                 
+                # Backfill perceptual hash cho media upload trước khi có dedup
+                if settings.dedup_enabled and media["media_type"] == "image" and media.get("phash") is None:
+                    dedup_result = await asyncio.to_thread(get_dedup_service().inspect, file_content)
+                    if dedup_result:
+                        media_update["phash"] = to_signed(dedup_result.phash)
+                        get_dedup_service().add(media["id"], media["storage_path"], dedup_result)
+                
                 supabase.table("post_media").update(media_update).eq("id", media["id"]).execute()
                 
+                # Lưu embedding để tìm ảnh tương tự / chấm lại bằng head mới
+                if result.get("embedding") is not None:
+                    get_embedding_store().put(media["id"], result["embedding"])
+                
                 if result["is_ai"]:
                     ai_count += 1
                     
@@ -87,7 +136,9 @@ async def process_ai_detection(
         
         post_update["ai_perc"] = ai_percentage
         
-        supabase.table("posts").update(post_update).eq("id", post_id).execute()
+        updated = supabase.table("posts").update(post_update).eq("id", post_id).execute()
+        if updated.data:
+            get_timeline_service().post_changed(updated.data[0])
         
         # Send notification
         post = supabase.table("posts").select("owner_id").eq("id", post_id).execute()
@@ -103,14 +154,43 @@ async def process_ai_detection(
                 "type": f"post_{new_status}",
                 "body": body
             }
-            supabase.table("notifications").insert(notification_data).execute()
+            send_notification(supabase, notification_data)
             
     except Exception as e:
         logging.error(f"Error in AI detection for post {post_id}: {e}")
         # Mark as error status
-        supabase.table("posts").update({
+        updated = supabase.table("posts").update({
             "status": "error"
         }).eq("id", post_id).execute()
+        if updated.data:
+            get_timeline_service().post_changed(updated.data[0])
+
+def schedule_ai_detection(
+    background_tasks: BackgroundTasks,
+    post_id: str,
+    supabase: Client,
+    ai_service: AIService
+):
+    """Đưa process_ai_detection vào background, có theo dõi số job đang chờ/chạy"""
+    background_jobs.inc("ai_detection", "queued")
+    background_tasks.add_task(_run_ai_detection, post_id, supabase, ai_service)
+
+async def _run_ai_detection(post_id: str, supabase: Client, ai_service: AIService):
+    background_jobs.dec("ai_detection", "queued")
+    background_jobs.inc("ai_detection", "running")
+    try:
+        await process_ai_detection(post_id, supabase, ai_service)
+    finally:
+        background_jobs.dec("ai_detection", "running")
+
+def _register_upload(media: dict, dedup_result, owner_id: str):
+    """Đưa hash của media mới vào bảng dedup (bản trùng đã ghi duplicate_of cho moderator)"""
+    get_dedup_service().add(media["id"], media["storage_path"], dedup_result, owner_id)
+    if dedup_result.match_media_id:
+        logging.info(
+            f"[Dedup] Media {media['id']} is a near-duplicate of {dedup_result.match_media_id} "
+            f"(distance={dedup_result.distance})"
+        )
 
 @router.post("", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
 async def create_post(
@@ -130,9 +210,11 @@ async def create_post(
     
     result = supabase.table("posts").insert(post_data).execute()
     post = result.data[0]
+    get_stats_store().post_created()
+    get_timeline_service().post_changed(post)
     
     # Schedule AI detection trong background
-    background_tasks.add_task(process_ai_detection, post["id"], supabase, ai_service)
+    schedule_ai_detection(background_tasks, post["id"], supabase, ai_service)
     
     # Get owner info
     owner = supabase.table("profiles").select("*").eq("id", post["owner_id"]).execute()
@@ -143,20 +225,8 @@ async def create_post(
     
     return post
 
-@router.get("/{post_id}", response_model=PostResponse)
-async def get_post(
-    post_id: str,
-    current_user = Depends(get_current_user_optional),
-    supabase: Client = Depends(get_supabase_client)
-):
-    """Lấy chi tiết post"""
-    # Get post
-    post_result = supabase.table("posts").select("*").eq("id", post_id).execute()
-    if not post_result.data:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    post = post_result.data[0]
-
+def _check_post_access(post: dict, current_user):
+    """Post private / chưa duyệt chỉ owner mới xem được"""
     # Privacy check
     if post["is_private"] and (not current_user or post["owner_id"] != current_user.id):
         raise HTTPException(status_code=403, detail="Access denied")
@@ -166,43 +236,70 @@ async def get_post(
         if not current_user or post["owner_id"] != current_user.id:
             raise HTTPException(status_code=404, detail="Post not found")
 
-    # Owner
-    owner_data = supabase.table("profiles").select("*").eq("id", post["owner_id"]).execute()
-    owner = owner_data.data[0] if owner_data.data else None
+# Embed qua FK (migration 800): post chi tiết trong 1 round trip
+POST_DETAIL_COLUMNS = (
+    "*, owner:profiles!posts_owner_id_fkey(id, username, display_name, avatar_url, version),"
+    " media:post_media!post_media_post_id_fkey(*)"
+)
 
-    post["owner_name"] = owner.get("display_name") if owner else None
-    post["owner_avatar"] = owner.get("avatar_url") if owner else None
+async def _post_detail(supabase: Client, post_id: str, current_user) -> tuple:
+    """(post đã gắn owner_name / owner_avatar / media, owner) sau khi check quyền xem"""
+    result = await supabase.table("posts").select(POST_DETAIL_COLUMNS).eq("id", post_id).execute_shared()
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Post not found")
 
-    # Media
-    media = supabase.table("post_media").select("*").eq("post_id", post_id).order("order").execute()
-    for m in media.data:
-        public_url = supabase.storage.from_(settings.storage_bucket).get_public_url(m["storage_path"])
-        m["url"] = public_url
-    post["media"] = media.data
+    post = result.data[0]
+    _check_post_access(post, current_user)
+    owner = post.pop("owner", None)
+    remember_post(post)
+    if owner:
+        remember_profile(owner)
 
-    # Like status
-    post["is_liked"] = False
-    if current_user:
-        like = (
-            supabase.table("post_likes")
-            .select("id")
-            .eq("post_id", post_id)
-            .eq("user_id", current_user.id)
-            .execute()
-        )
-        post["is_liked"] = len(like.data) > 0
+    post["owner_name"] = owner.get("display_name") if owner else None
+    post["owner_avatar"] = owner.get("avatar_url") if owner else None
 
-    return post
+    # Thứ tự media sắp ở đây: embed to-many không có order
+    media = sorted(post.get("media") or [], key=lambda m: m["order"])
+    bucket = supabase.storage.from_(settings.storage_bucket)
+    for m in media:
+        m["url"] = bucket.get_public_url(m["storage_path"])
+    post["media"] = media
+    return post, owner
 
-@router.get("", response_model=List[PostResponse])
-async def get_posts(
-    owner_id: str | None = None,
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100),
+@router.get("/{post_id}", response_model=PostResponse)
+async def get_post(
+    post_id: str,
+    request: Request,
+    response: Response,
     current_user = Depends(get_current_user_optional),
     supabase: Client = Depends(get_supabase_client)
 ):
-    """Lấy danh sách posts"""
+    """Lấy chi tiết post"""
+    # is_liked khác nhau theo người xem nên ETag gồm cả viewer
+    viewer = current_user.id if current_user else "anon"
+
+    # Conditional GET: chỉ so version (post + profile owner), không đọc dòng đầy đủ
+    if request.headers.get("if-none-match"):
+        meta = post_meta(supabase, post_id)
+        if meta:
+            _check_post_access(meta, current_user)
+            owner_meta = profile_meta(supabase, meta["owner_id"])
+            etag = make_etag(request, meta["version"], owner_meta["version"] if owner_meta else 0, viewer)
+            if etag_matches(request, etag):
+                return not_modified(request, etag)
+
+    # Post + owner + media trong 1 query embed; read nóng (post viral) đi qua single-flight
+    post, owner = await _post_detail(supabase, post_id, current_user)
+
+    # Like status (cache theo user, thường không query)
+    post["is_liked"] = bool(current_user) and post_id in liked_among(supabase, current_user.id, [post_id])
+
+    etag = make_etag(request, post.get("version"), owner.get("version") if owner else 0, viewer)
+    set_cache_headers(request, response, etag)
+    return post
+
+def _query_posts(supabase: Client, owner_id: str | None, current_user, offset: int, limit: int) -> List[dict]:
+    """Query posts trực tiếp (trang profile, hoặc feed ngoài phần timeline đã materialize)"""
     query = supabase.table("posts").select("*")
     
     if owner_id:
@@ -212,12 +309,10 @@ async def get_posts(
         
         if current_user and owner_id == current_user.id:
             # Xem profile của chính mình → KHÔNG filter gì thêm
-            # logging.info("✅ Viewing OWN profile - NO additional filters")
             pass
         else:
             # Xem profile người khác
             query = query.eq("status", "approved").eq("is_private", False)
-            # logging.info("👥 Viewing OTHER'S profile - Applied: status=approved, is_private=False")
     else:
         # Feed
         if current_user:
@@ -225,60 +320,140 @@ async def get_posts(
                 f"and(status.eq.approved,is_private.eq.false),"
                 f"owner_id.eq.{current_user.id}"
             )
-            # logging.info(f"🏠 Feed (logged in) - Applied OR filter")
         else:
             query = query.eq("status", "approved").eq("is_private", False)
-            # logging.info("🌐 Feed (guest) - Applied: status=approved, is_private=False")
     
-    # Pagination
-    offset = (page - 1) * limit
-    result = query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
-    
-    # 🔍 DEBUG: Log kết quả
-    # logging.info(f"📊 Query returned {len(result.data)} posts")
-    # for post in result.data[:3]:  # Log 3 posts đầu
-        # logging.info(f"  - Post {post['id'][:8]}: status={post.get('status')}, private={post.get('is_private')}")
-    
-    posts = result.data
-    
-    # Batch fetch likes
+    return query.order("created_at", desc=True).order("id", desc=True).range(offset, offset + limit - 1).execute().data
+
+def _hydrate_timeline(supabase: Client, post_ids: List[str], current_user) -> List[dict]:
+    """Đọc post theo id của timeline, giữ thứ tự; check lại quyền xem (timeline có thể trễ)"""
+    if not post_ids:
+        return []
+    rows = supabase.table("posts").select("*").in_("id", post_ids).execute().data
+    by_id = {row["id"]: row for row in rows}
+    viewer_id = current_user.id if current_user else None
+    return [
+        by_id[post_id] for post_id in post_ids
+        if post_id in by_id and (is_public(by_id[post_id]) or by_id[post_id]["owner_id"] == viewer_id)
+    ]
+
+def _enrich_posts(supabase: Client, posts: List[dict], current_user):
+    """owner, media, is_liked cho cả list: số query cố định, không phụ thuộc số post"""
+    # Like của user: cache theo user, trang feed thường không cần query
     user_liked_posts = set()
     if current_user:
         try:
-            post_ids = [p["id"] for p in posts]
-            if post_ids:
-                likes_result = supabase.table("post_likes")\
-                    .select("post_id")\
-                    .eq("user_id", current_user.id)\
-                    .in_("post_id", post_ids)\
-                    .execute()
-                
-                user_liked_posts = {like["post_id"] for like in likes_result.data}
+            user_liked_posts = liked_among(supabase, current_user.id, [p["id"] for p in posts])
         except Exception as e:
             logging.error(f"Error fetching user likes: {e}")
     
-    # Enrich posts
+    # Owner + media theo batch
+    owners = fetch_profiles(supabase, [post["owner_id"] for post in posts], "id, display_name, avatar_url")
+    media_by_post = fetch_media(supabase, [post["id"] for post in posts])
     for post in posts:
-        # Owner info
-        owner_data = supabase.table("profiles").select("*").eq("id", post["owner_id"]).execute()
-        if owner_data.data:
-            owner = owner_data.data[0]
-            post["owner_name"] = owner.get("display_name")
-            post["owner_avatar"] = owner.get("avatar_url")
-        else:
-            post["owner_name"] = None
-            post["owner_avatar"] = None
-
-        # Media
-        media = supabase.table("post_media").select("*").eq("post_id", post["id"]).order("order").execute()
-        for m in media.data:
-            public_url = supabase.storage.from_(settings.storage_bucket).get_public_url(m["storage_path"])
-            m["url"] = public_url
-        post["media"] = media.data
+        owner = owners.get(post["owner_id"])
+        post["owner_name"] = owner.get("display_name") if owner else None
+        post["owner_avatar"] = owner.get("avatar_url") if owner else None
+        post["media"] = media_by_post.get(post["id"], [])
         post["is_liked"] = post["id"] in user_liked_posts
 
-    # logging.info(f"=== END DEBUG ===\n")
-    return posts
+@router.get("", response_model=List[PostResponse])
+async def get_posts(
+    owner_id: str | None = None,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    current_user = Depends(get_current_user_optional),
+    supabase: Client = Depends(get_supabase_client)
+):
+    """Lấy danh sách posts"""
+    offset = (page - 1) * limit
+    
+    # Feed: slice id từ timeline materialize sẵn, None = tắt / scroll quá phần đã materialize
+    posts = None
+    if not owner_id:
+        timeline = get_timeline_service()
+        viewer_id = current_user.id if current_user else None
+        for _ in range(3):
+            post_ids = timeline.page_ids(supabase, viewer_id, offset, limit)
+            if post_ids is None:
+                break
+            posts = _hydrate_timeline(supabase, post_ids, current_user)
+            stale = set(post_ids) - {post["id"] for post in posts}
+            if not stale:
+                break
+            # Id đã xóa / hết public mà timeline chưa biết: bỏ đi rồi đọc lại cho đủ trang
+            timeline.drop(viewer_id, stale)
+    
+    if posts is None:
+        posts = _query_posts(supabase, owner_id, current_user, offset, limit)
+    
+    _enrich_posts(supabase, posts, current_user)
+    return post_list_serializer.response(posts)
+
+# BATCH ENDPOINTS
+@router.post(":batchGet", response_model=List[PostBatchItem])
+async def batch_get_posts(
+    data: BatchGetRequest,
+    current_user = Depends(get_current_user_optional),
+    supabase: Client = Depends(get_supabase_client)
+):
+    """Lấy nhiều post trong 1 request (tối đa 100 id), thay cho gọi GET /posts/{id} từng post"""
+    errors = invalid_ids(data.ids)
+    ids = [post_id for post_id in dict.fromkeys(data.ids) if post_id not in errors]
+    rows = supabase.table("posts").select("*").in_("id", ids).execute().data if ids else []
+    by_id = {row["id"]: row for row in rows}
+    
+    visible = []
+    for post_id in ids:
+        post = by_id.get(post_id)
+        if post is None:
+            errors[post_id] = {"status": 404, "detail": "Post not found"}
+            continue
+        try:
+            _check_post_access(post, current_user)
+        except HTTPException as e:
+            errors[post_id] = {"status": e.status_code, "detail": e.detail}
+            continue
+        remember_post(post)
+        visible.append(post)
+    
+    _enrich_posts(supabase, visible, current_user)
+    return post_batch_serializer.response(batch_results(data.ids, "post", by_id, errors))
+
+@router.post(":batchLiked", response_model=List[LikedBatchItem])
+async def batch_is_post_liked(
+    data: BatchGetRequest,
+    current_user = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase_client)
+):
+    """Check like của user hiện tại cho nhiều post, thay cho GET /posts/{id}/liked từng post"""
+    errors = invalid_ids(data.ids)
+    ids = [post_id for post_id in dict.fromkeys(data.ids) if post_id not in errors]
+    existing = set()
+    liked = set()
+    if ids:
+        existing = {row["id"] for row in supabase.table("posts").select("id").in_("id", ids).execute().data}
+        liked = liked_among(supabase, current_user.id, existing)
+    
+    for post_id in ids:
+        if post_id not in existing:
+            errors[post_id] = {"status": 404, "detail": "Post not found"}
+    found = {post_id: post_id in liked for post_id in existing}
+    return liked_batch_serializer.response(batch_results(data.ids, "liked", found, errors))
+
+def _update_own_post(supabase: Client, post_id: str, current_user, update_data: dict) -> List[dict]:
+    return supabase.table("posts")\
+        .update(update_data, returning=ReturnMethod.representation)\
+        .eq("id", post_id)\
+        .eq("owner_id", current_user.id)\
+        .execute().data
+
+def _raise_not_own_post(supabase: Client, post_id: str):
+    """Write lọc theo owner không chạm row nào: phân biệt 404 / 403 (chỉ ở nhánh lỗi)"""
+    exists = supabase.table("posts").select("id").eq("id", post_id).execute()
+    if not exists.data:
+        raise HTTPException(status_code=404, detail="Post not found")
+    raise HTTPException(status_code=403, detail="Not the post owner")
 
 @router.patch("/{post_id}", response_model=PostResponse)
 async def update_post(
@@ -288,20 +463,19 @@ async def update_post(
     supabase: Client = Depends(get_supabase_client)
 ):
     """Cập nhật post"""
-    # Check ownership
-    post = supabase.table("posts").select("*").eq("id", post_id).execute()
+    update_data = data.model_dump(exclude_unset=True)
     
-    if not post.data:
-        raise HTTPException(status_code=404, detail="Post not found")
+    # Check ownership và update trong cùng 1 statement (filter owner_id, return=representation)
+    updated = _update_own_post(supabase, post_id, current_user, update_data)
+    if not updated:
+        _raise_not_own_post(supabase, post_id)
     
-    if post.data[0]["owner_id"] != current_user.id:
-        raise HTTPException(status_code=403, detail="Not the post owner")
-    
-    # Update
-    update_data = data.model_dump(exclude_unset=True)
-    result = supabase.table("posts").update(update_data).eq("id", post_id).execute()
+    get_timeline_service().post_changed(updated[0])
     
-    return await get_post(post_id, current_user, supabase)
+    # Không đi qua get_post: response của PATCH không có ETag / Cache-Control, không trả 304
+    post, _ = await _post_detail(supabase, post_id, current_user)
+    post["is_liked"] = post_id in liked_among(supabase, current_user.id, [post_id])
+    return post
 
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(
@@ -310,16 +484,17 @@ async def delete_post(
     supabase: Client = Depends(get_supabase_client)
 ):
     """Xóa post"""
-    # Check ownership
-    post = supabase.table("posts").select("*").eq("id", post_id).execute()
-    
-    if not post.data:
-        raise HTTPException(status_code=404, detail="Post not found")
+    # Check ownership và xóa trong cùng 1 statement, row bị xóa trả về cho stats / timeline
+    deleted = supabase.table("posts")\
+        .delete(returning=ReturnMethod.representation)\
+        .eq("id", post_id)\
+        .eq("owner_id", current_user.id)\
+        .execute()
     
-    if post.data[0]["owner_id"] != current_user.id:
-        raise HTTPException(status_code=403, detail="Not the post owner")
+    if not deleted.data:
+        _raise_not_own_post(supabase, post_id)
     
-    supabase.table("posts").delete().eq("id", post_id).execute()
+    get_timeline_service().post_deleted(deleted.data[0])
     
     return None
 
@@ -356,29 +531,19 @@ async def like_post(
     }
     
     supabase.table("post_likes").insert(like_data).execute()
+    get_stats_store().post_liked()
+    get_liked_cache().added(current_user.id, post_id)
     
     # Update like_count on post
     new_like_count = post_data.get("like_count", 0) + 1
     supabase.table("posts").update({"like_count": new_like_count}).eq("id", post_id).execute()
     
-    # Create notification for post owner (if not liking own post)
+    # Notification cho owner được gộp theo (owner, post) và ghi theo batch
     if post_data["owner_id"] != current_user.id:
-        # Get current user's profile info for notification
-        user_profile = supabase.table("profiles").select("display_name, username").eq("id", current_user.id).execute()
-        display_name = user_profile.data[0].get("display_name") if user_profile.data else None
-        username = user_profile.data[0].get("username") if user_profile.data else "Someone"
-        
-        name_to_show = display_name or username
-        
-        notification_data = {
-            "recipient_id": post_data["owner_id"],
-            "actor_id": current_user.id,
-            "post_id": post_id,
-            "type": "like",
-            "body": f"{name_to_show} liked your post"
-        }
-        
-        supabase.table("notifications").insert(notification_data).execute()
+        coalescer = get_like_coalescer()
+        coalescer.add_like(post_data["owner_id"], post_id, current_user.id)
+        if coalescer.window_seconds <= 0:
+            coalescer.flush(supabase)
     
     return {"message": "Post liked", "liked": True}
 
@@ -399,6 +564,7 @@ async def unlike_post(
     result = supabase.table("post_likes").delete().eq("post_id", post_id).eq("user_id", current_user.id).execute()
     
     # Update like_count if like was actually deleted
+    get_liked_cache().removed(current_user.id, post_id)
     if result.data:
         new_like_count = max(0, post.data[0].get("like_count", 0) - 1)
         supabase.table("posts").update({"like_count": new_like_count}).eq("id", post_id).execute()
@@ -412,19 +578,19 @@ async def get_post_likes(
 ):
     """Get all likes for a post with user details"""
     # Check if post exists
-    post = supabase.table("posts").select("id").eq("id", post_id).execute()
+    post = await supabase.table("posts").select("id").eq("id", post_id).execute_shared()
     
     if not post.data:
         raise HTTPException(status_code=404, detail="Post not found")
     
     # Get likes with user profiles
-    likes = supabase.table("post_likes").select("*, profiles(*)").eq("post_id", post_id).execute()
+    likes = await supabase.table("post_likes").select("*, profiles(*)").eq("post_id", post_id).execute_shared()
     
-    return {
+    return FastJSONResponse({
         "post_id": post_id,
         "likes_count": len(likes.data),
         "likes": likes.data
-    }
+    })
 
 @router.get("/{post_id}/liked", status_code=status.HTTP_200_OK)
 async def is_post_liked(
@@ -440,13 +606,9 @@ async def is_post_liked(
         raise HTTPException(status_code=404, detail="Post not found")
     
     # Check if user liked
-    like = supabase.table("post_likes")\
-        .select("id")\
-        .eq("post_id", post_id)\
-        .eq("user_id", current_user.id)\
-        .execute()
+    liked = post_id in liked_among(supabase, current_user.id, [post_id])
     
-    return {"post_id": post_id, "liked": len(like.data) > 0}
+    return {"post_id": post_id, "liked": liked}
 
 # MEDIA ENDPOINTS
 @router.post("/{post_id}/media/link")
@@ -471,15 +633,22 @@ async def link_media_to_post(
         "order": media_data.order
     }
     
+    # Hash đã tính lúc /media/upload-temp
+    dedup_result = get_dedup_service().pop_pending(media_data.storage_path)
+    media_record.update(reused_verdict(supabase, dedup_result))
+    
     result = supabase.table("post_media").insert(media_record).execute()
     media = result.data[0]
     
+    if dedup_result:
+        _register_upload(media, dedup_result, current_user.id)
+    
     public_url = supabase.storage.from_(settings.storage_bucket).get_public_url(media["storage_path"])
     media["url"] = public_url
     
-    # Trigger AI detection nếu là ảnh
-    if media_data.media_type == "image":
-        background_tasks.add_task(process_ai_detection, post_id, supabase, ai_service)
+    # Trigger AI detection nếu là ảnh / video
+    if media_data.media_type in ANALYZED_MEDIA_TYPES:
+        schedule_ai_detection(background_tasks, post_id, supabase, ai_service)
     
     return media
 
@@ -511,16 +680,27 @@ async def upload_media(
     else:
         raise HTTPException(status_code=400, detail="Invalid file type")
     
-    # Upload to storage
     file_content = await file.read()
-    file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    storage_path = f"{post_id}/{uuid.uuid4()}.{file_ext}"
     
-    supabase.storage.from_(settings.storage_bucket).upload(
-        storage_path,
-        file_content,
-        {"content-type": content_type}
-    )
+    # Near-duplicate check trước khi upload
+    dedup_result = None
+    if settings.dedup_enabled and media_type == "image":
+        dedup_result = await asyncio.to_thread(get_dedup_service().inspect, file_content, current_user.id)
+    verdict = reused_verdict(supabase, dedup_result)
+    
+    if dedup_result and dedup_result.exact_storage_path:
+        # File giống hệt từng byte → dùng chung object trong storage
+        storage_path = dedup_result.exact_storage_path
+    else:
+        # Upload to storage
+        file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
+        storage_path = f"{post_id}/{uuid.uuid4()}.{file_ext}"
+        
+        supabase.storage.from_(settings.storage_bucket).upload(
+            storage_path,
+            file_content,
+            {"content-type": content_type}
+        )
     
     # Get current max order
     existing_media = supabase.table("post_media").select("order").eq("post_id", post_id).execute()
@@ -533,26 +713,38 @@ async def upload_media(
         "media_type": media_type,
         "order": max_order + 1
     }
+    media_data.update(verdict)
     
     result = supabase.table("post_media").insert(media_data).execute()
     media = result.data[0]
+    
+    if dedup_result:
+        _register_upload(media, dedup_result, current_user.id)
 
     # Get public URL
     public_url = supabase.storage.from_(settings.storage_bucket).get_public_url(storage_path)
     media["url"] = public_url
 
-    # Trigger AI detection nếu là ảnh
-    if media_type == "image" and background_tasks:
-        background_tasks.add_task(process_ai_detection, post_id, supabase, ai_service)
+    # Trigger AI detection nếu là ảnh / video
+    if media_type in ANALYZED_MEDIA_TYPES and background_tasks:
+        schedule_ai_detection(background_tasks, post_id, supabase, ai_service)
 
     return media
 
 @router.get("/{post_id}/media")
 async def get_media(
     post_id: str,
+    request: Request,
+    response: Response,
     supabase: Client = Depends(get_supabase_client)
 ):
     """Lấy danh sách media của post"""
+    # Trigger media chạm vào post cha nên version của post bao cả media
+    meta = post_meta(supabase, post_id)
+    etag = make_etag(request, meta["version"]) if meta else None
+    if etag_matches(request, etag):
+        return not_modified(request, etag)
+    
     media = supabase.table("post_media").select("*").eq("post_id", post_id).order("order").execute()
     
     # Generate public URLs
@@ -560,6 +752,7 @@ async def get_media(
         public_url = supabase.storage.from_(settings.storage_bucket).get_public_url(m["storage_path"])
         m["url"] = public_url
     
+    set_cache_headers(request, response, etag)
     return media.data
 
 @router.delete("/{post_id}/media/{media_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -584,43 +777,62 @@ async def delete_media(
     if not media.data:
         raise HTTPException(status_code=404, detail="Media not found")
     
-    was_image = media.data[0]["media_type"] == "image"
+    was_analyzed = media.data[0]["media_type"] in ANALYZED_MEDIA_TYPES
+    storage_path = media.data[0]["storage_path"]
     
-    # Delete from storage
-    supabase.storage.from_(settings.storage_bucket).remove([media.data[0]["storage_path"]])
+    # Delete from storage - trừ khi media khác (bản trùng) còn dùng chung file
+    shared = supabase.table("post_media").select("id").eq("storage_path", storage_path).neq("id", media_id).limit(1).execute()
+    if not shared.data:
+        supabase.storage.from_(settings.storage_bucket).remove([storage_path])
     
     # Delete record
     supabase.table("post_media").delete().eq("id", media_id).execute()
+    get_embedding_store().remove(media_id)
+    get_dedup_service().remove(media_id)
     
-    # Re-run AI detection nếu xóa ảnh
-    if was_image:
-        background_tasks.add_task(process_ai_detection, post_id, supabase, ai_service)
+    # Re-run AI detection nếu xóa ảnh / video (tính vào verdict của post)
+    if was_analyzed:
+        schedule_ai_detection(background_tasks, post_id, supabase, ai_service)
     
     return None
 
+def _check_ai_status_access(post: dict, current_user):
+    # Chỉ owner mới thấy status pending/rejected
+    if post.get("status") in ["pending", "rejected"]:
+        if not current_user or post["owner_id"] != current_user.id:
+            raise HTTPException(status_code=403, detail="Access denied")
+
 @router.get("/{post_id}/ai_status")
 async def get_ai_status(
     post_id: str,
+    request: Request,
+    response: Response,
     current_user = Depends(get_current_user_optional),
     supabase: Client = Depends(get_supabase_client)
 ):
     """Lấy trạng thái AI check của post"""
-    post = supabase.table("posts").select("status, ai_perc").eq("id", post_id).execute()
+    # Client poll endpoint này khi post đang pending: trả 304 tới khi detection xong
+    if request.headers.get("if-none-match"):
+        meta = post_meta(supabase, post_id)
+        if meta:
+            _check_ai_status_access(meta, current_user)
+            etag = make_etag(request, meta["version"])
+            if etag_matches(request, etag):
+                return not_modified(request, etag)
+    
+    post = supabase.table("posts").select(f"id, ai_perc, {POST_META_COLUMNS}").eq("id", post_id).execute()
     
     if not post.data:
         raise HTTPException(status_code=404, detail="Post not found")
     
     post_data = post.data[0]
-    
-    # Chỉ owner mới thấy status pending/rejected
-    if post_data.get("status") in ["pending", "rejected"]:
-        post_full = supabase.table("posts").select("owner_id").eq("id", post_id).execute()
-        if not current_user or post_full.data[0]["owner_id"] != current_user.id:
-            raise HTTPException(status_code=403, detail="Access denied")
+    _check_ai_status_access(post_data, current_user)
+    remember_post(post_data)
     
     # Get media AI info
     media = supabase.table("post_media").select("id, media_type, ai_perc, is_ai").eq("post_id", post_id).execute()
     
+    set_cache_headers(request, response, make_etag(request, post_data.get("version")))
     return {
         "post_id": post_id,
         "status": post_data.get("status"),
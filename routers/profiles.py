@@ -1,14 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
 from supabase import Client
-from models.profile import ProfileResponse, ProfileUpdate
+from models.batch import BatchGetRequest
+from models.profile import ProfileResponse, ProfileUpdate, ProfileBatchItem
 from services.supabase_client import get_supabase_client
+from services.version_cache import (
+    profile_meta, profile_meta_by_username, remember_profile,
+    make_etag, etag_matches, not_modified, set_cache_headers,
+)
 from dependencies import get_current_user
+from utils.batch import invalid_ids, batch_results
+from utils.serialization import ListSerializer
+from typing import List
 from config import get_settings
 import uuid
 
 router = APIRouter(prefix="/profiles", tags=["Profiles"])
 settings = get_settings()
 
+profile_batch_serializer = ListSerializer(ProfileBatchItem)
+
 @router.get("/me", response_model=ProfileResponse)
 async def get_my_profile(
     current_user = Depends(get_current_user),
@@ -68,28 +78,65 @@ async def upload_avatar(
     
     return {"avatar_url": avatar_url}
 
+@router.post(":batchGet", response_model=List[ProfileBatchItem])
+async def batch_get_profiles(
+    data: BatchGetRequest,
+    supabase: Client = Depends(get_supabase_client)
+):
+    """Lấy nhiều profile trong 1 query (tối đa 100 id), thay cho gọi GET /profiles/{id} từng user"""
+    errors = invalid_ids(data.ids)
+    ids = [user_id for user_id in dict.fromkeys(data.ids) if user_id not in errors]
+    rows = supabase.table("profiles").select("*").in_("id", ids).execute().data if ids else []
+    by_id = {row["id"]: row for row in rows}
+    for row in rows:
+        remember_profile(row)
+    for user_id in ids:
+        if user_id not in by_id:
+            errors[user_id] = {"status": 404, "detail": "Profile not found"}
+    return profile_batch_serializer.response(batch_results(data.ids, "profile", by_id, errors))
+
 @router.get("/{user_id}", response_model=ProfileResponse)
 async def get_profile(
     user_id: str,
+    request: Request,
+    response: Response,
     supabase: Client = Depends(get_supabase_client)
 ):
     """Lấy profile của user bất kỳ"""
-    profile = supabase.table("profiles").select("*").eq("id", user_id).execute()
+    if request.headers.get("if-none-match"):
+        meta = profile_meta(supabase, user_id)
+        etag = make_etag(request, meta["version"]) if meta else None
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+    
+    profile = await supabase.table("profiles").select("*").eq("id", user_id).execute_shared()
     
     if not profile.data:
         raise HTTPException(status_code=404, detail="Profile not found")
     
+    remember_profile(profile.data[0])
+    set_cache_headers(request, response, make_etag(request, profile.data[0].get("version")))
     return profile.data[0]
 
 @router.get("/{username}/by-username", response_model=ProfileResponse)
 async def get_profile_by_username(
     username: str,
+    request: Request,
+    response: Response,
     supabase: Client = Depends(get_supabase_client)
 ):
     """Lấy profile theo username"""
-    profile = supabase.table("profiles").select("*").eq("username", username).execute()
+    if request.headers.get("if-none-match"):
+        meta = profile_meta_by_username(supabase, username)
+        etag = make_etag(request, meta["version"]) if meta else None
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+    
+    profile = await supabase.table("profiles").select("*").eq("username", username).execute_shared()
     
     if not profile.data:
         raise HTTPException(status_code=404, detail="Profile not found")
     
+    remember_profile(profile.data[0])
+    set_cache_headers(request, response, make_etag(request, profile.data[0].get("version")))
     return profile.data[0]
\ No newline at end of file
@@ -0,0 +1,334 @@
+"""
+Admission control: mỗi worker chỉ nhận lượng việc nó xử lý kịp, phần dư bị từ chối
+ngay (429 / 503 + Retry-After) thay vì xếp hàng vô hạn và kéo chậm mọi route khác.
+
+- Token bucket theo user và route (admission_rate_limits): hết token → 429.
+- Concurrency theo route (admission_concurrency): hết slot thì chờ trong hàng đợi ngắn,
+  hàng đợi đầy hoặc chờ quá admission_queue_timeout_seconds → 503.
+- Inference queue: model chạy trên thread pool riêng (không chặn event loop), số ảnh
+  chờ + đang chạy có giới hạn. Request gọi model fail fast khi queue đầy; route đẩy
+  việc vào model (admission_inference_routes) bị từ chối ngay từ cửa.
+
+Route không cấu hình (feed, notifications...) không bị giới hạn.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+from config import get_settings
+from dependencies import decode_access_token
+from services.metrics import registry
+from utils.exceptions import ServiceUnavailableException
+import asyncio
+import hashlib
+import math
+import threading
+import time
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+admission_rejected = registry.counter(
+    "admission_rejected_total", "Requests rejected by admission control", ("route", "reason")
+)
+admission_in_flight = registry.gauge(
+    "admission_in_flight", "Requests holding a concurrency slot", ("route",)
+)
+admission_waiting = registry.gauge(
+    "admission_waiting", "Requests waiting for a concurrency slot", ("route",)
+)
+inference_pending = registry.gauge(
+    "ai_inference_pending", "Images queued or running in the inference pool"
+)
+
+
+class InferenceOverloaded(ServiceUnavailableException):
+    def __init__(self, retry_after: int):
+        super().__init__(detail="AI detection is overloaded, retry later", retry_after=retry_after)
+
+
+def _retry_after(seconds: float) -> int:
+    return max(1, math.ceil(seconds))
+
+
+# -------------------------------
+# TOKEN BUCKET
+# -------------------------------
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """0 nếu lấy được token, ngược lại số giây tới khi có token"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Tuple[float, float]], max_buckets: int = 100000):
+        self.limits = limits
+        self.max_buckets = max_buckets
+        # (route, client) -> bucket
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, route: str, client: str) -> float:
+        limit = self.limits.get(route)
+        if limit is None:
+            return 0.0
+        key = (route, client)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(*limit)
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            return bucket.take(time.monotonic())
+
+
+# -------------------------------
+# CONCURRENCY THEO ROUTE
+# -------------------------------
+
+class ConcurrencyLimiter:
+    """Semaphore + hàng đợi có giới hạn; chỉ dùng trên event loop"""
+
+    def __init__(self, route: str, limit: int, queue_size: int, queue_timeout: float):
+        self.route = route
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+        # Thời gian xử lý trung bình (EWMA) để ước lượng Retry-After
+        self._avg_seconds = 0.0
+        admission_in_flight.set_function(lambda: self.active, route)
+        admission_waiting.set_function(lambda: self.waiting, route)
+
+    def retry_after(self) -> int:
+        return _retry_after(self._avg_seconds * (self.waiting + 1) / self.limit)
+
+    async def acquire(self) -> bool:
+        """False nếu bị từ chối (hàng đợi đầy hoặc chờ quá lâu)"""
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        return True
+
+    def release(self, seconds: float):
+        self.active -= 1
+        self._semaphore.release()
+        self._avg_seconds = seconds if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * seconds
+
+    def snapshot(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting,
+                "queue_size": self.queue_size, "avg_ms": round(self._avg_seconds * 1000, 1)}
+
+
+# -------------------------------
+# INFERENCE QUEUE
+# -------------------------------
+
+class InferenceQueue:
+    def __init__(self, workers: int = 1, max_pending: int = 32):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.pending = 0  # ảnh đang chờ + đang chạy
+        self.rejected = 0
+        self._avg_seconds = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        inference_pending.set_function(lambda: self.pending)
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def retry_after(self) -> int:
+        return _retry_after(self._avg_seconds * (self.pending + 1) / self.workers)
+
+    def _timed(self, fn: Callable[..., T], *args) -> T:
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            seconds = time.perf_counter() - start
+            self._avg_seconds = seconds if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * seconds
+
+    async def run(self, fn: Callable[..., T], *args, block: bool = False) -> T:
+        """
+        Chạy fn trên thread pool inference.
+        block=False (request đang chờ kết quả): queue đầy → InferenceOverloaded.
+        block=True (job nền đã được nhận): luôn xếp hàng.
+        """
+        if not block and self.saturated:
+            self.rejected += 1
+            raise InferenceOverloaded(self.retry_after())
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(self._timed, fn, *args))
+        finally:
+            self.pending -= 1
+
+    def snapshot(self) -> dict:
+        return {"workers": self.workers, "pending": self.pending, "max_pending": self.max_pending,
+                "saturated": self.saturated, "rejected": self.rejected,
+                "avg_ms": round(self._avg_seconds * 1000, 1)}
+
+
+_inference_queue_instance = None
+
+def get_inference_queue() -> InferenceQueue:
+    global _inference_queue_instance
+    if _inference_queue_instance is None:
+        _inference_queue_instance = InferenceQueue(
+            workers=settings.inference_workers,
+            max_pending=settings.inference_max_pending,
+        )
+    return _inference_queue_instance
+
+
+# -------------------------------
+# CONTROLLER + MIDDLEWARE
+# -------------------------------
+
+class AdmissionController:
+    def __init__(self):
+        self.rate_limiter = RateLimiter({
+            route: (float(limit[0]), float(limit[1])) for route, limit in settings.admission_rate_limits.items()
+        })
+        self.limiters: Dict[str, ConcurrencyLimiter] = {
+            route: ConcurrencyLimiter(route, limit, settings.admission_queue_size,
+                                      settings.admission_queue_timeout_seconds)
+            for route, limit in settings.admission_concurrency.items()
+        }
+        self.inference_routes = set(settings.admission_inference_routes)
+        self.routes = set(self.limiters) | set(self.rate_limiter.limits) | self.inference_routes
+
+    def snapshot(self) -> dict:
+        return {
+            "routes": {route: limiter.snapshot() for route, limiter in self.limiters.items()},
+            "rate_limits": {route: {"per_second": rate, "burst": burst}
+                            for route, (rate, burst) in self.rate_limiter.limits.items()},
+            "inference": get_inference_queue().snapshot(),
+        }
+
+
+_admission_controller_instance = None
+
+def get_admission_controller() -> AdmissionController:
+    global _admission_controller_instance
+    if _admission_controller_instance is None:
+        _admission_controller_instance = AdmissionController()
+    return _admission_controller_instance
+
+
+def _route_key(scope) -> Optional[str]:
+    """'METHOD /route/template' của route sẽ xử lý request (router chưa chạy ở middleware)"""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{scope['method']} {route.path}"
+    return None
+
+
+def _client_key(scope) -> str:
+    """User id nếu verify được JWT local, không thì hash token, cuối cùng là IP"""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization" and value.startswith(b"Bearer "):
+            token = value[7:].decode("latin-1")
+            claims = decode_access_token(token)
+            if claims and claims.get("sub"):
+                return f"user:{claims['sub']}"
+            return "token:" + hashlib.sha256(token.encode()).hexdigest()[:16]
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "anonymous"
+
+
+def _reject(status_code: int, detail: str, retry_after: int) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"detail": detail},
+                        headers={"Retry-After": str(retry_after)})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        controller = get_admission_controller()
+        if scope["type"] != "http" or not controller.routes:
+            await self.app(scope, receive, send)
+            return
+
+        route = _route_key(scope)
+        if route not in controller.routes:
+            await self.app(scope, receive, send)
+            return
+
+        wait = controller.rate_limiter.check(route, _client_key(scope))
+        if wait > 0:
+            admission_rejected.inc(route, "rate_limit")
+            await _reject(429, "Too many requests", _retry_after(wait))(scope, receive, send)
+            return
+
+        queue = get_inference_queue()
+        if route in controller.inference_routes and queue.saturated:
+            admission_rejected.inc(route, "inference_queue")
+            await _reject(503, "AI detection is overloaded, retry later", queue.retry_after())(scope, receive, send)
+            return
+
+        limiter = controller.limiters.get(route)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        if not await limiter.acquire():
+            admission_rejected.inc(route, "concurrency")
+            await _reject(503, "Server busy, retry later", limiter.retry_after())(scope, receive, send)
+            return
+
+        # Trả slot khi response gửi xong: background task (vd. AI detection) chạy sau
+        # đó trong cùng ASGI call nhưng đã được inference queue giới hạn riêng
+        start = time.perf_counter()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            release()
@@ -1,27 +1,45 @@
 from ml_models.ai_detector import get_ai_detector
+from ml_models.frame_sampler import FrameBudget, is_animated, sample_frames
+from services.admission import get_inference_queue, InferenceOverloaded
 from config import get_settings
-from typing import List
+from functools import partial
+from typing import List, Optional
+import numpy as np
 import logging
 
 settings = get_settings()
 
 class AIService:
     def __init__(self):
-        self.detector = get_ai_detector(settings.model_path, settings.device)
+        self.detector = get_ai_detector(settings.model_path, settings.device, settings.ai_token_merge_ratio,
+                                        settings.shared_weights_path)
         self.threshold = 0.7  # Ngưỡng confidence để coi là AI
+        self.frame_budget = FrameBudget(
+            max_frames=settings.video_max_frames,
+            max_seconds=settings.video_max_decode_seconds,
+            max_side=settings.video_max_side,
+        )
+        if settings.ai_cascade_enabled:
+            self._predict = partial(self.detector.predict_cascade, size=settings.ai_cascade_size,
+                                    low=settings.ai_cascade_low, high=settings.ai_cascade_high)
+        else:
+            self._predict = self.detector.predict_with_embedding
     
-    async def check_single_image(self, image_bytes: bytes) -> dict:
+    async def check_single_image(self, image_bytes: bytes, block: bool = True) -> dict:
         """
-        Kiểm tra một ảnh
+        Kiểm tra một ảnh. Model chạy trên inference queue (thread riêng, không chặn
+        event loop); block=False thì raise InferenceOverloaded khi queue đầy.
         Returns: {
             "confidence": float,  # ai_perc
             "is_ai": bool,
-            "label": str  # "ai" hoặc "real"
+            "label": str,  # "ai" hoặc "real"
+            "embedding": np.ndarray | None  # DINOv2 CLS embedding (None nếu cascade dừng ở stage 1)
         }
         """
         try:
-            # predict() returns tuple: (label, confidence)
-            label, confidence = self.detector.predict(image_bytes)
+            label, confidence, embedding = await get_inference_queue().run(
+                self._predict, image_bytes, block=block
+            )
             
             is_ai = label == "ai" and confidence >= self.threshold
             
@@ -32,26 +50,75 @@ class AIService:
             return {
                 "confidence": confidence_percent,
                 "is_ai": is_ai,
-                "label": label
+                "label": label,
+                "embedding": embedding
             }
+        except InferenceOverloaded:
+            raise
         except Exception as e:
             logging.error(f"Error in AI detection: {e}")
-            # Return safe default that passes DB constraint (ai_perc > 0)
-            return {
-                "confidence": 0.01,  # Minimum value to satisfy constraint
-                "is_ai": False,
-                "label": "unknown"
-            }
+            return _unknown_result()
+    
+    async def check_media(self, data: bytes, media_type: str = "image", block: bool = True) -> dict:
+        """
+        Ảnh tĩnh: như check_single_image. Video / ảnh động: chấm các frame lấy mẫu
+        (ngân sách VIDEO_*), điểm media là quantile video_score_quantile của xác suất
+        "ai" theo frame: vài frame lệch không quyết định, đoạn AI kéo dài thì có.
+        Không decode được frame nào (vd. thiếu PyAV) → label "unknown".
+        """
+        if media_type != "video" and not is_animated(data):
+            return await self.check_single_image(data, block=block)
+        
+        try:
+            scores = await get_inference_queue().run(self._score_frames, data, media_type, block=block)
+        except InferenceOverloaded:
+            raise
+        except Exception as e:
+            logging.error(f"Error in frame AI detection: {e}")
+            return _unknown_result()
+        
+        if not scores:
+            return _unknown_result()
+        
+        ai_prob = float(np.quantile(scores, settings.video_score_quantile))
+        label = "ai" if ai_prob >= 0.5 else "real"
+        confidence = ai_prob if label == "ai" else 1 - ai_prob
+        return {
+            "confidence": max(confidence * 100, 0.01),
+            "is_ai": label == "ai" and confidence >= self.threshold,
+            "label": label,
+            "embedding": None,  # không có 1 embedding đại diện cho cả video
+            "frames": len(scores)
+        }
+    
+    def _score_frames(self, data: bytes, media_type: str) -> List[float]:
+        frames = sample_frames(data, media_type, self.frame_budget)
+        return self.detector.predict_frames(frames, settings.video_frame_batch_size)
     
-    async def check_images(self, images_bytes: List[bytes]) -> dict:
+    def rescore_embeddings(self, embeddings: np.ndarray) -> List[dict]:
+        """Chấm lại các embedding đã lưu bằng head hiện tại (không chạy backbone)"""
+        results = []
+        for label, confidence in self.detector.classify_embeddings(embeddings):
+            results.append({
+                "confidence": max(confidence * 100, 0.01),
+                "is_ai": label == "ai" and confidence >= self.threshold,
+                "label": label
+            })
+        return results
+    
+    async def check_images(self, images_bytes: List[bytes], media_types: Optional[List[str]] = None) -> dict:
         """
         Check multiple images (deprecated - use check_single_image for each image)
+        media_types song song với images_bytes ("image" / "video"), mặc định toàn ảnh.
         Returns status: approved_non_ai / rejected_ai
         """
         results = []
         
-        for img_bytes in images_bytes:
-            result = await self.check_single_image(img_bytes)
+        # Request đang chờ kết quả: fail fast (503) khi queue đầy thay vì xếp hàng
+        for img_bytes, media_type in zip(images_bytes, media_types or ["image"] * len(images_bytes)):
+            result = await self.check_media(img_bytes, media_type, block=False)
+            if media_type == "video" and result["label"] == "unknown":
+                continue  # video không decode được: bỏ qua như trước khi có video
             results.append(result)
         
         # Tính số ảnh AI
@@ -75,6 +142,15 @@ class AIService:
                 "message": f"Post approved with {ai_percentage:.1f}% AI content"
             }
 
+def _unknown_result() -> dict:
+    # Return safe default that passes DB constraint (ai_perc > 0)
+    return {
+        "confidence": 0.01,  # Minimum value to satisfy constraint
+        "is_ai": False,
+        "label": "unknown",
+        "embedding": None
+    }
+
 def get_ai_service():
     """Dependency injection cho FastAPI"""
     return AIService()
\ No newline at end of file
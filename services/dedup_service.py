@@ -0,0 +1,280 @@
+"""
+Phát hiện ảnh near-duplicate khi upload bằng perceptual hash 64-bit.
+
+Hash được tra trong multi-index hash table: 64 bit chia thành 4 chunk 16 bit,
+nếu Hamming(a, b) <= r thì ít nhất một chunk khác nhau <= r // 4 bit
+(pigeonhole), nên chỉ cần probe các bucket lân cận của từng chunk rồi kiểm
+tra lại khoảng cách đầy đủ trên số ít candidate.
+"""
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+from config import get_settings
+import numpy as np
+import threading
+import hashlib
+import logging
+import io
+
+settings = get_settings()
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+# -------------------------------
+# PERCEPTUAL HASHES
+# -------------------------------
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash: so sánh độ sáng các pixel kề nhau trên ảnh 9x8"""
+    gray = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+_DCT_SIZE = 32
+_k = np.arange(_DCT_SIZE)
+_DCT_MATRIX = np.cos(np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * _DCT_SIZE))
+
+def phash(image: Image.Image) -> int:
+    """DCT hash: 8x8 hệ số tần số thấp so với median"""
+    gray = image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.Resampling.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.float64)
+    dct = _DCT_MATRIX @ pixels @ _DCT_MATRIX.T
+    low = dct[:8, :8]
+    return _bits_to_int(low > np.median(low))
+
+_HASHES = {"dhash": dhash, "phash": phash}
+
+def image_hash(image_bytes: bytes, method: str = "dhash") -> int:
+    image = Image.open(io.BytesIO(image_bytes))
+    return _HASHES[method](image)
+
+def to_signed(value: int) -> int:
+    """uint64 -> int64 để lưu vào cột bigint"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+# -------------------------------
+# MULTI-INDEX HASH TABLE
+# -------------------------------
+
+def _neighbour_masks(radius: int) -> List[int]:
+    """Tất cả mask CHUNK_BITS bit có <= radius bit 1"""
+    masks = [0]
+    for weight in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), weight):
+            masks.append(sum(1 << p for p in positions))
+    return masks
+
+
+class MultiIndexHashTable:
+    def __init__(self, max_distance: int = 6):
+        self.max_distance = max_distance
+        self._masks = _neighbour_masks(max_distance // CHUNKS)
+        # Mỗi chunk: bucket value -> array các entry index
+        self._buckets: List[Dict[int, array]] = [{} for _ in range(CHUNKS)]
+        self._hashes = array("Q")
+        self._keys: List[Optional[str]] = []
+        self._entry_of: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entry_of)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entry_of
+
+    def add(self, key: str, value: int):
+        with self._lock:
+            if key in self._entry_of:
+                return
+            entry = len(self._hashes)
+            self._hashes.append(value)
+            self._keys.append(key)
+            self._entry_of[key] = entry
+            for chunk in range(CHUNKS):
+                part = (value >> (chunk * CHUNK_BITS)) & CHUNK_MASK
+                bucket = self._buckets[chunk].get(part)
+                if bucket is None:
+                    bucket = self._buckets[chunk][part] = array("I")
+                bucket.append(entry)
+
+    def remove(self, key: str):
+        """Tombstone: entry vẫn nằm trong bucket nhưng bị bỏ qua khi tra"""
+        with self._lock:
+            entry = self._entry_of.pop(key, None)
+            if entry is not None:
+                self._keys[entry] = None
+
+    def nearest(self, value: int) -> Optional[Tuple[str, int]]:
+        """(key, distance) gần nhất trong bán kính max_distance"""
+        with self._lock:
+            parts = []
+            for chunk in range(CHUNKS):
+                part = (value >> (chunk * CHUNK_BITS)) & CHUNK_MASK
+                buckets = self._buckets[chunk]
+                for mask in self._masks:
+                    bucket = buckets.get(part ^ mask)
+                    if bucket:
+                        parts.append(np.frombuffer(bucket, dtype=np.uint32))
+            if not parts:
+                return None
+
+            # Kiểm tra Hamming distance đầy đủ, vector hóa trên các candidate
+            entries = np.unique(np.concatenate(parts))
+            del parts
+            hashes = np.frombuffer(self._hashes, dtype=np.uint64)[entries]
+            distances = np.bitwise_count(hashes ^ np.uint64(value))
+
+            for i in np.argsort(distances, kind="stable"):
+                if distances[i] > self.max_distance:
+                    break
+                key = self._keys[entries[i]]
+                if key is not None:
+                    return key, int(distances[i])
+        return None
+
+
+# -------------------------------
+# DEDUP SERVICE
+# -------------------------------
+
+@dataclass
+class DedupResult:
+    phash: int
+    sha256: bytes
+    match_media_id: Optional[str] = None
+    distance: Optional[int] = None
+    exact_storage_path: Optional[str] = None  # file giống hệt từng byte, cùng owner
+
+
+class DedupService:
+    def __init__(self, method: str = "dhash", max_distance: int = 6):
+        self.method = method
+        self.table = MultiIndexHashTable(max_distance)
+        # (sha256[:16], owner_id) -> (media_id, storage_path), để bỏ qua upload file trùng
+        # hoàn toàn; chỉ dùng chung object của chính user đó
+        self._exact: Dict[Tuple[bytes, str], Tuple[str, str]] = {}
+        # Upload tạm (/media/upload-temp) chờ được link vào post
+        self._pending: "OrderedDict[str, DedupResult]" = OrderedDict()
+        self._max_pending = 10000
+
+    def inspect(self, image_bytes: bytes, owner_id: Optional[str] = None) -> Optional[DedupResult]:
+        """
+        Tính hash và tra bảng; None nếu không đọc được ảnh.
+        Decode + resize ảnh tốn CPU: route gọi qua asyncio.to_thread.
+        """
+        try:
+            value = image_hash(image_bytes, self.method)
+        except Exception as e:
+            logging.warning(f"[Dedup] Cannot hash image: {e}")
+            return None
+
+        result = DedupResult(phash=value, sha256=hashlib.sha256(image_bytes).digest()[:16])
+
+        exact = self._exact.get((result.sha256, owner_id)) if owner_id else None
+        if exact and exact[0] in self.table:
+            result.match_media_id, result.exact_storage_path = exact
+            result.distance = 0
+            return result
+
+        match = self.table.nearest(value)
+        if match:
+            result.match_media_id, result.distance = match
+        return result
+
+    def add(self, media_id: str, storage_path: str, result: DedupResult, owner_id: Optional[str] = None):
+        self.table.add(media_id, result.phash)
+        if owner_id:
+            self._exact.setdefault((result.sha256, owner_id), (media_id, storage_path))
+
+    def add_hash(self, media_id: str, value: int):
+        """Nạp hash đã lưu trong DB (không có sha256)"""
+        self.table.add(media_id, to_unsigned(value))
+
+    def remove(self, media_id: str):
+        self.table.remove(media_id)
+
+    def remember_pending(self, storage_path: str, result: DedupResult):
+        self._pending[storage_path] = result
+        while len(self._pending) > self._max_pending:
+            self._pending.popitem(last=False)
+
+    def pop_pending(self, storage_path: str) -> Optional[DedupResult]:
+        return self._pending.pop(storage_path, None)
+
+
+def reused_verdict(supabase, result: Optional[DedupResult]) -> dict:
+    """
+    Các cột copy sang post_media mới khi trùng với media đã có.
+    Trả {} nếu không trùng hoặc media gốc đã bị xóa.
+    """
+    if not result:
+        return {}
+
+    fields = {"phash": to_signed(result.phash)}
+    if not result.match_media_id:
+        return fields
+
+    original = supabase.table("post_media").select("id, ai_perc, is_ai").eq("id", result.match_media_id).execute()
+    if not original.data:
+        get_dedup_service().remove(result.match_media_id)
+        result.match_media_id = None
+        result.exact_storage_path = None
+        return fields
+
+    fields["duplicate_of"] = result.match_media_id
+    fields["duplicate_distance"] = result.distance
+    if original.data[0].get("is_ai") is not None:
+        fields["is_ai"] = original.data[0]["is_ai"]
+        fields["ai_perc"] = original.data[0]["ai_perc"]
+    return fields
+
+
+def warm_dedup_index(supabase, page_size: int = 1000):
+    """Nạp hash của media đã có (chạy trong thread lúc startup)"""
+    service = get_dedup_service()
+    offset = 0
+    try:
+        while True:
+            rows = supabase.table("post_media")\
+                .select("id, phash")\
+                .not_.is_("phash", "null")\
+                .order("id")\
+                .range(offset, offset + page_size - 1)\
+                .execute()
+            for row in rows.data:
+                service.add_hash(row["id"], row["phash"])
+            if len(rows.data) < page_size:
+                break
+            offset += page_size
+    except Exception as e:
+        logging.error(f"[Dedup] Failed to load image hashes: {e}")
+    logging.info(f"[Dedup] Loaded {len(service.table)} image hashes")
+
+
+_dedup_instance = None
+
+def get_dedup_service() -> DedupService:
+    global _dedup_instance
+    if _dedup_instance is None:
+        _dedup_instance = DedupService(
+            method=settings.dedup_hash_method,
+            max_distance=settings.dedup_max_distance
+        )
+    return _dedup_instance
@@ -0,0 +1,438 @@
+"""
+Embedding store cho post_media + vector index để tìm ảnh tương tự.
+
+File layout (trong settings.embedding_store_dir):
+    embeddings.f16  - ma trận float16 [N, dim], chỉ append
+    ids.txt         - media_id tương ứng từng dòng (dòng rỗng = đã xóa)
+    .lock           - flock: mọi worker ghi chung 2 file trên
+
+Ghi đè embedding = append dòng mới, dòng sau cùng của một media_id thắng. Mỗi worker
+đọc thêm phần các worker khác đã append khi thấy ids.txt đổi (os.stat); xóa ghi lại
+ids.txt qua os.replace nên worker khác thấy inode đổi và nạp lại toàn bộ.
+"""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from config import get_settings
+import numpy as np
+import threading
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có flock, chỉ chạy 1 worker
+    fcntl = None
+
+settings = get_settings()
+
+EMBEDDING_DIM = 768
+
+
+class EmbeddingStore:
+    def __init__(self, directory: str, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, "embeddings.f16")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        self.lock_path = os.path.join(directory, ".lock")
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._reset(None)
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+        logging.info(f"[EmbeddingStore] Loaded {len(self._row_of)} embeddings")
+
+    def _reset(self, inode: Optional[int]):
+        self._ids: List[str] = []
+        # Buffer tăng gấp đôi khi đầy, append không copy cả ma trận mỗi lần
+        self._buffer = np.empty((0, self.dim), dtype=np.float16)
+        self._row_of: Dict[str, int] = {}
+        # Số dòng không còn dùng (đã xóa / bị ghi đè)
+        self.dead = 0
+        self._ids_inode = inode
+        self._ids_offset = 0
+
+    @property
+    def rows(self) -> int:
+        return len(self._ids)
+
+    @property
+    def _vectors(self) -> np.ndarray:
+        return self._buffer[: len(self._ids)]
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def _append(self, ids: List[str], vectors: np.ndarray):
+        start, end = len(self._ids), len(self._ids) + len(ids)
+        if end > len(self._buffer):
+            buffer = np.empty((max(end, 2 * len(self._buffer), 1024), self.dim), dtype=np.float16)
+            buffer[:start] = self._buffer[:start]
+            self._buffer = buffer
+        self._buffer[start:end] = vectors
+        for row, media_id in enumerate(ids, start):
+            if not media_id:
+                self.dead += 1
+                continue
+            if media_id in self._row_of:
+                self.dead += 1
+            self._row_of[media_id] = row
+        self._ids.extend(ids)
+
+    def _sync(self):
+        """Đọc các dòng worker khác đã ghi; cần giữ _lock và file lock"""
+        try:
+            stat = os.stat(self.ids_path)
+        except FileNotFoundError:
+            if self._ids:
+                self._reset(None)
+            return
+        if stat.st_ino != self._ids_inode or stat.st_size < self._ids_offset:
+            self._reset(stat.st_ino)
+        if stat.st_size == self._ids_offset:
+            return
+
+        with open(self.ids_path, "rb") as f:
+            f.seek(self._ids_offset)
+            data = f.read()
+        # Bỏ dòng cuối chưa có "\n" (process bị kill giữa chừng)
+        data = data[: data.rfind(b"\n") + 1]
+        lines = data.split(b"\n")[:-1]
+        if not lines:
+            return
+
+        start = len(self._ids)
+        vectors = np.array([], dtype=np.float16)
+        if os.path.exists(self.vectors_path):
+            vectors = np.fromfile(self.vectors_path, dtype=np.float16,
+                                  count=len(lines) * self.dim, offset=start * self.dim * 2)
+        # Vector được ghi trước id nên thường đủ; thiếu thì đợi lần sync sau
+        lines = lines[: len(vectors) // self.dim]
+        if not lines:
+            return
+        self._append([line.decode("utf-8") for line in lines],
+                     vectors[: len(lines) * self.dim].reshape(-1, self.dim))
+        self._ids_offset += sum(len(line) + 1 for line in lines)
+
+    def refresh(self):
+        """Nhận dòng mới / xóa từ worker khác (1 os.stat nếu không có gì đổi)"""
+        try:
+            stat = os.stat(self.ids_path)
+        except FileNotFoundError:
+            if not self._ids:
+                return
+            stat = None
+        if stat is not None and stat.st_ino == self._ids_inode and stat.st_size == self._ids_offset:
+            return
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, media_id: str) -> bool:
+        self.refresh()
+        return media_id in self._row_of
+
+    def put(self, media_id: str, embedding: np.ndarray):
+        """Lưu (hoặc ghi đè) embedding của một media"""
+        vector = np.asarray(embedding, dtype=np.float16).reshape(self.dim)
+
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync()
+            if os.path.exists(self.ids_path) and os.path.getsize(self.ids_path) > self._ids_offset:
+                os.truncate(self.ids_path, self._ids_offset)  # dòng dở dang
+            row = len(self._ids)
+            # Ghi theo vị trí thay vì append: vector thừa sau crash bị ghi đè
+            with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "w+b") as f:
+                f.seek(row * self.dim * 2)
+                f.write(vector.tobytes())
+            line = (media_id + "\n").encode("utf-8")
+            with open(self.ids_path, "ab") as f:
+                f.write(line)
+            self._append([media_id], vector[None, :])
+            self._ids_inode = os.stat(self.ids_path).st_ino
+            self._ids_offset += len(line)
+
+    def get(self, media_id: str) -> Optional[np.ndarray]:
+        self.refresh()
+        row = self._row_of.get(media_id)
+        if row is None:
+            return None
+        return self._vectors[row].astype(np.float32)
+
+    def get_many(self, media_ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Trả về (ids tìm thấy, ma trận float32 tương ứng)"""
+        self.refresh()
+        found = [m for m in media_ids if m in self._row_of]
+        rows = [self._row_of[m] for m in found]
+        return found, self._vectors[rows].astype(np.float32)
+
+    def remove(self, media_id: str):
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync()
+            row = self._row_of.pop(media_id, None)
+            if row is None:
+                return
+            # Xóa hiếm khi xảy ra: ghi lại ids file, blank mọi dòng của media_id
+            ids = ["" if m == media_id else m for m in self._ids]
+            self._ids = ids
+            self.dead += 1
+            data = "".join(m + "\n" for m in ids).encode("utf-8")
+            tmp = self.ids_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.ids_path)
+            self._ids_inode = os.stat(self.ids_path).st_ino
+            self._ids_offset = len(data)
+
+    def media_id_at(self, row: int) -> Optional[str]:
+        """media_id nếu dòng còn dùng, None nếu đã xóa / bị ghi đè"""
+        if row >= len(self._ids):
+            return None  # đang nạp lại sau khi worker khác xóa
+        media_id = self._ids[row]
+        return media_id if media_id and self._row_of.get(media_id) == row else None
+
+    def live_rows(self) -> Tuple[List[int], np.ndarray, int, int]:
+        """(các dòng còn dùng, ma trận float16 tương ứng, tổng số dòng, số dòng bỏ)"""
+        with self._lock:
+            rows = sorted(self._row_of.values())
+            return rows, self._vectors[rows], len(self._ids), self.dead
+
+    def vectors_between(self, start: int, end: int) -> np.ndarray:
+        return self._buffer[start:end].copy()
+
+
+# -------------------------------
+# VECTOR INDEX
+# -------------------------------
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorIndex(ABC):
+    """Cosine-similarity index; kết quả là vị trí vector theo thứ tự build / add"""
+
+    # True: backend có add(vectors) thêm vector vào cuối; False: dòng mới làm index
+    # được build lại
+    supports_add = False
+
+    @abstractmethod
+    def build(self, vectors: np.ndarray):
+        ...
+
+    @abstractmethod
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        ...
+
+
+class BruteForceIndex(VectorIndex):
+    """Exact search bằng NumPy, đủ nhanh đến vài chục nghìn vector"""
+
+    supports_add = True
+
+    def build(self, vectors: np.ndarray):
+        self._matrix = _normalize(vectors).reshape(-1, vectors.shape[-1])
+        self._size = len(self._matrix)
+
+    def add(self, vectors: np.ndarray):
+        end = self._size + len(vectors)
+        if end > len(self._matrix):
+            matrix = np.empty((max(end, 2 * len(self._matrix), 1024), self._matrix.shape[1]), dtype=np.float32)
+            matrix[: self._size] = self._matrix[: self._size]
+            self._matrix = matrix
+        self._matrix[self._size:end] = _normalize(vectors)
+        self._size = end
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not self._size:
+            return []
+        scores = self._matrix[: self._size] @ _normalize(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+class FaissHNSWIndex(VectorIndex):
+    """ANN index (HNSW) dùng faiss nếu được cài đặt"""
+
+    supports_add = True
+
+    def __init__(self, m: int = 32, ef_search: int = 64):
+        import faiss  # optional dependency
+
+        self._faiss = faiss
+        self.m = m
+        self.ef_search = ef_search
+
+    def build(self, vectors: np.ndarray):
+        index = self._faiss.IndexHNSWFlat(vectors.shape[1], self.m, self._faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = self.ef_search
+        if len(vectors):
+            index.add(_normalize(vectors))
+        self._index = index
+
+    def add(self, vectors: np.ndarray):
+        self._index.add(_normalize(vectors))
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not self._index.ntotal:
+            return []
+        scores, rows = self._index.search(_normalize(query)[None, :], min(k, self._index.ntotal))
+        return [(int(row), float(score)) for row, score in zip(rows[0], scores[0]) if row >= 0]
+
+
+_index_backends: Dict[str, Callable[[], VectorIndex]] = {
+    "brute": BruteForceIndex,
+    "faiss": FaissHNSWIndex,
+}
+
+
+def register_index_backend(name: str, factory: Callable[[], VectorIndex]):
+    """Đăng ký ANN backend khác (vd. hnswlib, annoy)"""
+    _index_backends[name] = factory
+
+
+class SimilarityIndex:
+    """
+    Chọn backend theo kích thước store: brute force khi nhỏ, ANN khi vượt
+    settings.embedding_ann_threshold. Dòng mới của store được add() dần vào index;
+    build lại (đổi backend, quá nhiều dòng đã xóa / ghi đè) chạy ở thread nền,
+    trong lúc đó vẫn search trên index cũ.
+    """
+
+    # Build lại khi số dòng bỏ trong index vượt tỉ lệ này
+    max_dead_ratio = 0.25
+
+    def __init__(self, store: EmbeddingStore, backend: str = "auto", ann_threshold: int = 20000):
+        self.store = store
+        self.backend = backend
+        self.ann_threshold = ann_threshold
+        self._index: Optional[VectorIndex] = None
+        self._ann = False
+        # Vị trí trong index -> dòng của store
+        self._rows: List[int] = []
+        self._next_row = 0
+        self._dead_at_build = 0
+        self._ann_available = True
+        self._rebuilding = False
+        self._lock = threading.Lock()
+
+    def _create_index(self, size: int) -> Tuple[VectorIndex, bool]:
+        name = self.backend
+        if name == "auto":
+            name = "faiss" if size >= self.ann_threshold and self._ann_available else "brute"
+        try:
+            return _index_backends[name](), name != "brute"
+        except ImportError:
+            logging.warning(f"[SimilarityIndex] Backend '{name}' not available, using brute force")
+            self._ann_available = False
+            return BruteForceIndex(), False
+
+    def _build(self):
+        rows, vectors, end, dead = self.store.live_rows()
+        index, ann = self._create_index(len(rows))
+        index.build(vectors.reshape(-1, self.store.dim))
+        return index, ann, rows, end, dead
+
+    def _install(self, built):
+        self._index, self._ann, self._rows, self._next_row, self._dead_at_build = built
+
+    def _rebuild_in_background(self):
+        if self._rebuilding:
+            return
+        self._rebuilding = True
+
+        def run():
+            try:
+                built = self._build()
+                with self._lock:
+                    self._install(built)
+            except Exception as e:
+                logging.error(f"[SimilarityIndex] Rebuild failed: {e}")
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=run, name="similarity-index-rebuild", daemon=True).start()
+
+    def _catch_up(self):
+        """Add các dòng store mới vào index; cần giữ _lock"""
+        end = self.store.rows
+        if end <= self._next_row:
+            return
+        if not self._index.supports_add:
+            self._rebuild_in_background()
+            return
+        self._index.add(self.store.vectors_between(self._next_row, end))
+        self._rows.extend(range(self._next_row, end))
+        self._next_row = end
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        self.store.refresh()
+        with self._lock:
+            if self._index is None:
+                # Lần đầu build đồng bộ; route gọi qua asyncio.to_thread
+                self._install(self._build())
+            self._catch_up()
+
+            dead = self.store.dead - self._dead_at_build
+            wants_ann = (self.backend == "auto" and not self._ann and self._ann_available
+                         and len(self._rows) - dead >= self.ann_threshold)
+            if wants_ann or dead > self.max_dead_ratio * max(len(self._rows), 1):
+                self._rebuild_in_background()
+
+            # Lấy dư để bù các dòng đã xóa / ghi đè còn nằm trong index
+            fetch = k + 1 if exclude else k
+            if dead > 0:
+                fetch *= 2
+            hits = self._index.search(query, fetch)
+            rows = self._rows
+
+        results = []
+        for position, score in hits:
+            media_id = self.store.media_id_at(rows[position])
+            if media_id is not None and media_id != exclude:
+                results.append((media_id, score))
+        return results[:k]
+
+    def similar_to(self, media_id: str, k: int = 10) -> Optional[List[Tuple[str, float]]]:
+        """Các media gần nhất với media_id, None nếu chưa có embedding"""
+        query = self.store.get(media_id)
+        if query is None:
+            return None
+        return self.search(query, k, exclude=media_id)
+
+
+# -------------------------------
+# SINGLETONS
+# -------------------------------
+
+_store_instance = None
+_index_instance = None
+
+def get_embedding_store() -> EmbeddingStore:
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = EmbeddingStore(settings.embedding_store_dir)
+    return _store_instance
+
+def get_similarity_index() -> SimilarityIndex:
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = SimilarityIndex(
+            get_embedding_store(),
+            backend=settings.embedding_index_backend,
+            ann_threshold=settings.embedding_ann_threshold,
+        )
+    return _index_instance
@@ -0,0 +1,229 @@
+"""
+Tập post user đã like, cache theo user: trả is_liked cho cả trang feed (và /liked,
+:batchLiked, chi tiết post) không cần query post_likes.
+
+Mỗi user giữ một array 64-bit đã sort (fingerprint của post id, 8 byte mỗi like),
+tra bằng bisect. Fingerprint lấy từ 8 byte blake2b: xác suất trùng ~ số like / 2^64,
+coi như exact. Chưa có trong cache thì request query post_likes in_ như cũ (1 query,
+nằm trong QUERY_BUDGETS) và tập được nạp ở thread nền (đọc post_likes của user theo
+trang) cho các request sau. Like / unlike trong process này cập nhật tại chỗ; ghi từ
+worker khác chỉ thấy sau TTL. Tổng dung lượng bị giới hạn (liked_cache_max_bytes),
+vượt thì bỏ user ít dùng nhất; user like quá nhiều (liked_cache_max_likes_per_user)
+không cache, query như cũ.
+"""
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Set, Tuple
+from config import get_settings
+from services.metrics import registry
+import hashlib
+import logging
+import threading
+import time
+
+settings = get_settings()
+
+liked_cache_lookups = registry.counter(
+    "liked_cache_lookups_total", "is_liked lookups by outcome (hit, miss, bypass)", ("outcome",)
+)
+liked_cache_bytes = registry.gauge(
+    "liked_cache_bytes", "Approximate bytes held by the per-user liked-post cache"
+)
+
+# Overhead cố định mỗi user (array + entry OrderedDict), ước lượng
+_ENTRY_OVERHEAD = 200
+
+
+def _fingerprint(post_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(post_id.encode(), digest_size=8).digest(), "little", signed=True)
+
+
+def _contains(keys: array, key: int) -> bool:
+    i = bisect_left(keys, key)
+    return i < len(keys) and keys[i] == key
+
+
+class LikedSetCache:
+    def __init__(self, ttl_seconds: float = 15.0, max_bytes: int = 32 * 1024 * 1024,
+                 max_likes_per_user: int = 5000, page_size: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_likes_per_user = max_likes_per_user
+        self.page_size = page_size
+        # user_id -> (fingerprint đã sort, loaded_at)
+        self._users: "OrderedDict[str, Tuple[array, float]]" = OrderedDict()
+        # user có quá nhiều like: không cache tới hết TTL
+        self._oversized: "OrderedDict[str, float]" = OrderedDict()
+        # lần ghi cuối theo user: load bắt đầu trước đó có thể thiếu like vừa ghi
+        self._last_write: "OrderedDict[str, float]" = OrderedDict()
+        self._bytes = 0
+        # user đang được nạp ở thread nền
+        self._loading: Set[str] = set()
+        # Thread riêng, không kế thừa context của request: query nạp không tính vào trace
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="liked-cache")
+        self._lock = threading.Lock()
+        liked_cache_bytes.set_function(lambda: self._bytes)
+
+    @staticmethod
+    def _size(keys: array) -> int:
+        return _ENTRY_OVERHEAD + keys.itemsize * len(keys)
+
+    def _cached(self, user_id: str) -> Optional[array]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl_seconds:
+                self._drop(user_id)
+                return None
+            self._users.move_to_end(user_id)
+            return entry[0]
+
+    def _drop(self, user_id: str):
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= self._size(entry[0])
+
+    def _is_oversized(self, user_id: str) -> bool:
+        with self._lock:
+            until = self._oversized.get(user_id)
+            if until is None:
+                return False
+            if until < time.monotonic():
+                del self._oversized[user_id]
+                return False
+            return True
+
+    def _load(self, supabase, user_id: str) -> Optional[array]:
+        """Đọc mọi like của user theo trang (thread nền); None nếu vượt max_likes_per_user"""
+        started = time.monotonic()
+        fingerprints: List[int] = []
+        offset = 0
+        while True:
+            rows = supabase.table("post_likes")\
+                .select("post_id")\
+                .eq("user_id", user_id)\
+                .order("post_id")\
+                .range(offset, offset + self.page_size - 1)\
+                .execute().data
+            fingerprints.extend(_fingerprint(row["post_id"]) for row in rows)
+            if len(fingerprints) > self.max_likes_per_user:
+                with self._lock:
+                    self._oversized[user_id] = time.monotonic() + self.ttl_seconds
+                    while len(self._oversized) > 10000:
+                        self._oversized.popitem(last=False)
+                return None
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+
+        keys = array("q", sorted(set(fingerprints)))
+        with self._lock:
+            # Like / unlike xảy ra trong lúc đang đọc: dùng cho request này nhưng không cache
+            if self._last_write.get(user_id, 0.0) >= started:
+                return keys
+            self._drop(user_id)
+            self._users[user_id] = (keys, time.monotonic())
+            self._bytes += self._size(keys)
+            while self._bytes > self.max_bytes and self._users:
+                oldest = next(iter(self._users))
+                self._drop(oldest)
+        return keys
+
+    def _load_in_background(self, supabase, user_id: str):
+        with self._lock:
+            if user_id in self._loading:
+                return
+            self._loading.add(user_id)
+
+        def run():
+            try:
+                self._load(supabase, user_id)
+            except Exception as e:
+                logging.error(f"[LikedCache] Failed to load likes of {user_id}: {e}")
+            finally:
+                with self._lock:
+                    self._loading.discard(user_id)
+
+        self._executor.submit(run)
+
+    def liked_among(self, supabase, user_id: str, post_ids: Iterable[str]) -> Set[str]:
+        """Các post trong post_ids mà user đã like"""
+        post_ids = list(post_ids)
+        if not post_ids:
+            return set()
+        keys = self._cached(user_id)
+        if keys is not None:
+            liked_cache_lookups.inc("hit")
+            return {post_id for post_id in post_ids if _contains(keys, _fingerprint(post_id))}
+        if self._is_oversized(user_id):
+            liked_cache_lookups.inc("bypass")
+        else:
+            liked_cache_lookups.inc("miss")
+            self._load_in_background(supabase, user_id)
+        return _query_liked(supabase, user_id, post_ids)
+
+    def _record_write(self, user_id: str):
+        self._last_write[user_id] = time.monotonic()
+        self._last_write.move_to_end(user_id)
+        while len(self._last_write) > 10000:
+            self._last_write.popitem(last=False)
+
+    def added(self, user_id: str, post_id: str):
+        """Gọi sau khi insert post_likes thành công"""
+        key = _fingerprint(post_id)
+        with self._lock:
+            self._record_write(user_id)
+            entry = self._users.get(user_id)
+            if entry is not None and not _contains(entry[0], key):
+                insort(entry[0], key)
+                self._bytes += entry[0].itemsize
+
+    def removed(self, user_id: str, post_id: str):
+        """Gọi sau khi xóa post_likes"""
+        key = _fingerprint(post_id)
+        with self._lock:
+            self._record_write(user_id)
+            entry = self._users.get(user_id)
+            if entry is not None:
+                i = bisect_left(entry[0], key)
+                if i < len(entry[0]) and entry[0][i] == key:
+                    del entry[0][i]
+                    self._bytes -= entry[0].itemsize
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._users), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "oversized_users": len(self._oversized), "loading": len(self._loading)}
+
+
+_liked_cache_instance = None
+
+def get_liked_cache() -> LikedSetCache:
+    global _liked_cache_instance
+    if _liked_cache_instance is None:
+        _liked_cache_instance = LikedSetCache(
+            ttl_seconds=settings.liked_cache_ttl_seconds,
+            max_bytes=settings.liked_cache_max_bytes,
+            max_likes_per_user=settings.liked_cache_max_likes_per_user,
+        )
+    return _liked_cache_instance
+
+
+def _query_liked(supabase, user_id: str, post_ids: List[str]) -> Set[str]:
+    likes = supabase.table("post_likes")\
+        .select("post_id")\
+        .eq("user_id", user_id)\
+        .in_("post_id", post_ids)\
+        .execute()
+    return {like["post_id"] for like in likes.data}
+
+
+def liked_among(supabase, user_id: str, post_ids: Iterable[str]) -> Set[str]:
+    """Cache nếu bật, không thì 1 query post_likes in_ như cũ"""
+    if settings.liked_cache_enabled:
+        return get_liked_cache().liked_among(supabase, user_id, post_ids)
+    post_ids = list(post_ids)
+    return _query_liked(supabase, user_id, post_ids) if post_ids else set()
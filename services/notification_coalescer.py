@@ -0,0 +1,105 @@
+"""
+Gộp notification "like" theo (recipient, post).
+
+Like trong cùng một cửa sổ thời gian được buffer trong memory rồi flush theo
+batch: notification "like" chưa đọc của cùng post được cập nhật (1 câu upsert
+trong DB) thay vì tạo thêm dòng mới, nên số dòng không tăng theo số like.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from config import get_settings
+from services.notification_service import publish_notifications
+from services.unread_counter import get_unread_counter
+import threading
+import asyncio
+import logging
+
+settings = get_settings()
+
+
+@dataclass
+class _PendingLikes:
+    # Actor theo thứ tự like, người mới nhất ở cuối
+    actor_ids: List[str] = field(default_factory=list)
+
+
+def like_body(actor_name: str, actor_count: int) -> str:
+    if actor_count <= 1:
+        return f"{actor_name} liked your post"
+    others = actor_count - 1
+    return f"{actor_name} and {others} other{'s' if others > 1 else ''} liked your post"
+
+
+class LikeNotificationCoalescer:
+    def __init__(self, window_seconds: float = 30.0, max_recent_actors: int = 3):
+        self.window_seconds = window_seconds
+        self.max_recent_actors = max_recent_actors
+        self._buffer: Dict[Tuple[str, str], _PendingLikes] = {}
+        self._lock = threading.Lock()
+
+    def add_like(self, recipient_id: str, post_id: str, actor_id: str):
+        with self._lock:
+            pending = self._buffer.setdefault((recipient_id, post_id), _PendingLikes())
+            if actor_id in pending.actor_ids:
+                pending.actor_ids.remove(actor_id)
+            pending.actor_ids.append(actor_id)
+
+    def pending_count(self) -> int:
+        return len(self._buffer)
+
+    def flush(self, supabase) -> int:
+        """Ghi buffer xuống DB, trả về số notification đã ghi"""
+        with self._lock:
+            batch, self._buffer = self._buffer, {}
+        if not batch:
+            return 0
+
+        try:
+            return self._write(supabase, batch)
+        except Exception as e:
+            logging.error(f"[Coalescer] Flush failed, re-queueing {len(batch)} entries: {e}")
+            with self._lock:
+                for key, pending in batch.items():
+                    current = self._buffer.setdefault(key, _PendingLikes())
+                    current.actor_ids = pending.actor_ids + [
+                        a for a in current.actor_ids if a not in pending.actor_ids
+                    ]
+            return 0
+
+    def _write(self, supabase, batch: Dict[Tuple[str, str], _PendingLikes]) -> int:
+        # 1 RPC cho cả batch: insert ... on conflict trên notification like chưa đọc,
+        # actor_count đếm người đang like trong post_likes (migration 1200)
+        rows = [
+            {"recipient_id": recipient_id, "post_id": post_id, "actor_ids": list(reversed(pending.actor_ids))}
+            for (recipient_id, post_id), pending in batch.items()
+        ]
+        result = supabase.rpc("coalesce_like_notifications", {
+            "p_rows": rows,
+            "p_max_recent": self.max_recent_actors
+        }).execute()
+
+        notifications = [row["notification"] for row in result.data]
+        publish_notifications(notifications)
+        unread = Counter(row["notification"]["recipient_id"] for row in result.data if row["inserted"])
+        for recipient_id, n in unread.items():
+            get_unread_counter().incr(recipient_id, n)
+        return len(notifications)
+
+    async def run(self, supabase):
+        """Vòng lặp flush định kỳ, chạy trong lifespan của app"""
+        while True:
+            await asyncio.sleep(self.window_seconds)
+            await asyncio.to_thread(self.flush, supabase)
+
+
+_coalescer_instance = None
+
+def get_like_coalescer() -> LikeNotificationCoalescer:
+    global _coalescer_instance
+    if _coalescer_instance is None:
+        _coalescer_instance = LikeNotificationCoalescer(
+            window_seconds=settings.like_notification_window_seconds,
+            max_recent_actors=settings.like_notification_recent_actors
+        )
+    return _coalescer_instance
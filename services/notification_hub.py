@@ -0,0 +1,177 @@
+"""
+Pub/sub hub đẩy notification realtime đến client (SSE).
+
+Code ghi notification gọi hub.publish(); hub chuyển event qua backend
+(in-memory trong một process, hoặc Redis để nhiều worker dùng chung) rồi
+phát tới các connection của user đang mở trên worker hiện tại.
+"""
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional, Set
+from config import get_settings
+import asyncio
+import logging
+import json
+
+settings = get_settings()
+
+Deliver = Callable[[str, dict], None]
+
+
+class HubBackend(ABC):
+    @abstractmethod
+    async def start(self, deliver: Deliver):
+        ...
+
+    @abstractmethod
+    def publish(self, user_id: str, event: dict):
+        """Gọi trong event loop của hub"""
+        ...
+
+    async def stop(self):
+        pass
+
+
+class InMemoryBackend(HubBackend):
+    """Một process duy nhất (dev, tests)"""
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    def publish(self, user_id: str, event: dict):
+        self._deliver(user_id, event)
+
+
+class RedisBackend(HubBackend):
+    """Redis pub/sub, để event từ worker này tới được client nối vào worker khác"""
+
+    CHANNEL_PREFIX = "notifications:"
+
+    def __init__(self, url: str, min_backoff: float = 1.0, max_backoff: float = 30.0):
+        import redis.asyncio as redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._listener: Optional[asyncio.Task] = None
+        # Giữ reference tới task publish đang chạy (event loop chỉ giữ weak reference)
+        self._publishing: Set[asyncio.Task] = set()
+
+    async def start(self, deliver: Deliver):
+        self._listener = asyncio.create_task(self._listen(deliver))
+
+    async def _listen(self, deliver: Deliver):
+        """Subscribe lại với backoff khi mất kết nối Redis"""
+        delay = self.min_backoff
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+                delay = self.min_backoff
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    try:
+                        channel = message["channel"]
+                        if isinstance(channel, bytes):
+                            channel = channel.decode()
+                        deliver(channel[len(self.CHANNEL_PREFIX):], json.loads(message["data"]))
+                    except Exception as e:
+                        logging.error(f"[NotificationHub] Bad message from Redis: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"[NotificationHub] Redis subscription lost, retrying in {delay:.0f}s: {e}")
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    def publish(self, user_id: str, event: dict):
+        payload = json.dumps(event, default=str)
+        task = asyncio.create_task(self._redis.publish(f"{self.CHANNEL_PREFIX}{user_id}", payload))
+        self._publishing.add(task)
+        task.add_done_callback(self._published)
+
+    def _published(self, task: asyncio.Task):
+        self._publishing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"[NotificationHub] Failed to publish to Redis: {task.exception()}")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._publishing:
+            await asyncio.gather(*self._publishing, return_exceptions=True)
+        await self._redis.aclose()
+
+
+class NotificationHub:
+    def __init__(self, backend: HubBackend, queue_size: int = 100):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.backend.start(self._deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+        self._loop = None
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: str, event: dict):
+        """Gọi được từ cả event loop lẫn thread khác (vd. background flush)"""
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self.backend.publish(user_id, event)
+        else:
+            self._loop.call_soon_threadsafe(self.backend.publish, user_id, event)
+
+    def _deliver(self, user_id: str, event: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Client đọc quá chậm → bỏ event, client sẽ tự đồng bộ lại khi reconnect
+                logging.warning(f"[NotificationHub] Dropping event for slow client of user {user_id}")
+
+
+_hub_instance = None
+
+def get_notification_hub() -> NotificationHub:
+    global _hub_instance
+    if _hub_instance is None:
+        if settings.notification_hub_backend == "redis":
+            backend = RedisBackend(settings.redis_url)
+        else:
+            backend = InMemoryBackend()
+        _hub_instance = NotificationHub(backend)
+    return _hub_instance
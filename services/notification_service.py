@@ -0,0 +1,32 @@
+"""
+Ghi notification và phát event realtime cho người nhận.
+Mọi chỗ tạo notification nên đi qua đây thay vì insert trực tiếp.
+"""
+from collections import Counter
+from typing import List
+from services.notification_hub import get_notification_hub
+from services.unread_counter import get_unread_counter
+
+
+def publish_notifications(rows: List[dict]):
+    hub = get_notification_hub()
+    for row in rows:
+        hub.publish(row["recipient_id"], {"type": "notification", "notification": row})
+
+
+def send_notifications(supabase, rows: List[dict]) -> List[dict]:
+    """Bulk insert rồi publish các dòng đã tạo"""
+    if not rows:
+        return []
+    result = supabase.table("notifications").insert(rows).execute()
+    publish_notifications(result.data)
+    
+    unread = Counter(row["recipient_id"] for row in result.data if not row.get("is_read"))
+    for recipient_id, n in unread.items():
+        get_unread_counter().incr(recipient_id, n)
+    return result.data
+
+
+def send_notification(supabase, data: dict) -> dict | None:
+    created = send_notifications(supabase, [data])
+    return created[0] if created else None
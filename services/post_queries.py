@@ -0,0 +1,30 @@
+"""
+Helper đọc posts theo batch: số query cố định, không phụ thuộc số post.
+"""
+from typing import Dict, List
+from config import get_settings
+
+settings = get_settings()
+
+
+def fetch_profiles(supabase, user_ids: List[str], columns: str = "*") -> Dict[str, dict]:
+    """1 query cho mọi profile cần dùng"""
+    ids = list({uid for uid in user_ids if uid})
+    if not ids:
+        return {}
+    result = supabase.table("profiles").select(columns).in_("id", ids).execute()
+    return {p["id"]: p for p in result.data}
+
+
+def fetch_media(supabase, post_ids: List[str], with_urls: bool = True) -> Dict[str, List[dict]]:
+    """1 query cho media của mọi post, đã sắp theo order"""
+    media_by_post: Dict[str, List[dict]] = {post_id: [] for post_id in post_ids}
+    if not post_ids:
+        return media_by_post
+    result = supabase.table("post_media").select("*").in_("post_id", post_ids).order("order").execute()
+    bucket = supabase.storage.from_(settings.storage_bucket) if with_urls else None
+    for m in result.data:
+        if bucket:
+            m["url"] = bucket.get_public_url(m["storage_path"])
+        media_by_post.setdefault(m["post_id"], []).append(m)
+    return media_by_post
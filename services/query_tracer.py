@@ -0,0 +1,141 @@
+"""
+Trace các Supabase call trong từng request.
+
+- Ghi table / operation / filter / duration của mọi query (qua query observer
+  của InstrumentedClient, context lưu trong contextvar).
+- Phát hiện N+1: cùng một "shape" query (table + operation + các cột filter,
+  bỏ qua giá trị) lặp lại nhiều lần trong một request.
+- Budget số query theo route: vượt budget thì log warning (production) hoặc
+  raise QueryBudgetExceeded (tests, query_budget_mode="raise").
+- Tóm tắt trả về qua header X-Query-Trace khi bật query_trace_header.
+"""
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from config import get_settings
+import logging
+import time
+
+settings = get_settings()
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("query_trace", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_shape(table: str, operation: str, filters: List[Tuple[str, tuple]]) -> str:
+    """vd. profiles.select(eq:id) - giống nhau giữa các lần gọi N+1"""
+    parts = []
+    for method, args in filters:
+        if method in ("execute", "range", "limit", "single", "maybe_single"):
+            continue
+        column = args[0] if args and isinstance(args[0], str) else ""
+        parts.append(f"{method}:{column}" if column else method)
+    return f"{table}.{operation}({','.join(parts)})"
+
+
+@dataclass
+class TracedQuery:
+    table: str
+    operation: str
+    shape: str
+    duration: float
+    error: bool
+
+
+@dataclass
+class RequestTrace:
+    method: str
+    path: str
+    queries: List[TracedQuery] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    closed: bool = False
+
+    def add(self, table: str, operation: str, filters, duration: float, error):
+        if not self.closed:
+            self.queries.append(TracedQuery(table, operation, query_shape(table, operation, filters), duration, error is not None))
+
+    @property
+    def total_time(self) -> float:
+        return sum(q.duration for q in self.queries)
+
+    def repeated_shapes(self, threshold: int) -> Dict[str, int]:
+        counts = Counter(q.shape for q in self.queries)
+        return {shape: n for shape, n in counts.items() if n >= threshold}
+
+    def summary(self, threshold: int) -> str:
+        parts = [f"count={len(self.queries)}", f"time_ms={self.total_time * 1000:.1f}"]
+        repeated = self.repeated_shapes(threshold)
+        if repeated:
+            parts.append("repeated=" + ",".join(f"{shape}x{n}" for shape, n in repeated.items()))
+        return "; ".join(parts)
+
+
+def trace_query(table: str, operation: str, filters, duration: float, error):
+    """Query observer: gắn query vào trace của request hiện tại (nếu có)"""
+    trace = _current_trace.get()
+    # get_public_url chỉ build URL local, không phải round trip
+    if trace is not None and operation != "get_public_url":
+        trace.add(table, operation, filters, duration, error)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def route_budget(method: str, route: str) -> Optional[int]:
+    budgets = settings.query_budgets
+    budget = budgets.get(f"{method} {route}", budgets.get(route))
+    if budget is None and settings.query_budget_default > 0:
+        budget = settings.query_budget_default
+    return budget
+
+
+class QueryTraceMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or settings.query_budget_mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and not trace.closed:
+                trace.closed = True
+                summary = self._check(scope, trace)
+                if settings.query_trace_header:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"x-query-trace", summary.encode("latin-1", "replace"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+
+    def _check(self, scope, trace: RequestTrace) -> str:
+        route = getattr(scope.get("route"), "path", None) or trace.path
+        threshold = settings.query_repeat_threshold
+        summary = trace.summary(threshold)
+
+        repeated = trace.repeated_shapes(threshold)
+        if repeated:
+            logging.warning(f"[QueryTrace] Possible N+1 on {trace.method} {route}: {repeated}")
+
+        budget = route_budget(trace.method, route)
+        if budget is not None and len(trace.queries) > budget:
+            message = f"{trace.method} {route} ran {len(trace.queries)} queries (budget {budget}): {summary}"
+            if settings.query_budget_mode == "raise":
+                raise QueryBudgetExceeded(message)
+            logging.warning(f"[QueryTrace] Query budget exceeded: {message}")
+
+        return summary
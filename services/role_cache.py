@@ -0,0 +1,87 @@
+"""
+Cache role (user/admin) theo user, TTL ngắn.
+
+Role claim trong JWT chỉ được tin nếu token phát sau lần đổi role gần nhất của
+bất kỳ user nào (max profiles.role_changed_at, migration 900, dùng chung mọi
+worker; mỗi worker cache giá trị này role_cache_ttl_seconds). update_user_role gọi
+invalidate() để role mới có hiệu lực ngay trong process này; worker khác thấy sau
+tối đa 1 TTL, giống cache role theo user.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+from config import get_settings
+import logging
+import threading
+import time
+
+settings = get_settings()
+
+
+class RoleCache:
+    def __init__(self, ttl_seconds: float = 30.0, max_users: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        # user_id -> (role, expires_at)
+        self._roles: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # unix time lần đổi role gần nhất (mọi user) và lúc phải đọc lại từ DB
+        self._last_change = 0.0
+        self._last_change_expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[str]:
+        with self._lock:
+            entry = self._roles.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._roles[user_id]
+                return None
+            return entry[0]
+
+    def set(self, user_id: str, role: str):
+        with self._lock:
+            self._roles[user_id] = (role, time.monotonic() + self.ttl_seconds)
+            self._roles.move_to_end(user_id)
+            while len(self._roles) > self.max_users:
+                self._roles.popitem(last=False)
+
+    def invalidate(self, user_id: str, new_role: Optional[str] = None):
+        with self._lock:
+            self._roles.pop(user_id, None)
+            self._last_change = max(self._last_change, time.time())
+        if new_role:
+            self.set(user_id, new_role)
+
+    def _load_last_change(self, supabase) -> float:
+        rows = supabase.table("profiles")\
+            .select("role_changed_at")\
+            .order("role_changed_at", desc=True, nullsfirst=False)\
+            .limit(1)\
+            .execute().data
+        value = rows[0]["role_changed_at"] if rows else None
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp() if value else 0.0
+
+    def claim_is_current(self, supabase, issued_at: Optional[float]) -> bool:
+        """Role claim trong token chỉ hợp lệ nếu token được phát sau lần đổi role gần nhất"""
+        if issued_at is None:
+            return False
+        if self._last_change_expires < time.monotonic():
+            try:
+                last_change = self._load_last_change(supabase)
+            except Exception as e:
+                logging.error(f"[RoleCache] Failed to read role_changed_at: {e}")
+                return False
+            with self._lock:
+                self._last_change = max(self._last_change, last_change)
+                self._last_change_expires = time.monotonic() + self.ttl_seconds
+        return issued_at > self._last_change
+
+
+_role_cache_instance = None
+
+def get_role_cache() -> RoleCache:
+    global _role_cache_instance
+    if _role_cache_instance is None:
+        _role_cache_instance = RoleCache(ttl_seconds=settings.role_cache_ttl_seconds)
+    return _role_cache_instance
@@ -0,0 +1,123 @@
+"""
+Single-flight cho read nóng (post viral: hàng trăm get_post cùng id cùng lúc).
+
+Các read giống hệt nhau (cùng bảng, cột, filter) đang chạy đồng thời dùng chung một
+query Supabase: request đầu tiên (leader) chạy query trên thread, các request sau
+(joined) chờ cùng future. Tuỳ chọn micro-cache TTL rất ngắn (single_flight_ttl_seconds)
+giữ kết quả thêm vài chục ms. Ghi vào bảng làm tăng generation của bảng: read sau
+write (vào bảng chính hoặc bảng embed trong select) không join flight bắt đầu trước
+write, kết quả của flight cũ không được cache.
+
+Mỗi request nhận bản copy của data: handler sửa row (owner_name, is_liked...) tại chỗ.
+Chỉ dùng cho read không phụ thuộc người gọi (client service role, check quyền làm sau).
+"""
+from typing import Any, Callable, Dict, Iterable, Tuple
+from config import get_settings
+from services.metrics import registry
+import asyncio
+import copy
+import threading
+import time
+
+settings = get_settings()
+
+coalesced_reads = registry.counter(
+    "supabase_coalesced_reads_total", "Coalesced Supabase reads by outcome (leader, joined, cached)", ("table", "outcome")
+)
+
+_WRITE_OPERATIONS = {"insert", "update", "upsert", "delete"}
+
+
+def _copy_response(response: Any) -> Any:
+    shared = copy.copy(response)
+    shared.data = copy.deepcopy(response.data)
+    return shared
+
+
+class SingleFlight:
+    def __init__(self, ttl_seconds: float = 0.0, max_cached: int = 4096):
+        self.ttl_seconds = ttl_seconds
+        self.max_cached = max_cached
+        # (key, generation của từng bảng query đọc) -> task
+        self._inflight: Dict[Tuple[str, Tuple[int, ...]], asyncio.Future] = {}
+        self._generations: Dict[str, int] = {}
+        # key -> (tables, response, expires_at)
+        self._cache: Dict[str, Tuple[Tuple[str, ...], Any, float]] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"leader": 0, "joined": 0, "cached": 0}
+
+    def _count(self, table: str, outcome: str):
+        self.stats[outcome] += 1
+        coalesced_reads.inc(table, outcome)
+
+    def _generation(self, tables: Tuple[str, ...]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations.get(t, 0) for t in tables)
+
+    async def do(self, key: str, table: str, fn: Callable[[], Any], tables: Iterable[str] = ()) -> Any:
+        """
+        Kết quả của fn() (blocking, chạy trên thread) dùng chung theo key.
+        tables: các bảng khác query đọc qua embed (vd. profiles, post_media), ghi vào
+        bảng nào trong đó cũng làm read sau không join / không dùng cache cũ.
+        """
+        if self.ttl_seconds > 0:
+            with self._lock:
+                entry = self._cache.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._count(table, "cached")
+                return _copy_response(entry[1])
+
+        tables = tuple(sorted({table, *tables}))
+        flight = (key, self._generation(tables))
+        task = self._inflight.get(flight)
+        if task is not None:
+            self._count(table, "joined")
+        else:
+            # Task riêng: leader bị huỷ (client ngắt) không kéo theo các request đang join
+            task = asyncio.ensure_future(asyncio.to_thread(fn))
+            self._inflight[flight] = task
+            task.add_done_callback(lambda done: self._finish(flight, tables, done))
+            self._count(table, "leader")
+        return _copy_response(await asyncio.shield(task))
+
+    def _finish(self, flight: Tuple[str, Tuple[int, ...]], tables: Tuple[str, ...], task: asyncio.Task):
+        self._inflight.pop(flight, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self.ttl_seconds > 0:
+            key, generation = flight
+            now = time.monotonic()
+            with self._lock:
+                if tuple(self._generations.get(t, 0) for t in tables) != generation:
+                    return  # có bảng bị ghi trong lúc query chạy: kết quả có thể cũ
+                self._cache[key] = (tables, task.result(), now + self.ttl_seconds)
+                if len(self._cache) > self.max_cached:
+                    for expired in [k for k, entry in self._cache.items() if entry[2] <= now]:
+                        del self._cache[expired]
+
+    def invalidate(self, table: str):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key in [k for k, entry in self._cache.items() if table in entry[0]]:
+                del self._cache[key]
+
+    def snapshot(self) -> dict:
+        total = sum(self.stats.values())
+        shared = self.stats["joined"] + self.stats["cached"]
+        return {**self.stats, "inflight": len(self._inflight), "cached_entries": len(self._cache),
+                "hit_rate": round(shared / total, 4) if total else 0.0}
+
+
+_single_flight_instance = None
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight_instance
+    if _single_flight_instance is None:
+        _single_flight_instance = SingleFlight(ttl_seconds=settings.single_flight_ttl_seconds)
+    return _single_flight_instance
+
+
+def invalidate_on_write(table: str, operation: str, filters, duration: float, error):
+    """Query observer: ghi vào bảng thì sang generation mới và bỏ micro-cache của bảng đó"""
+    if operation in _WRITE_OPERATIONS:
+        get_single_flight().invalidate(table)
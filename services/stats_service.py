@@ -0,0 +1,154 @@
+"""
+Thống kê cho admin dashboard, tính sẵn thay vì count exact mỗi lần load.
+
+- Totals: trigger trên profiles / posts / post_likes cộng dồn vào
+  admin_stats_totals (migration 1100), mọi worker đọc cùng một số.
+  admin_stats_snapshot (RPC) lưu snapshot theo giờ và xóa snapshot / bucket cũ;
+  worker nào cũng gọi nhưng DB chỉ chạy thật 1 lần mỗi kỳ.
+- Series theo giờ trong admin_stats_buckets: posts, likes là delta trong
+  process được flush định kỳ qua RPC cộng dồn, nên nhiều worker cùng ghi được;
+  ai_approved / ai_rejected do trigger ghi khi posts.status đổi (migration 1400).
+  Đọc từ bản cache của bảng đó.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from config import get_settings
+import threading
+import asyncio
+import logging
+
+settings = get_settings()
+
+TOTALS = ("total_users", "total_posts", "public_posts", "total_likes")
+SERIES = ("posts", "likes", "ai_approved", "ai_rejected")
+
+
+def _hour_bucket(at: Optional[datetime] = None) -> datetime:
+    at = at or datetime.now(timezone.utc)
+    return at.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class StatsStore:
+    def __init__(self, retention_hours: int = 24 * 90):
+        self.retention_hours = retention_hours
+        # Delta series chưa flush: (metric, bucket) -> value
+        self._pending: Dict[Tuple[str, datetime], int] = defaultdict(int)
+        # Series đã merge từ DB (mọi worker): metric -> {bucket: value}
+        self._series: Dict[str, Dict[datetime, int]] = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    # ---------- ghi nhận sự kiện (posts / likes; phần còn lại do trigger trong DB) ----------
+
+    def record(self, metric: str, n: int = 1, at: Optional[datetime] = None):
+        with self._lock:
+            self._pending[(metric, _hour_bucket(at))] += n
+
+    def post_created(self):
+        self.record("posts")
+
+    def post_liked(self):
+        self.record("likes")
+
+    # ---------- đọc ----------
+
+    def totals(self, supabase) -> dict:
+        """Sum các shard của admin_stats_totals, 1 query"""
+        rows = supabase.table("admin_stats_totals").select("metric, value").execute()
+        values = dict.fromkeys(TOTALS, 0)
+        for row in rows.data:
+            if row["metric"] in values:
+                values[row["metric"]] += row["value"]
+        values = {k: max(v, 0) for k, v in values.items()}
+        values["private_posts"] = max(values["total_posts"] - values["public_posts"], 0)
+        return values
+
+    def series(self, metric: str, hours: int = 48, interval: str = "hour") -> List[dict]:
+        """Series posts/likes/ai_approved/ai_rejected, hoặc ai_rejection_rate"""
+        end = _hour_bucket()
+        buckets = [end - timedelta(hours=i) for i in range(hours - 1, -1, -1)]
+
+        with self._lock:
+            def value(name: str, bucket: datetime) -> int:
+                return self._series[name].get(bucket, 0) + self._pending.get((name, bucket), 0)
+
+            if metric == "ai_rejection_rate":
+                rows = [(b, value("ai_rejected", b), value("ai_approved", b)) for b in buckets]
+            else:
+                rows = [(b, value(metric, b), 0) for b in buckets]
+
+        if interval == "day":
+            days: Dict[datetime, List[int]] = {}
+            for bucket, a, b in rows:
+                day = bucket.replace(hour=0)
+                days.setdefault(day, [0, 0])
+                days[day][0] += a
+                days[day][1] += b
+            rows = [(day, a, b) for day, (a, b) in days.items()]
+
+        if metric == "ai_rejection_rate":
+            return [
+                {"bucket": bucket.isoformat(), "value": (rejected / (rejected + approved)) if rejected + approved else None,
+                 "rejected": rejected, "approved": approved}
+                for bucket, rejected, approved in rows
+            ]
+        return [{"bucket": bucket.isoformat(), "value": v} for bucket, v, _ in rows]
+
+    # ---------- đồng bộ với DB ----------
+
+    def snapshot(self, supabase, min_interval_seconds: float) -> bool:
+        """Snapshot totals + dọn dữ liệu cũ; False nếu worker khác vừa làm"""
+        result = supabase.rpc("admin_stats_snapshot", {
+            "p_min_interval_seconds": int(min_interval_seconds),
+            "p_retention_hours": self.retention_hours
+        }).execute()
+        return bool(result.data)
+
+    def flush_series(self, supabase):
+        """Cộng delta series vào DB rồi đọc lại bản đã merge của mọi worker"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+
+        if pending:
+            rows = [
+                {"metric": metric, "bucket": bucket.isoformat(), "value": value}
+                for (metric, bucket), value in pending.items()
+            ]
+            try:
+                supabase.rpc("increment_stat_buckets", {"p_rows": rows}).execute()
+            except Exception:
+                with self._lock:
+                    for key, value in pending.items():
+                        self._pending[key] += value
+                raise
+
+        since = (_hour_bucket() - timedelta(hours=self.retention_hours)).isoformat()
+        result = supabase.table("admin_stats_buckets").select("metric, bucket, value").gte("bucket", since).execute()
+        series: Dict[str, Dict[datetime, int]] = defaultdict(dict)
+        for row in result.data:
+            bucket = datetime.fromisoformat(row["bucket"]).astimezone(timezone.utc)
+            series[row["metric"]][bucket] = row["value"]
+        with self._lock:
+            self._series = series
+
+    async def run(self, supabase, flush_seconds: float, snapshot_seconds: float):
+        since_snapshot = snapshot_seconds
+        while True:
+            try:
+                await asyncio.to_thread(self.flush_series, supabase)
+                if since_snapshot >= snapshot_seconds:
+                    await asyncio.to_thread(self.snapshot, supabase, snapshot_seconds)
+                    since_snapshot = 0.0
+            except Exception as e:
+                logging.error(f"[Stats] Background sync failed: {e}")
+            await asyncio.sleep(flush_seconds)
+            since_snapshot += flush_seconds
+
+
+_stats_instance = None
+
+def get_stats_store() -> StatsStore:
+    global _stats_instance
+    if _stats_instance is None:
+        _stats_instance = StatsStore()
+    return _stats_instance
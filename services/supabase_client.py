@@ -1,20 +1,180 @@
 from supabase import create_client, Client
 from config import get_settings
+from services.supabase_recorder import maybe_record
+from services.single_flight import get_single_flight
 from functools import lru_cache
+from typing import Callable, List, Optional, Set, Tuple
 import logging
+import re
+import time
 
 settings = get_settings()
 
+# ========================================
+# Instrumentation
+# ========================================
+
+# observer(table, operation, filters, duration, error)
+QueryObserver = Callable[[str, str, List[Tuple[str, tuple]], float, Optional[BaseException]], None]
+_query_observers: List[QueryObserver] = []
+
+_OPERATIONS = {"select", "insert", "update", "upsert", "delete"}
+
+def add_query_observer(observer: QueryObserver):
+    """Đăng ký callback được gọi sau mỗi Supabase call (metrics, tracing...)"""
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+def _notify(table, operation, filters, duration, error):
+    for observer in _query_observers:
+        try:
+            observer(table, operation, filters, duration, error)
+        except Exception as e:
+            logging.error(f"Query observer failed: {e}")
+
+
+# Resource embed trong select: [alias:]table[!hint...](...); bỏ qua aggregate kiểu id.count()
+_EMBED_PATTERN = re.compile(r"(?<![\w.])(?:\w+:)?(\w+)(?:!\w+)*\s*\(")
+
+def _embedded_tables(calls: tuple) -> Set[str]:
+    """Các bảng được embed trong select(...) của chuỗi call"""
+    tables = set()
+    for name, args, _ in calls:
+        if name == "select":
+            for columns in args:
+                if isinstance(columns, str):
+                    tables.update(_EMBED_PATTERN.findall(columns))
+    return tables
+
+
+class _QueryProxy:
+    """Bọc query builder của postgrest, ghi lại chuỗi filter và đo execute()"""
+    __slots__ = ("_builder", "_table", "_operation", "_filters", "_calls")
+
+    def __init__(self, builder, table: str, operation: str = "select", filters=None, calls: tuple = ()):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+        self._filters = filters if filters is not None else []
+        # Toàn bộ chuỗi call kèm kwargs (vd. order(desc=True)), làm key cho single-flight
+        self._calls = calls
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            # vd. .not_ là property trả về builder
+            if hasattr(attr, "execute"):
+                return _QueryProxy(attr, self._table, self._operation, self._filters + [(name, ())],
+                                   self._calls + ((name, (), ()),))
+            return attr
+
+        def call(*args, **kwargs):
+            calls = self._calls + ((name, args, tuple(sorted(kwargs.items()))),)
+            result = attr(*args, **kwargs)
+            if not hasattr(result, "execute"):
+                return result
+            if name in _OPERATIONS:
+                return _QueryProxy(result, self._table, name, self._filters, calls)
+            return _QueryProxy(result, self._table, self._operation, self._filters + [(name, args)], calls)
+        return call
+
+    def execute(self):
+        start = time.perf_counter()
+        error = None
+        try:
+            return self._builder.execute()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _notify(self._table, self._operation, self._filters, time.perf_counter() - start, error)
+
+    async def execute_shared(self):
+        """
+        execute() qua single-flight: các read giống hệt đang chạy đồng thời dùng chung
+        một query (chạy trên thread, không chặn event loop). Chỉ cho select.
+        """
+        if self._operation != "select":
+            return self.execute()
+        key = repr((self._table, self._calls))
+        return await get_single_flight().do(key, self._table, self.execute, _embedded_tables(self._calls))
+
+
+class _TimedProxy:
+    """Đo mọi method call của một object (storage bucket, auth)"""
+    __slots__ = ("_target", "_table")
+
+    def __init__(self, target, table: str):
+        self._target = target
+        self._table = table
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            error = None
+            try:
+                return attr(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _notify(self._table, name, [], time.perf_counter() - start, error)
+        return call
+
+
+class _StorageProxy:
+    __slots__ = ("_storage",)
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def from_(self, bucket: str):
+        return _TimedProxy(self._storage.from_(bucket), f"storage:{bucket}")
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+
+class InstrumentedClient:
+    """
+    Client Supabase có instrumentation: table(), rpc(), storage, auth
+    giữ nguyên interface, mỗi call được báo cho các query observer
+    """
+
+    def __init__(self, client: Client):
+        self._client = client
+
+    def table(self, name: str):
+        return _QueryProxy(self._client.table(name), name)
+
+    def rpc(self, fn: str, params: dict = None, *args, **kwargs):
+        return _QueryProxy(self._client.rpc(fn, params or {}, *args, **kwargs), f"rpc:{fn}", "rpc")
+
+    @property
+    def storage(self):
+        return _StorageProxy(self._client.storage)
+
+    @property
+    def auth(self):
+        return _TimedProxy(self._client.auth, "auth")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
 @lru_cache()
 def get_supabase_admin_client() -> Client:
     """
     Supabase admin client with service_role key (không hết hạn)
     Dùng cho background tasks và operations không cần user context
     """
-    return create_client(
+    return InstrumentedClient(maybe_record(create_client(
         settings.supabase_url,
         settings.supabase_service_role_key
-    )
+    )))
 
 def get_supabase_client(token: str = None) -> Client:
     """
@@ -36,7 +196,7 @@ def get_supabase_client(token: str = None) -> Client:
         # Set token cho requests cần authentication
         client.auth.set_session(token)
     
-    return client
+    return InstrumentedClient(maybe_record(client))
 
 # ========================================
 # Wrapper function cho dependency injection
@@ -0,0 +1,422 @@
+"""
+Ghi lại traffic Supabase (request/response) để replay trong benchmark.
+
+Bật bằng supabase_recording_path. File là JSON Lines nén gzip, mỗi dòng
+một event:
+- meta:    header (version, scrubbed, ...)
+- request: HTTP request của app (method, path, query, headers, body, status, ms)
+- call:    một Supabase call trong request đó (target, chain builder, response, ms)
+- token:   token đã scrub → user (JWT verify local, không có call auth nào)
+
+Scrub PII (mặc định bật): các field như email, username, content... được
+thay bằng pseudonym ổn định (HMAC theo salt), giữ độ dài để data shape như
+thật và giữ join (cùng giá trị → cùng pseudonym). UUID không bị đổi.
+"""
+from contextvars import ContextVar
+from typing import Any, Iterator, List, Optional
+from config import get_settings
+import base64
+import dataclasses
+import gzip
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+settings = get_settings()
+
+FORMAT_VERSION = 1
+
+# Field coi là PII trong row, payload, body JSON và filter eq(column, value)
+PII_FIELDS = frozenset({
+    "email", "password", "phone", "username", "display_name", "full_name",
+    "avatar_url", "content", "body", "access_token", "refresh_token",
+})
+# Header giữ lại khi ghi request
+RECORDED_HEADERS = ("authorization", "content-type", "if-none-match")
+
+_current_request: ContextVar[Optional[int]] = ContextVar("recording_request", default=None)
+
+
+# -------------------------------
+# SCRUB
+# -------------------------------
+
+class PIIScrubber:
+    def __init__(self, salt: bytes, fields=PII_FIELDS):
+        self.salt = salt
+        self.fields = fields
+
+    def pseudonym(self, field: str, value: str) -> str:
+        digest = hmac.new(self.salt, f"{field}:{value}".encode(), hashlib.sha256).hexdigest()
+        if field == "email":
+            return f"user-{digest[:12]}@example.invalid"
+        if field in ("avatar_url",):
+            return f"https://example.invalid/{digest[:16]}"
+        # Giữ độ dài gốc (payload size ảnh hưởng serialize / network)
+        return (digest * (len(value) // len(digest) + 1))[:max(len(value), 1)]
+
+    def token(self, value: str) -> str:
+        return "scrubbed-" + hmac.new(self.salt, value.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def value(self, field: str, value: Any) -> Any:
+        if field not in self.fields or value is None:
+            return self.scrub(value)
+        if isinstance(value, str):
+            return self.pseudonym(field, value)
+        if isinstance(value, list):
+            return [self.pseudonym(field, v) if isinstance(v, str) else v for v in value]
+        return value
+
+    def scrub(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            return {k: self.value(k, v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self.scrub(v) for v in obj]
+        return obj
+
+    def chain(self, chain: List[list]) -> List[list]:
+        scrubbed = []
+        for name, args, kwargs in chain:
+            args = list(args)
+            # eq("username", value), in_("email", [...])
+            if len(args) >= 2 and isinstance(args[0], str) and args[0] in self.fields:
+                args[1] = self.value(args[0], args[1])
+            scrubbed.append([name, self.scrub(args), self.scrub(kwargs)])
+        return scrubbed
+
+
+# -------------------------------
+# ENCODE
+# -------------------------------
+
+def encode(obj: Any, max_blob_bytes: int = 0) -> Any:
+    """JSON-hoá args / response; bytes giữ nguyên nếu nhỏ, còn lại chỉ ghi size"""
+    if isinstance(obj, (bytes, bytearray)):
+        if len(obj) <= max_blob_bytes:
+            return {"$bytes": base64.b64encode(bytes(obj)).decode(), "size": len(obj)}
+        return {"$bytes": None, "size": len(obj)}
+    if isinstance(obj, dict):
+        return {str(k): encode(v, max_blob_bytes) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [encode(v, max_blob_bytes) for v in obj]
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if hasattr(obj, "model_dump"):
+        return encode(obj.model_dump(mode="json"), max_blob_bytes)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return encode(dataclasses.asdict(obj), max_blob_bytes)
+    return str(obj)
+
+
+def decode_bytes(value: Any) -> Any:
+    """Ngược lại với encode cho blob: bytes gốc, hoặc bytes 0 cùng size"""
+    if isinstance(value, dict) and "$bytes" in value:
+        if value["$bytes"] is None:
+            return bytes(value.get("size", 0))
+        return base64.b64decode(value["$bytes"])
+    return value
+
+
+# -------------------------------
+# WRITER
+# -------------------------------
+
+class SupabaseRecorder:
+    def __init__(self, path: str, scrub: bool = True, max_blob_bytes: int = 0,
+                 max_body_bytes: int = 1 << 20, salt: Optional[bytes] = None):
+        self.path = path
+        self.max_blob_bytes = max_blob_bytes
+        self.max_body_bytes = max_body_bytes
+        self.scrubber = PIIScrubber(salt or secrets.token_bytes(16)) if scrub else None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # gzip nhiều member nối nhau vẫn đọc được → mở "ab" an toàn khi restart
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._write({"k": "meta", "version": FORMAT_VERSION, "scrubbed": scrub,
+                     "started_at": time.time(), "max_blob_bytes": max_blob_bytes})
+
+    def _write(self, event: dict):
+        line = json.dumps(event, separators=(",", ":"), default=str)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _scrub(self, obj):
+        return self.scrubber.scrub(obj) if self.scrubber else obj
+
+    # ---------- request ----------
+
+    def start_request(self) -> int:
+        return next(self._ids)
+
+    def record_request(self, request_id: int, method: str, path: str, query: str, headers: dict,
+                       body: bytes, status: int, duration: float, started: float):
+        headers = dict(headers)
+        auth = headers.get("authorization")
+        if self.scrubber and auth and auth.startswith("Bearer "):
+            token = auth.split(" ", 1)[1]
+            headers["authorization"] = f"Bearer {self.scrubber.token(token)}"
+            self._record_token(token)
+
+        encoded_body = None
+        if body:
+            if "json" in headers.get("content-type", ""):
+                try:
+                    encoded_body = {"json": self._scrub(json.loads(body))}
+                except ValueError:
+                    encoded_body = None
+            if encoded_body is None:
+                encoded_body = encode(body, self.max_body_bytes if not self.scrubber else self.max_blob_bytes)
+
+        self._write({
+            "k": "request", "rid": request_id, "method": method, "path": path, "query": query,
+            "headers": headers, "body": encoded_body, "status": status,
+            "ms": duration * 1000, "at": started - self._started,
+        })
+
+    def _record_token(self, token: str):
+        """JWT verify local (require_admin) không gọi auth → ghi user để replay"""
+        from dependencies import decode_access_token
+        claims = decode_access_token(token)
+        if claims and claims.get("sub"):
+            self._write({"k": "token", "token": self.scrubber.token(token), "user": {
+                "id": claims["sub"], "app_metadata": claims.get("app_metadata") or {},
+            }})
+
+    # ---------- supabase call ----------
+
+    def record_call(self, kind: str, target: str, chain: List[list], result: Any,
+                    error: Optional[BaseException], duration: float):
+        data, count = result, None
+        if hasattr(result, "data") and kind in ("table", "rpc"):
+            data, count = result.data, getattr(result, "count", None)
+
+        chain = [[name, encode(args, self.max_blob_bytes), encode(kwargs, self.max_blob_bytes)]
+                 for name, args, kwargs in chain]
+        data = encode(data, self.max_blob_bytes)
+        if self.scrubber:
+            chain = self.scrubber.chain(chain)
+            if kind == "auth":
+                chain = [[name, [self.scrubber.token(a) if isinstance(a, str) else self._scrub(a) for a in args],
+                          self._scrub(kwargs)] for name, args, kwargs in chain]
+            data = self._scrub(data)
+
+        self._write({
+            "k": "call", "rid": _current_request.get(), "kind": kind, "target": target,
+            "chain": chain, "data": data, "count": count,
+            "error": f"{type(error).__name__}: {error}" if error is not None else None,
+            "ms": duration * 1000,
+        })
+
+
+def read_recording(path: str) -> Iterator[dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# -------------------------------
+# CLIENT PROXY
+# -------------------------------
+
+class _RecordingQuery:
+    """Ghi lại chuỗi builder (name, args, kwargs) và response của execute()"""
+    __slots__ = ("_builder", "_recorder", "_kind", "_target", "_chain")
+
+    def __init__(self, builder, recorder: SupabaseRecorder, kind: str, target: str, chain=None):
+        self._builder = builder
+        self._recorder = recorder
+        self._kind = kind
+        self._target = target
+        self._chain = chain if chain is not None else []
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            if hasattr(attr, "execute"):
+                return _RecordingQuery(attr, self._recorder, self._kind, self._target, self._chain + [[name, [], {}]])
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not hasattr(result, "execute"):
+                return result
+            return _RecordingQuery(result, self._recorder, self._kind, self._target,
+                                   self._chain + [[name, list(args), kwargs]])
+        return call
+
+    def execute(self):
+        start = time.perf_counter()
+        result, error = None, None
+        try:
+            result = self._builder.execute()
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._recorder.record_call(self._kind, self._target, self._chain, result, error, time.perf_counter() - start)
+
+
+class _RecordingTarget:
+    """Storage bucket / auth: mỗi method call là một event"""
+    __slots__ = ("_target", "_recorder", "_kind", "_name")
+
+    def __init__(self, target, recorder: SupabaseRecorder, kind: str, name: str):
+        self._target = target
+        self._recorder = recorder
+        self._kind = kind
+        self._name = name
+
+    def __getattr__(self, attr_name):
+        attr = getattr(self._target, attr_name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = attr(*args, **kwargs)
+                return result
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self._recorder.record_call(self._kind, self._name, [[attr_name, list(args), kwargs]],
+                                           result, error, time.perf_counter() - start)
+        return call
+
+
+class _RecordingStorage:
+    __slots__ = ("_storage", "_recorder")
+
+    def __init__(self, storage, recorder: SupabaseRecorder):
+        self._storage = storage
+        self._recorder = recorder
+
+    def from_(self, bucket: str):
+        return _RecordingTarget(self._storage.from_(bucket), self._recorder, "storage", bucket)
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+
+class RecordingClient:
+    """Bọc supabase.Client (bên trong InstrumentedClient), giữ nguyên interface"""
+
+    def __init__(self, client, recorder: SupabaseRecorder):
+        self._client = client
+        self._recorder = recorder
+
+    def table(self, name: str):
+        return _RecordingQuery(self._client.table(name), self._recorder, "table", name)
+
+    def rpc(self, fn: str, params: dict = None, *args, **kwargs):
+        builder = self._client.rpc(fn, params or {}, *args, **kwargs)
+        return _RecordingQuery(builder, self._recorder, "rpc", fn, [["rpc", [fn, params or {}], {}]])
+
+    @property
+    def storage(self):
+        return _RecordingStorage(self._client.storage, self._recorder)
+
+    @property
+    def auth(self):
+        return _RecordingTarget(self._client.auth, self._recorder, "auth", "auth")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# -------------------------------
+# ASGI MIDDLEWARE
+# -------------------------------
+
+class RecordingMiddleware:
+    """Gắn các Supabase call vào request đang chạy và ghi lại request đó"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        recorder = get_supabase_recorder()
+        if scope["type"] != "http" or recorder is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = recorder.start_request()
+        token = _current_request.set(request_id)
+        body = bytearray()
+        status_code = 500
+        start = time.perf_counter()
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request" and len(body) <= recorder.max_body_bytes:
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            headers = {}
+            for key, value in scope.get("headers", []):
+                name = key.decode("latin-1").lower()
+                if name in RECORDED_HEADERS:
+                    headers[name] = value.decode("latin-1")
+            try:
+                recorder.record_request(
+                    request_id, scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"),
+                    headers, bytes(body) if len(body) <= recorder.max_body_bytes else b"",
+                    status_code, time.perf_counter() - start, start
+                )
+            except Exception as e:
+                logging.error(f"[Recorder] Failed to record request: {e}")
+
+
+_recorder_instance = None
+_recorder_lock = threading.Lock()
+
+def get_supabase_recorder() -> Optional[SupabaseRecorder]:
+    global _recorder_instance
+    if not settings.supabase_recording_path:
+        return None
+    with _recorder_lock:
+        if _recorder_instance is None:
+            salt = settings.supabase_recording_salt.encode() if settings.supabase_recording_salt else None
+            _recorder_instance = SupabaseRecorder(
+                settings.supabase_recording_path,
+                scrub=settings.supabase_recording_scrub,
+                max_blob_bytes=settings.supabase_recording_max_blob_bytes,
+                salt=salt
+            )
+            logging.warning(f"[Recorder] Recording Supabase traffic to {settings.supabase_recording_path}")
+    return _recorder_instance
+
+
+def maybe_record(client):
+    """Bọc client bằng RecordingClient nếu đang bật recording"""
+    recorder = get_supabase_recorder()
+    return RecordingClient(client, recorder) if recorder else client
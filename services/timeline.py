@@ -0,0 +1,272 @@
+"""
+Home timeline materialize sẵn (fan-out-on-write) cho feed GET /posts.
+
+Feed = post công khai đã duyệt ∪ post của chính user (đăng nhập). Thay vì chạy lại
+query or_(...) order by created_at mỗi lần scroll, giữ danh sách post id mới nhất
+trước, tối đa timeline_max_length phần tử:
+- "public": post approved + không private, dùng chung cho mọi user và guest
+- "user:{id}": mọi post của user đó (kể cả pending / private)
+Feed của user là merge 2 danh sách theo created_at; đọc feed chỉ còn slice id rồi
+hydrate theo batch.
+
+Ghi post (tạo, AI duyệt / từ chối, đổi private, xóa) cập nhật danh sách liên quan.
+Danh sách chưa có hoặc hết TTL được dựng lại từ DB bằng 1 query. Scroll sâu hơn
+timeline_max_length quay về query DB.
+
+Chỉ bật khi có backend dùng chung (TIMELINE_ENABLED + redis): memory backend là bản
+riêng của từng worker, post mới của user trên worker khác chỉ hiện sau TTL. Tắt thì
+feed query DB như cũ và các hook ghi không làm gì.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+from config import get_settings
+import bisect
+import heapq
+import logging
+import threading
+import time
+
+settings = get_settings()
+
+PUBLIC = "public"
+
+# (score = created_at epoch, post_id), mới nhất trước; cùng score thì id lớn trước
+# như order created_at desc, id desc của DB
+Entry = Tuple[float, str]
+
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def _score(created_at) -> float:
+    if isinstance(created_at, datetime):
+        return created_at.timestamp()
+    return datetime.fromisoformat(str(created_at).replace("Z", "+00:00")).timestamp()
+
+
+def is_public(post: dict) -> bool:
+    return post.get("status") == "approved" and not post.get("is_private")
+
+
+# -------------------------------
+# BACKEND
+# -------------------------------
+
+class TimelineBackend(ABC):
+    @abstractmethod
+    def range(self, key: str, stop: int) -> Optional[List[Entry]]:
+        """stop phần tử đầu; None nếu danh sách chưa dựng / hết hạn"""
+        ...
+
+    @abstractmethod
+    def replace(self, key: str, entries: List[Entry]):
+        ...
+
+    @abstractmethod
+    def add(self, key: str, entry: Entry):
+        """Chỉ khi danh sách đã dựng; chưa dựng thì lần đọc sau dựng từ DB"""
+        ...
+
+    @abstractmethod
+    def remove(self, key: str, post_id: str):
+        ...
+
+
+class InMemoryTimelineBackend(TimelineBackend):
+    """Một process (dev, tests); ghi từ worker khác chỉ thấy sau TTL"""
+
+    def __init__(self, max_length: int, ttl_seconds: float, max_timelines: int = 10000):
+        self.max_length = max_length
+        self.ttl_seconds = ttl_seconds
+        self.max_timelines = max_timelines
+        # key -> ([(score, post_id)] tăng dần, mới nhất ở cuối; built_at)
+        self._timelines: "OrderedDict[str, Tuple[List[Entry], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[List[Entry]]:
+        entry = self._timelines.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl_seconds:
+            del self._timelines[key]
+            return None
+        self._timelines.move_to_end(key)
+        return entry[0]
+
+    def range(self, key: str, stop: int) -> Optional[List[Entry]]:
+        with self._lock:
+            items = self._get(key)
+            return None if items is None else items[::-1][:stop]
+
+    def replace(self, key: str, entries: List[Entry]):
+        items = sorted(entries)[-self.max_length:]
+        with self._lock:
+            self._timelines[key] = (items, time.monotonic())
+            self._timelines.move_to_end(key)
+            while len(self._timelines) > self.max_timelines:
+                self._timelines.popitem(last=False)
+
+    def add(self, key: str, entry: Entry):
+        score, post_id = entry
+        with self._lock:
+            items = self._get(key)
+            if items is None:
+                return
+            items[:] = [item for item in items if item[1] != post_id]
+            bisect.insort(items, (score, post_id))
+            del items[:-self.max_length]
+
+    def remove(self, key: str, post_id: str):
+        with self._lock:
+            items = self._get(key)
+            if items is not None:
+                items[:] = [item for item in items if item[1] != post_id]
+
+
+class RedisTimelineBackend(TimelineBackend):
+    """
+    Sorted set mỗi danh sách, nhiều worker dùng chung. Member SENTINEL (score +inf)
+    đánh dấu danh sách đã dựng đầy đủ, kể cả khi rỗng.
+    """
+
+    KEY_PREFIX = "timeline:"
+    SENTINEL = "_"
+
+    def __init__(self, url: str, max_length: int, ttl_seconds: float):
+        import redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+        self.max_length = max_length
+        self.ttl_seconds = ttl_seconds
+
+    def range(self, key: str, stop: int) -> Optional[List[Entry]]:
+        rows = self._redis.zrevrange(self.KEY_PREFIX + key, 0, stop, withscores=True)
+        if not rows or rows[0][0].decode() != self.SENTINEL:
+            return None
+        return [(score, member.decode()) for member, score in rows[1:]]
+
+    def replace(self, key: str, entries: List[Entry]):
+        name = self.KEY_PREFIX + key
+        members = {post_id: score for score, post_id in entries[:self.max_length]}
+        members[self.SENTINEL] = float("inf")
+        pipe = self._redis.pipeline()
+        pipe.delete(name)
+        pipe.zadd(name, members)
+        pipe.expire(name, max(1, int(self.ttl_seconds)))
+        pipe.execute()
+
+    def add(self, key: str, entry: Entry):
+        name = self.KEY_PREFIX + key
+        score, post_id = entry
+        # Key chưa dựng / đã hết hạn: xóa lại, không để danh sách thiếu trông như đã dựng
+        pipe = self._redis.pipeline()
+        pipe.zscore(name, self.SENTINEL)
+        pipe.zadd(name, {post_id: score})
+        pipe.zremrangebyrank(name, 0, -(self.max_length + 2))
+        exists, *_ = pipe.execute()
+        if exists is None:
+            self._redis.delete(name)
+
+    def remove(self, key: str, post_id: str):
+        self._redis.zrem(self.KEY_PREFIX + key, post_id)
+
+
+# -------------------------------
+# SERVICE
+# -------------------------------
+
+class TimelineService:
+    def __init__(self, backend: Optional[TimelineBackend], max_length: int):
+        # None = tắt: page_ids luôn None (route query DB), hook ghi không làm gì
+        self.backend = backend
+        self.max_length = max_length
+
+    def _rebuild(self, supabase, key: str) -> List[Entry]:
+        query = supabase.table("posts").select("id, created_at")
+        if key == PUBLIC:
+            query = query.eq("status", "approved").eq("is_private", False)
+        else:
+            query = query.eq("owner_id", key[len("user:"):])
+        rows = query.order("created_at", desc=True).order("id", desc=True).limit(self.max_length).execute().data
+        entries = [(_score(row["created_at"]), row["id"]) for row in rows]
+        self.backend.replace(key, entries)
+        return entries
+
+    def _entries(self, supabase, key: str, stop: int) -> List[Entry]:
+        try:
+            entries = self.backend.range(key, stop)
+        except Exception as e:
+            logging.error(f"[Timeline] Backend read failed for {key}: {e}")
+            entries = None
+        if entries is None:
+            entries = self._rebuild(supabase, key)[:stop]
+        return entries
+
+    def page_ids(self, supabase, user_id: Optional[str], offset: int, limit: int) -> Optional[List[str]]:
+        """Post id của trang feed; None nếu trang nằm ngoài phần đã materialize"""
+        stop = offset + limit
+        if self.backend is None or stop > self.max_length:
+            return None
+        entries = self._entries(supabase, PUBLIC, stop)
+        if user_id:
+            own = self._entries(supabase, user_key(user_id), stop)
+            merged = heapq.merge(entries, own, reverse=True)
+            seen, entries = set(), []
+            for score, post_id in merged:
+                if post_id not in seen:
+                    seen.add(post_id)
+                    entries.append((score, post_id))
+        return [post_id for _, post_id in entries[offset:stop]]
+
+    def drop(self, user_id: Optional[str], post_ids):
+        """Bỏ id không còn hiển thị (post đã xóa / hết public) mà timeline chưa biết"""
+        if self.backend is None:
+            return
+        for post_id in post_ids:
+            self._safely(self.backend.remove, PUBLIC, post_id)
+            if user_id:
+                self._safely(self.backend.remove, user_key(user_id), post_id)
+
+    def _safely(self, action, *args):
+        # Timeline lệch sẽ tự sửa khi hết TTL; không làm hỏng request ghi
+        try:
+            action(*args)
+        except Exception as e:
+            logging.error(f"[Timeline] Backend write failed: {e}")
+
+    def post_changed(self, post: dict):
+        """Post vừa tạo / cập nhật; cần id, owner_id, created_at, status, is_private"""
+        if self.backend is None:
+            return
+        entry = (_score(post["created_at"]), post["id"])
+        self._safely(self.backend.add, user_key(post["owner_id"]), entry)
+        if is_public(post):
+            self._safely(self.backend.add, PUBLIC, entry)
+        else:
+            self._safely(self.backend.remove, PUBLIC, post["id"])
+
+    def post_deleted(self, post: dict):
+        if self.backend is None:
+            return
+        self._safely(self.backend.remove, user_key(post["owner_id"]), post["id"])
+        self._safely(self.backend.remove, PUBLIC, post["id"])
+
+
+_timeline_instance = None
+
+def get_timeline_service() -> TimelineService:
+    global _timeline_instance
+    if _timeline_instance is None:
+        if not settings.timeline_enabled:
+            backend = None
+        elif settings.timeline_backend == "redis":
+            backend = RedisTimelineBackend(settings.redis_url, settings.timeline_max_length,
+                                           settings.timeline_ttl_seconds)
+        else:
+            backend = InMemoryTimelineBackend(settings.timeline_max_length, settings.timeline_ttl_seconds,
+                                              settings.timeline_max_users)
+        _timeline_instance = TimelineService(backend, settings.timeline_max_length)
+    return _timeline_instance
@@ -0,0 +1,123 @@
+"""
+Số notification chưa đọc theo user, phục vụ /notifications/unread-count O(1).
+
+Nguồn: bảng notification_counters (trigger trong DB cập nhật khi notifications
+thay đổi). Process giữ cache trong memory, tự cộng/trừ khi chính nó ghi
+notification, đọc lại bảng counter khi entry hết TTL (để thấy thay đổi từ
+worker khác) và định kỳ đối chiếu với count exact trong DB để sửa lệch.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config import get_settings
+from services.notification_hub import get_notification_hub
+import threading
+import asyncio
+import logging
+import time
+
+settings = get_settings()
+
+
+class UnreadCounterCache:
+    def __init__(self, ttl_seconds: float = 30.0, max_users: int = 100000):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        # user_id -> (count, loaded_at)
+        self._counts: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, user_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+                return None
+            self._counts.move_to_end(user_id)
+            return entry[0]
+
+    def _store(self, user_id: str, count: int):
+        with self._lock:
+            self._counts[user_id] = (max(count, 0), time.monotonic())
+            self._counts.move_to_end(user_id)
+            while len(self._counts) > self.max_users:
+                self._counts.popitem(last=False)
+
+    def get(self, supabase, user_id: str) -> int:
+        count = self._cached(user_id)
+        if count is not None:
+            return count
+
+        row = supabase.table("notification_counters").select("unread_count").eq("user_id", user_id).execute()
+        if row.data:
+            count = row.data[0]["unread_count"]
+        else:
+            # Chưa có dòng counter (user mới / chưa backfill) → đếm exact 1 lần
+            count = self._exact_count(supabase, user_id)
+            supabase.table("notification_counters").upsert(
+                {"user_id": user_id, "unread_count": count}, on_conflict="user_id"
+            ).execute()
+
+        self._store(user_id, count)
+        return count
+
+    def _exact_count(self, supabase, user_id: str) -> int:
+        result = supabase.table("notifications")\
+            .select("id", count="exact")\
+            .eq("recipient_id", user_id)\
+            .eq("is_read", False)\
+            .limit(1)\
+            .execute()
+        return result.count or 0
+
+    def _adjust(self, user_id: str, delta: Optional[int] = None, value: Optional[int] = None):
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry is None and value is None:
+                return
+            count = value if value is not None else entry[0] + delta
+            loaded_at = entry[1] if entry else time.monotonic()
+            self._counts[user_id] = (max(count, 0), loaded_at)
+        get_notification_hub().publish(user_id, {"type": "unread_count", "count": max(count, 0)})
+
+    def incr(self, user_id: str, n: int = 1):
+        self._adjust(user_id, delta=n)
+
+    def decr(self, user_id: str, n: int = 1):
+        self._adjust(user_id, delta=-n)
+
+    def reset(self, user_id: str):
+        self._adjust(user_id, value=0)
+
+    def reconcile(self, supabase, user_ids: List[str]) -> Dict[str, int]:
+        """Đếm lại exact trong DB (1 RPC, không ghi đè bump của trigger), cập nhật cache;
+        trả về các counter đã lệch"""
+        if not user_ids:
+            return {}
+        result = supabase.rpc("reconcile_notification_counters", {"p_user_ids": user_ids}).execute()
+        fixed = {}
+        for row in result.data or []:
+            if row["drifted"]:
+                fixed[row["user_id"]] = row["unread_count"]
+            self._store(row["user_id"], row["unread_count"])
+        if fixed:
+            logging.warning(f"[UnreadCounter] Reconciled {len(fixed)} drifted counters")
+        return fixed
+
+    async def run(self, supabase, interval_seconds: float, batch_size: int = 200):
+        """Đối chiếu định kỳ các user dùng gần đây nhất"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            with self._lock:
+                user_ids = list(reversed(self._counts))[:batch_size]
+            try:
+                await asyncio.to_thread(self.reconcile, supabase, user_ids)
+            except Exception as e:
+                logging.error(f"[UnreadCounter] Reconciliation failed: {e}")
+
+
+_counter_instance = None
+
+def get_unread_counter() -> UnreadCounterCache:
+    global _counter_instance
+    if _counter_instance is None:
+        _counter_instance = UnreadCounterCache(ttl_seconds=settings.unread_counter_ttl_seconds)
+    return _counter_instance
@@ -0,0 +1,205 @@
+"""
+ETag / conditional GET từ version dòng (migration 600).
+
+VersionCache giữ metadata nhỏ (version + vài cột cần cho check quyền) theo post /
+profile, TTL ngắn: request có If-None-Match được trả 304 mà không đọc lại dòng đầy đủ,
+cache hit thì không query gì. Ghi trong process này làm invalidate ngay qua query
+observer; ghi từ worker khác chỉ thấy sau tối đa TTL.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+from fastapi import Request, Response
+from config import get_settings
+import hashlib
+import threading
+import time
+
+settings = get_settings()
+
+POST_META_COLUMNS = "version, owner_id, is_private, status"
+_WRITE_OPERATIONS = {"insert", "update", "upsert", "delete"}
+
+
+class VersionCache:
+    def __init__(self, ttl_seconds: float = 2.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # (namespace, key) -> (meta, expires_at)
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: Hashable) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[(namespace, key)]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def set(self, namespace: str, key: Hashable, meta: dict):
+        if self.ttl_seconds <= 0 or meta.get("version") is None:
+            return
+        with self._lock:
+            self._entries[(namespace, key)] = (meta, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str, keys: Optional[Iterable[Hashable]] = None):
+        """keys=None: xóa cả namespace"""
+        with self._lock:
+            if keys is None:
+                for entry_key in [k for k in self._entries if k[0] == namespace]:
+                    del self._entries[entry_key]
+            else:
+                for key in keys:
+                    self._entries.pop((namespace, key), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_version_cache_instance = None
+
+def get_version_cache() -> VersionCache:
+    global _version_cache_instance
+    if _version_cache_instance is None:
+        _version_cache_instance = VersionCache(
+            ttl_seconds=settings.etag_version_ttl_seconds,
+            max_entries=settings.etag_version_cache_size,
+        )
+    return _version_cache_instance
+
+
+# -------------------------------
+# INVALIDATION
+# -------------------------------
+
+def _filter_values(filters: List[Tuple[str, tuple]], column: str) -> Optional[List[Any]]:
+    """Giá trị của eq / in_ trên cột; None nếu write không giới hạn theo cột đó"""
+    for name, args in filters:
+        if len(args) >= 2 and args[0] == column:
+            if name == "eq":
+                return [args[1]]
+            if name == "in_":
+                return list(args[1])
+    return None
+
+
+def invalidate_on_write(table: str, operation: str, filters, duration: float, error):
+    """Query observer: ghi vào posts / post_media / profiles làm cũ version đã cache"""
+    if operation not in _WRITE_OPERATIONS:
+        return
+    cache = get_version_cache()
+    if table == "posts":
+        cache.invalidate("posts", _filter_values(filters, "id"))
+    elif table == "post_media":
+        # Media chạm vào post cha; insert / ghi theo media id không biết post nào
+        cache.invalidate("posts", _filter_values(filters, "post_id"))
+    elif table == "profiles":
+        cache.invalidate("profiles", _filter_values(filters, "id"))
+        cache.invalidate("usernames")
+
+
+# -------------------------------
+# METADATA (cache hoặc query nhẹ)
+# -------------------------------
+
+def remember_post(post: dict):
+    get_version_cache().set("posts", post["id"], {
+        "version": post.get("version"),
+        "owner_id": post.get("owner_id"),
+        "is_private": post.get("is_private"),
+        "status": post.get("status"),
+    })
+
+
+def remember_profile(profile: dict):
+    cache = get_version_cache()
+    cache.set("profiles", profile["id"], {"version": profile.get("version")})
+    if profile.get("username"):
+        cache.set("usernames", profile["username"], {"id": profile["id"], "version": profile.get("version")})
+
+
+def post_meta(supabase, post_id: str) -> Optional[dict]:
+    meta = get_version_cache().get("posts", post_id)
+    if meta is None:
+        result = supabase.table("posts").select(f"id, {POST_META_COLUMNS}").eq("id", post_id).execute()
+        if not result.data:
+            return None
+        remember_post(result.data[0])
+        meta = result.data[0]
+    return meta
+
+
+def profile_meta(supabase, user_id: str) -> Optional[dict]:
+    meta = get_version_cache().get("profiles", user_id)
+    if meta is None:
+        result = supabase.table("profiles").select("id, username, version").eq("id", user_id).execute()
+        if not result.data:
+            return None
+        remember_profile(result.data[0])
+        meta = result.data[0]
+    return meta
+
+
+def profile_meta_by_username(supabase, username: str) -> Optional[dict]:
+    meta = get_version_cache().get("usernames", username)
+    if meta is None:
+        result = supabase.table("profiles").select("id, username, version").eq("username", username).execute()
+        if not result.data:
+            return None
+        remember_profile(result.data[0])
+        meta = result.data[0]
+    return meta
+
+
+# -------------------------------
+# HTTP
+# -------------------------------
+
+def _route_key(request: Request) -> str:
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+
+def make_etag(request: Request, *versions) -> Optional[str]:
+    """Strong ETag theo route + các version; None nếu thiếu version (chưa có migration)"""
+    if any(v is None for v in versions):
+        return None
+    raw = "|".join([_route_key(request), request.url.path, *map(str, versions)])
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header or etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match dùng weak comparison (RFC 9110): bỏ tiền tố W/
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def cache_headers(request: Request, etag: Optional[str]) -> Dict[str, str]:
+    headers = {}
+    if etag:
+        headers["ETag"] = etag
+    policy = settings.cache_control.get(_route_key(request))
+    if policy:
+        headers["Cache-Control"] = policy
+    return headers
+
+
+def not_modified(request: Request, etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(request, etag))
+
+
+def set_cache_headers(request: Request, response: Response, etag: Optional[str]):
+    response.headers.update(cache_headers(request, etag))
@@ -0,0 +1,15 @@
+-- Near-duplicate detection cho post_media
+-- phash: perceptual hash 64-bit (uint64 lưu dạng bigint có dấu)
+-- duplicate_of: media gốc mà ảnh này trùng, để moderator review
+
+alter table public.post_media
+    add column if not exists phash bigint,
+    add column if not exists duplicate_of uuid references public.post_media(id) on delete set null;
+
+create index if not exists post_media_duplicate_of_idx
+    on public.post_media (duplicate_of)
+    where duplicate_of is not null;
+
+-- delete_media kiểm tra storage_path còn được media khác dùng chung không
+create index if not exists post_media_storage_path_idx
+    on public.post_media (storage_path);
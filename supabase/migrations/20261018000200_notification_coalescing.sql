@@ -0,0 +1,11 @@
+-- Gộp notification "like" theo (recipient, post)
+-- actor_count: tổng số người đã like, actor_ids: vài actor gần nhất (mới nhất trước)
+
+alter table public.notifications
+    add column if not exists actor_count integer not null default 1,
+    add column if not exists actor_ids uuid[];
+
+-- Flush của coalescer tìm notification like chưa đọc theo (recipient, post)
+create index if not exists notifications_unread_like_idx
+    on public.notifications (recipient_id, post_id)
+    where type = 'like' and is_read = false;
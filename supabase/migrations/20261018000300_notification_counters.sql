@@ -0,0 +1,55 @@
+-- Counter số notification chưa đọc theo user, cập nhật bằng trigger
+-- /notifications/unread-count đọc bảng này thay cho count exact
+
+create table if not exists public.notification_counters (
+    user_id uuid primary key references public.profiles(id) on delete cascade,
+    unread_count integer not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+create or replace function public.bump_notification_counter(p_user_id uuid, p_delta integer)
+returns void language sql as $$
+    insert into public.notification_counters (user_id, unread_count, updated_at)
+    values (p_user_id, greatest(p_delta, 0), now())
+    on conflict (user_id) do update
+        set unread_count = greatest(public.notification_counters.unread_count + p_delta, 0),
+            updated_at = now();
+$$;
+
+create or replace function public.notifications_unread_counter_trigger()
+returns trigger language plpgsql as $$
+begin
+    if tg_op = 'INSERT' then
+        if not new.is_read then
+            perform public.bump_notification_counter(new.recipient_id, 1);
+        end if;
+    elsif tg_op = 'UPDATE' then
+        if not old.is_read and (new.is_read or new.recipient_id <> old.recipient_id) then
+            perform public.bump_notification_counter(old.recipient_id, -1);
+        end if;
+        if not new.is_read and (old.is_read or new.recipient_id <> old.recipient_id) then
+            perform public.bump_notification_counter(new.recipient_id, 1);
+        end if;
+    elsif tg_op = 'DELETE' then
+        if not old.is_read then
+            perform public.bump_notification_counter(old.recipient_id, -1);
+        end if;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists notifications_unread_counter on public.notifications;
+create trigger notifications_unread_counter
+    after insert or update of is_read, recipient_id or delete on public.notifications
+    for each row execute function public.notifications_unread_counter_trigger();
+
+-- Backfill
+insert into public.notification_counters (user_id, unread_count)
+select recipient_id, count(*) from public.notifications where not is_read group by recipient_id
+on conflict (user_id) do update set unread_count = excluded.unread_count, updated_at = now();
+
+-- Reconciliation đếm exact theo recipient
+create index if not exists notifications_recipient_unread_idx
+    on public.notifications (recipient_id)
+    where is_read = false;
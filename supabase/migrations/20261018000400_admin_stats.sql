@@ -0,0 +1,32 @@
+-- Thống kê admin tính sẵn
+
+-- Snapshot totals sau mỗi lần reconcile (count exact chạy nền)
+create table if not exists public.admin_stats_snapshots (
+    id bigserial primary key,
+    totals jsonb not null,
+    taken_at timestamptz not null default now()
+);
+
+create index if not exists admin_stats_snapshots_taken_at_idx
+    on public.admin_stats_snapshots (taken_at desc);
+
+-- Series theo giờ: posts, likes, ai_approved, ai_rejected
+create table if not exists public.admin_stats_buckets (
+    metric text not null,
+    bucket timestamptz not null,
+    value bigint not null default 0,
+    primary key (metric, bucket)
+);
+
+create index if not exists admin_stats_buckets_bucket_idx
+    on public.admin_stats_buckets (bucket);
+
+-- Mỗi worker flush delta của mình, DB cộng dồn
+create or replace function public.increment_stat_buckets(p_rows jsonb)
+returns void language sql as $$
+    insert into public.admin_stats_buckets (metric, bucket, value)
+    select metric, bucket, value
+    from jsonb_to_recordset(p_rows) as x(metric text, bucket timestamptz, value bigint)
+    on conflict (metric, bucket) do update
+        set value = public.admin_stats_buckets.value + excluded.value;
+$$;
@@ -0,0 +1,36 @@
+-- Index cho GET /admin/posts
+--
+-- Listing chạy 3 query mỗi trang:
+--   posts (filter + sort + range), profiles in (owner_ids), post_media in (post_ids)
+--
+-- Filter / sort                       Index
+-- status (+ sort created_at)          posts_status_created_at_idx
+-- owner_id (+ sort created_at)        posts_owner_created_at_idx
+-- created_from / created_to           posts_created_at_idx
+-- ai_min / ai_max, sort=ai_perc       posts_ai_perc_idx
+-- status + ai range (hàng review)     posts_status_ai_perc_idx
+-- sort=like_count                     posts_like_count_idx
+-- media theo post                     post_media_post_order_idx
+
+create index if not exists posts_status_created_at_idx
+    on public.posts (status, created_at desc, id desc);
+
+create index if not exists posts_owner_created_at_idx
+    on public.posts (owner_id, created_at desc, id desc);
+
+create index if not exists posts_created_at_idx
+    on public.posts (created_at desc, id desc);
+
+create index if not exists posts_ai_perc_idx
+    on public.posts (ai_perc desc, id desc);
+
+-- Moderator làm việc chủ yếu trên pending/rejected
+create index if not exists posts_status_ai_perc_idx
+    on public.posts (status, ai_perc desc)
+    where status in ('pending', 'rejected', 'error');
+
+create index if not exists posts_like_count_idx
+    on public.posts (like_count desc, id desc);
+
+create index if not exists post_media_post_order_idx
+    on public.post_media (post_id, "order");
@@ -0,0 +1,55 @@
+-- Version theo dòng cho ETag / conditional GET
+--
+-- posts.version, profiles.version tăng mỗi lần UPDATE (trigger before update).
+-- Thay đổi post_media (thêm / sửa / xóa, kể cả kết quả AI) chạm vào post cha
+-- nên version của post bao cả media: GET /posts/{id}, /media, /ai_status
+-- chỉ cần so version của post (+ version profile owner).
+
+alter table public.posts
+    add column if not exists version bigint not null default 1,
+    add column if not exists updated_at timestamptz not null default now();
+
+alter table public.profiles
+    add column if not exists version bigint not null default 1,
+    add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.bump_row_version()
+returns trigger language plpgsql as $$
+begin
+    new.version := old.version + 1;
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists posts_bump_version on public.posts;
+create trigger posts_bump_version
+    before update on public.posts
+    for each row execute function public.bump_row_version();
+
+drop trigger if exists profiles_bump_version on public.profiles;
+create trigger profiles_bump_version
+    before update on public.profiles
+    for each row execute function public.bump_row_version();
+
+create or replace function public.post_media_touch_post()
+returns trigger language plpgsql as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        update public.posts set updated_at = now() where id = old.post_id;
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') and (tg_op = 'INSERT' or new.post_id <> old.post_id) then
+        update public.posts set updated_at = now() where id = new.post_id;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists post_media_touch_post on public.post_media;
+create trigger post_media_touch_post
+    after insert or update or delete on public.post_media
+    for each row execute function public.post_media_touch_post();
+
+-- Lookup version theo username (GET /profiles/{username}/by-username)
+create index if not exists profiles_username_version_idx
+    on public.profiles (username) include (id, version);
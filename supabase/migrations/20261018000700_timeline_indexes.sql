@@ -0,0 +1,11 @@
+-- Index cho timeline materialize sẵn (services/timeline.py)
+--
+-- Feed không còn chạy or_(approved & public, owner = me) mỗi lần scroll; danh sách
+-- post id chỉ được dựng lại (khi chưa có / hết TTL) bằng 2 query đơn giản:
+--   public: status = approved, is_private = false, order created_at desc limit N
+--   user:   owner_id = me, order created_at desc limit N (posts_owner_created_at_idx, migration 500)
+-- rồi hydrate theo id: posts in (ids), profiles in (owner_ids), post_media in (post_ids).
+
+create index if not exists posts_public_feed_idx
+    on public.posts (created_at desc, id desc)
+    where status = 'approved' and is_private = false;
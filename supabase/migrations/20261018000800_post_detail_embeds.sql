@@ -0,0 +1,25 @@
+-- FK có tên cố định cho embed PostgREST của chi tiết post (GET /posts/{id})
+--
+-- Chi tiết post đọc post + owner + media trong 1 query:
+--   posts?select=*,owner:profiles!posts_owner_id_fkey(...),media:post_media!post_media_post_id_fkey(*)
+-- Hint theo tên constraint tránh lỗi "more than one relationship" nếu sau này thêm FK
+-- khác giữa hai bảng. Tên trùng tên mặc định của Postgres, nên DB đã có FK inline
+-- thì migration không làm gì.
+
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'posts_owner_id_fkey') then
+        alter table public.posts
+            add constraint posts_owner_id_fkey
+            foreign key (owner_id) references public.profiles (id) on delete cascade;
+    end if;
+
+    if not exists (select 1 from pg_constraint where conname = 'post_media_post_id_fkey') then
+        alter table public.post_media
+            add constraint post_media_post_id_fkey
+            foreign key (post_id) references public.posts (id) on delete cascade;
+    end if;
+end;
+$$;
+
+-- update_post / delete_post lọc theo (id, owner_id): khóa chính đã đủ, không cần index mới
@@ -0,0 +1,27 @@
+-- Thời điểm đổi role gần nhất, dùng chung cho mọi worker (require_admin)
+--
+-- Role claim trong JWT (app_metadata.role / user_role) chỉ được tin nếu token phát
+-- sau lần đổi role mới nhất của bất kỳ user nào: max(role_changed_at) là 1 query
+-- rẻ mỗi TTL mỗi worker, token cũ hơn thì đọc profiles.role như trước.
+-- PATCH /admin/users/{id}/role cập nhật cả app_metadata của auth user; đổi role bằng
+-- SQL trực tiếp thì trigger vẫn đóng dấu thời gian nhưng app_metadata phải sửa tay.
+
+alter table public.profiles add column if not exists role_changed_at timestamptz;
+
+create or replace function public.profiles_stamp_role_change()
+returns trigger language plpgsql as $$
+begin
+    new.role_changed_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists profiles_stamp_role_change on public.profiles;
+create trigger profiles_stamp_role_change
+    before update of role on public.profiles
+    for each row
+    when (old.role is distinct from new.role)
+    execute function public.profiles_stamp_role_change();
+
+create index if not exists profiles_role_changed_at_idx
+    on public.profiles (role_changed_at desc nulls last);
@@ -0,0 +1,10 @@
+-- GET /admin/duplicates đọc thẳng post_media (duplicate_of is not null) thay vì
+-- danh sách trong memory của từng worker
+-- duplicate_distance: Hamming distance tới media gốc lúc upload (0 = trùng hoàn toàn)
+
+alter table public.post_media
+    add column if not exists duplicate_distance smallint;
+
+create index if not exists post_media_duplicates_created_at_idx
+    on public.post_media (created_at desc)
+    where duplicate_of is not null;
@@ -0,0 +1,119 @@
+-- Totals của admin dashboard giữ trong DB bằng trigger, thay cho base + delta trong
+-- memory từng worker (các worker lệch nhau, worker nào cũng count exact + snapshot)
+--
+-- Mỗi metric chia 16 shard: like / post mới cộng vào shard ngẫu nhiên nên không
+-- tranh nhau lock 1 dòng; GET /admin/stats đọc sum theo metric.
+
+create table if not exists public.admin_stats_totals (
+    metric text not null,
+    shard smallint not null,
+    value bigint not null default 0,
+    primary key (metric, shard)
+);
+
+create or replace function public.bump_admin_stat(p_metric text, p_delta bigint)
+returns void language sql as $$
+    insert into public.admin_stats_totals (metric, shard, value)
+    values (p_metric, floor(random() * 16)::smallint, p_delta)
+    on conflict (metric, shard) do update
+        set value = public.admin_stats_totals.value + excluded.value;
+$$;
+
+create or replace function public.admin_stats_profiles_trigger()
+returns trigger language plpgsql as $$
+begin
+    perform public.bump_admin_stat('total_users', case when tg_op = 'INSERT' then 1 else -1 end);
+    return null;
+end;
+$$;
+
+create or replace function public.admin_stats_posts_trigger()
+returns trigger language plpgsql as $$
+begin
+    if tg_op = 'INSERT' then
+        perform public.bump_admin_stat('total_posts', 1);
+        if not new.is_private then
+            perform public.bump_admin_stat('public_posts', 1);
+        end if;
+    elsif tg_op = 'UPDATE' then
+        if old.is_private and not new.is_private then
+            perform public.bump_admin_stat('public_posts', 1);
+        elsif not old.is_private and new.is_private then
+            perform public.bump_admin_stat('public_posts', -1);
+        end if;
+    elsif tg_op = 'DELETE' then
+        perform public.bump_admin_stat('total_posts', -1);
+        if not old.is_private then
+            perform public.bump_admin_stat('public_posts', -1);
+        end if;
+    end if;
+    return null;
+end;
+$$;
+
+-- post_likes bị xóa cascade theo post cũng đi qua trigger này
+create or replace function public.admin_stats_post_likes_trigger()
+returns trigger language plpgsql as $$
+begin
+    perform public.bump_admin_stat('total_likes', case when tg_op = 'INSERT' then 1 else -1 end);
+    return null;
+end;
+$$;
+
+drop trigger if exists admin_stats_profiles on public.profiles;
+create trigger admin_stats_profiles
+    after insert or delete on public.profiles
+    for each row execute function public.admin_stats_profiles_trigger();
+
+drop trigger if exists admin_stats_posts on public.posts;
+create trigger admin_stats_posts
+    after insert or update of is_private or delete on public.posts
+    for each row execute function public.admin_stats_posts_trigger();
+
+drop trigger if exists admin_stats_post_likes on public.post_likes;
+create trigger admin_stats_post_likes
+    after insert or delete on public.post_likes
+    for each row execute function public.admin_stats_post_likes_trigger();
+
+-- Đếm lại exact (backfill / sửa tay). Lock bảng để increment của transaction khác
+-- chờ tới sau khi ghi xong, không bị ghi đè
+create or replace function public.admin_stats_reconcile()
+returns void language plpgsql as $$
+begin
+    lock table public.admin_stats_totals in exclusive mode;
+    delete from public.admin_stats_totals;
+    insert into public.admin_stats_totals (metric, shard, value) values
+        ('total_users', 0, (select count(*) from public.profiles)),
+        ('total_posts', 0, (select count(*) from public.posts)),
+        ('public_posts', 0, (select count(*) from public.posts where not is_private)),
+        ('total_likes', 0, (select count(*) from public.post_likes));
+end;
+$$;
+
+-- Snapshot totals + xóa snapshot / bucket cũ hơn retention. Worker nào cũng gọi
+-- định kỳ; advisory lock + khoảng cách tối thiểu giữa 2 snapshot nên chỉ 1 lần chạy thật
+create or replace function public.admin_stats_snapshot(p_min_interval_seconds integer, p_retention_hours integer)
+returns boolean language plpgsql as $$
+begin
+    if not pg_try_advisory_xact_lock(hashtext('admin_stats_snapshot')) then
+        return false;
+    end if;
+    if exists (
+        select 1 from public.admin_stats_snapshots
+        where taken_at > now() - make_interval(secs => p_min_interval_seconds)
+    ) then
+        return false;
+    end if;
+
+    insert into public.admin_stats_snapshots (totals)
+    select coalesce(jsonb_object_agg(metric, value), '{}'::jsonb)
+    from (select metric, sum(value) as value from public.admin_stats_totals group by metric) t;
+
+    delete from public.admin_stats_snapshots where taken_at < now() - make_interval(hours => p_retention_hours);
+    delete from public.admin_stats_buckets where bucket < now() - make_interval(hours => p_retention_hours);
+    return true;
+end;
+$$;
+
+-- Backfill
+select public.admin_stats_reconcile();
@@ -0,0 +1,78 @@
+-- Flush của coalescer gộp notification like bằng 1 câu insert ... on conflict
+--
+-- Thay cho đọc notification chưa đọc rồi upsert lại cả dòng: cách cũ cộng actor_count
+-- mỗi lần like / unlike / like lại và ghi đè is_read / created_at từ bản đọc cũ (mark-read
+-- chạy xen giữa bị mất). Ở đây:
+-- - actor_count = số người đang like post (trừ chủ post), đếm từ post_likes
+-- - actor_ids chỉ giữ người còn like, mới nhất trước
+-- - is_read không bị ghi; notification vừa được đánh dấu đã đọc không còn khớp
+--   unique index nên like mới tạo notification mới
+
+-- Dọn bản trùng (nếu có) trước khi tạo unique index: giữ dòng mới nhất
+update public.notifications set is_read = true
+where id in (
+    select id from (
+        select id, row_number() over (partition by recipient_id, post_id order by created_at desc) as rn
+        from public.notifications
+        where type = 'like' and is_read = false
+    ) d
+    where rn > 1
+);
+
+drop index if exists public.notifications_unread_like_idx;
+create unique index if not exists notifications_unread_like_key
+    on public.notifications (recipient_id, post_id)
+    where type = 'like' and is_read = false;
+
+create or replace function public.like_notification_body(p_actor_name text, p_actor_count integer)
+returns text language sql immutable as $$
+    select case
+        when p_actor_count <= 1 then p_actor_name || ' liked your post'
+        else p_actor_name || ' and ' || (p_actor_count - 1) || ' other'
+             || case when p_actor_count > 2 then 's' else '' end || ' liked your post'
+    end;
+$$;
+
+-- p_rows: [{recipient_id, post_id, actor_ids (mới nhất trước)}], mỗi cặp 1 lần
+-- Trả về notification đã ghi + inserted (true = dòng mới, cho unread counter / SSE)
+create or replace function public.coalesce_like_notifications(p_rows jsonb, p_max_recent integer)
+returns table (notification jsonb, inserted boolean) language sql as $$
+    with input as (
+        select i.recipient_id, i.post_id,
+               array(
+                   select a from unnest(i.actor_ids) with ordinality as t(a, pos)
+                   where exists (select 1 from public.post_likes l where l.post_id = i.post_id and l.user_id = a)
+                   order by pos
+               ) as actor_ids
+        from jsonb_to_recordset(p_rows) as i(recipient_id uuid, post_id uuid, actor_ids uuid[])
+    )
+    insert into public.notifications as n (recipient_id, actor_id, post_id, type, body, actor_count, actor_ids)
+    select i.recipient_id, i.actor_ids[1], i.post_id, 'like',
+           public.like_notification_body(coalesce(p.display_name, p.username, 'Someone'), c.actor_count),
+           c.actor_count, i.actor_ids[1:p_max_recent]
+    from input i
+    left join public.profiles p on p.id = i.actor_ids[1]
+    cross join lateral (
+        select greatest(count(*), 1)::integer as actor_count
+        from public.post_likes l
+        where l.post_id = i.post_id and l.user_id <> i.recipient_id
+    ) c
+    where cardinality(i.actor_ids) > 0
+    on conflict (recipient_id, post_id) where type = 'like' and is_read = false
+    do update set
+        actor_id = excluded.actor_id,
+        actor_ids = (
+            select array_agg(a order by pos) from (
+                select a, min(pos) as pos
+                from unnest(excluded.actor_ids || n.actor_ids) with ordinality as t(a, pos)
+                where exists (select 1 from public.post_likes l where l.post_id = n.post_id and l.user_id = a)
+                group by a
+                order by min(pos)
+                limit p_max_recent
+            ) s
+        ),
+        actor_count = excluded.actor_count,
+        body = excluded.body,
+        created_at = now()
+    returning to_jsonb(n.*), n.xmax = 0;
+$$;
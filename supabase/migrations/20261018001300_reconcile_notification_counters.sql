@@ -0,0 +1,33 @@
+-- Reconciliation của unread counter chạy trong DB
+--
+-- Thay cho count exact rồi upsert từ app: bump của trigger commit giữa 2 bước bị ghi
+-- đè bằng count cũ. Ở đây khóa dòng counter trước (bump đang chạy commit xong, bump
+-- mới chờ tới sau khi reconcile commit) rồi set unread_count = count(*) trong 1 câu.
+
+create or replace function public.reconcile_notification_counters(p_user_ids uuid[])
+returns table (user_id uuid, unread_count integer, drifted boolean) language plpgsql as $$
+#variable_conflict use_column
+begin
+    insert into public.notification_counters (user_id)
+    select p.id from public.profiles p where p.id = any(p_user_ids)
+    on conflict (user_id) do nothing;
+
+    perform 1 from public.notification_counters c
+    where c.user_id = any(p_user_ids)
+    order by c.user_id
+    for update;
+
+    return query
+    update public.notification_counters c
+    set unread_count = e.exact, updated_at = now()
+    from (
+        select s.user_id, s.unread_count as stored,
+               (select count(*) from public.notifications n
+                where n.recipient_id = s.user_id and not n.is_read)::integer as exact
+        from public.notification_counters s
+        where s.user_id = any(p_user_ids)
+    ) e
+    where c.user_id = e.user_id
+    returning c.user_id, c.unread_count, e.stored <> e.exact;
+end;
+$$;
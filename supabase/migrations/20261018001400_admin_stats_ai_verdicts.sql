@@ -0,0 +1,29 @@
+-- Series ai_approved / ai_rejected ghi bằng trigger khi posts.status thực sự đổi
+--
+-- Thay cho mỗi lần chạy detection ghi 1 verdict từ app: detection chạy lại sau mỗi
+-- add / delete media nên 1 post bị đếm nhiều lần. Ở đây chỉ pending → approved /
+-- rejected hoặc đổi qua lại mới được đếm, đúng cho mọi worker. Post không có ảnh /
+-- video được approved thẳng, không tính là verdict của detector.
+
+create or replace function public.admin_stats_ai_verdict_trigger()
+returns trigger language plpgsql as $$
+begin
+    if exists (
+        select 1 from public.post_media m
+        where m.post_id = new.id and m.media_type in ('image', 'video')
+    ) then
+        insert into public.admin_stats_buckets (metric, bucket, value)
+        values ('ai_' || new.status, date_trunc('hour', now()), 1)
+        on conflict (metric, bucket) do update
+            set value = public.admin_stats_buckets.value + 1;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists admin_stats_ai_verdict on public.posts;
+create trigger admin_stats_ai_verdict
+    after update of status on public.posts
+    for each row
+    when (old.status is distinct from new.status and new.status in ('approved', 'rejected'))
+    execute function public.admin_stats_ai_verdict_trigger();
@@ -0,0 +1,24 @@
+"""
+Helper cho batch endpoint (POST /posts:batchGet, /profiles:batchGet...): kết quả theo
+thứ tự ids của request, mỗi id lỗi mang status + detail như endpoint đơn lẻ sẽ trả.
+"""
+from typing import Any, Dict, List
+import uuid
+
+
+def invalid_ids(ids: List[str]) -> Dict[str, dict]:
+    """Lỗi 400 cho id không phải UUID (Postgres sẽ lỗi cả query in_)"""
+    errors = {}
+    for item_id in ids:
+        try:
+            uuid.UUID(item_id)
+        except ValueError:
+            errors[item_id] = {"status": 400, "detail": "Invalid id"}
+    return errors
+
+
+def batch_results(ids: List[str], field: str, found: Dict[str, Any], errors: Dict[str, dict]) -> List[dict]:
+    return [
+        {"id": item_id, "error": errors[item_id]} if item_id in errors else {"id": item_id, field: found[item_id]}
+        for item_id in ids
+    ]
@@ -0,0 +1,114 @@
+"""
+JSON nhanh cho các endpoint trả list lớn.
+
+Row từ Supabase đã đúng kiểu (DB đã validate) nên không cần validate lại qua response_model.
+Mỗi response model có một TypedDict "bóng" cùng field (TypeAdapter biên dịch 1 lần):
+pydantic-core serialize thẳng list dict trong Rust, chỉ giữ field khai báo giống filter của
+response_model, không dựng instance model nào. Payload dict dùng orjson nếu đã cài,
+không thì pydantic_core.to_json.
+"""
+import copy
+from functools import lru_cache
+from types import UnionType
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union, get_args, get_origin
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import PydanticUndefined, to_json
+from typing_extensions import TypedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize payload thường (dict / list / model) ra bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse bỏ qua jsonable_encoder + json.dumps; nhận cả bytes đã serialize sẵn"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return dumps(content)
+
+
+def _unwrap(annotation: Any) -> Tuple[Optional[Type[BaseModel]], bool]:
+    """Model lồng trong annotation (X | None, List[X]) nếu có: (model, is_list)"""
+    if get_origin(annotation) in (Union, UnionType):
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        annotation = args[0] if len(args) == 1 else annotation
+    is_list = get_origin(annotation) is list
+    if is_list:
+        annotation = get_args(annotation)[0] if get_args(annotation) else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, is_list
+    return None, is_list
+
+
+@lru_cache(maxsize=None)
+def _mirror(model: Type[BaseModel]) -> type:
+    """TypedDict cùng field với model, model lồng cũng được thay bằng TypedDict"""
+    fields = {}
+    for name, field in model.model_fields.items():
+        nested, is_list = _unwrap(field.annotation)
+        if nested is None:
+            fields[name] = field.annotation
+        else:
+            fields[name] = Optional[List[_mirror(nested)] if is_list else _mirror(nested)]
+    return TypedDict(f"{model.__name__}Row", fields, total=False)
+
+
+@lru_cache(maxsize=None)
+def _defaults(model: Type[BaseModel]) -> Tuple[tuple, tuple]:
+    """(field có default, field là model lồng) - để điền giống response_model"""
+    defaults = tuple(
+        (name, field.default) for name, field in model.model_fields.items()
+        if field.default is not PydanticUndefined
+    )
+    nested = tuple(
+        (name, sub, is_list) for name, field in model.model_fields.items()
+        for sub, is_list in [_unwrap(field.annotation)] if sub is not None
+    )
+    return defaults, nested
+
+
+def fill_defaults(model: Type[BaseModel], row: Dict[str, Any]) -> Dict[str, Any]:
+    """Điền default cho field thiếu (in-place), đệ quy vào model lồng"""
+    defaults, nested = _defaults(model)
+    for name, default in defaults:
+        if name not in row:
+            row[name] = copy.copy(default)
+    for name, sub, is_list in nested:
+        value = row.get(name)
+        if not value:
+            continue
+        for item in (value if is_list else [value]):
+            fill_defaults(sub, item)
+    return row
+
+
+class ListSerializer:
+    """TypeAdapter(List[model]) trên TypedDict bóng, biên dịch 1 lần, dùng lại cho mọi request"""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.adapter = TypeAdapter(List[_mirror(model)])
+
+    def dump(self, rows: Iterable[Dict[str, Any]]) -> bytes:
+        rows = [fill_defaults(self.model, row) for row in rows]
+        # created_at để nguyên chuỗi ISO từ DB nên tắt warning kiểu datetime
+        return self.adapter.dump_json(rows, warnings=False)
+
+    def response(self, rows: Iterable[Dict[str, Any]], **kwargs) -> Response:
+        return FastJSONResponse(self.dump(rows), **kwargs)